@@ -17,6 +17,72 @@ class Settings(BaseSettings):
 
     IMAGE_STORAGE_PATH: str = "/data/images"
     IMAGE_MAX_ITERS: int = 2
+    IMAGE_MAX_CONCURRENCY: int = 4  # одновременных запросов генерации на процесс (варианты идут параллельно)
+    # кэш сгенерированных фонов на диске (пусто -> IMAGE_STORAGE_PATH/_cache)
+    IMAGE_CACHE_PATH: str = ""
+    IMAGE_CACHE_MAX_BYTES: int = 2_000_000_000
+    # zlib-уровень PNG при сохранении (0–9): 9 — меньше файл, но в разы дольше кодирование
+    IMAGE_PNG_COMPRESS_LEVEL: int = 6
+
+    # локальный scope-классификатор (пусто / нет файла -> только LLM)
+    SCOPE_CLASSIFIER_PATH: str = ""
+    SCOPE_CLASSIFIER_THRESHOLD: float = 0.85
+    # лог решений scope_guard: решения по ключевым словам пишем выборкой, строки храним ограниченно
+    SCOPE_LOG_KEYWORD_SAMPLE_RATE: float = 0.01
+    SCOPE_DECISIONS_RETENTION_DAYS: int = 90
+
+    # спекулятивный расчёт ответа на первую кнопку (выключено по умолчанию)
+    SPECULATIVE_ENABLED: bool = False
+    SPECULATIVE_TIERS: str = "default"  # через запятую
+    SPECULATIVE_TTL_SECONDS: int = 120
+    SPECULATIVE_USER_TOKEN_BUDGET: int = 20000  # токенов на пользователя в час
+
+    # краулер для ссылок пользователя (UrlAnalyzer)
+    CRAWLER_TIMEOUT: float = 20.0
+    CRAWLER_MAX_IN_FLIGHT: int = 32
+    CRAWLER_PER_HOST: int = 4
+    CRAWLER_MAX_CONNECTIONS: int = 64
+    CRAWLER_MAX_KEEPALIVE: int = 32
+    CRAWLER_DNS_TTL: float = 300.0
+    CRAWLER_PROXY: str = ""  # пусто — HTTP(S)_PROXY/NO_PROXY из окружения
+    URL_FETCH_MAX_BYTES: int = 2_000_000  # больше страницы не качаем
+    URL_FETCH_QUIET_WINDOW_BYTES: int = 128 * 1024  # выдержка набрана и столько байт без новых h1/CTA — стоп
+    URL_EXTRACT_INLINE_MAX_CHARS: int = 100_000  # страницы меньше разбираем прямо в event loop
+    URL_ANALYZE_DEADLINE_SECONDS: float = 6.0  # дольше ход чата ссылки не ждёт (0 — ждать всё)
+    URL_INSIGHTS_EXCERPT_TOKENS: int = 600  # текст страницы в промпте разбора после экстрактивного сжатия
+    URL_INSIGHTS_CACHE_TTL_DAYS: int = 30  # срок хранения строк url_insight_cache (0 — без чистки)
+
+    # /audit/batch: аудит списка конкурентов
+    AUDIT_BATCH_MAX_TARGETS: int = 100
+    AUDIT_BATCH_CONCURRENCY: int = 8
+
+    # пул процессов для CPU-тяжёлой работы (0 — всё в event loop)
+    CPU_POOL_WORKERS: int = 2
+    IMAGE_POOL_WORKERS: int = 2  # отдельный пул под ресайз/рендер картинок (0 — в event loop)
+
+    # кэш сводок по ссылкам: LRU в памяти перед url_cache
+    URL_CACHE_MEMORY_ENTRIES: int = 1024
+    URL_CACHE_MEMORY_TTL_SECONDS: int = 3600
+    URL_CACHE_NEGATIVE_TTL_SECONDS: int = 300  # ошибки загрузки и заблокированные площадки
+    URL_CACHE_STALE_SECONDS: int = 3600  # сколько после истечения ещё отдаём, обновляя в фоне
+    # строки с ETag/Last-Modified живут дольше — для условного запроса при следующем аудите
+    URL_CACHE_VALIDATOR_RETENTION_SECONDS: int = 604800
+
+    # single-flight между воркерами: аренда url в url_fetch_leases (0 — выключено)
+    URL_FETCH_LEASE_SECONDS: int = 30
+    URL_FETCH_LEASE_WAIT_SECONDS: float = 10.0
+    URL_FETCH_LEASE_POLL_SECONDS: float = 0.25
+
+    # фоновая чистка протухших строк url_cache (0 — выключено)
+    URL_CACHE_SWEEP_INTERVAL_SECONDS: int = 600
+    URL_CACHE_SWEEP_BATCH: int = 500
+
+    # наблюдение за конкурентами: плановый перезапрос watched_urls (0 — выключено)
+    WATCH_TICK_SECONDS: int = 300
+    WATCH_DEFAULT_INTERVAL_SECONDS: int = 86400
+    WATCH_MIN_INTERVAL_SECONDS: int = 3600
+    WATCH_BATCH: int = 50
+    WATCH_CONCURRENCY: int = 4
 
     HTTP_TIMEOUT: float = 60.0
     HTTP_RETRIES: int = 2
@@ -0,0 +1,143 @@
+# app/images/image_cache.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_KEY_RE = re.compile(r"^[0-9a-f]{16,128}$")
+
+
+class DiskImageCache:
+    """
+    Кэш сгенерированных фонов на диске, ключ — _cache_key (sha256 промпта/размера/модели).
+
+    - файлы <root>/<key[:2]>/<key>.png: общий для всех ImageOrchestrator и всех воркеров;
+    - запись атомарная (tmp + os.replace) — параллельный читатель не увидит половину файла;
+    - LRU-индекс в памяти процесса (ключ -> размер); попадание обновляет mtime файла,
+      чтобы порядок вытеснения видели и другие процессы;
+    - при превышении max_bytes каталог перечитывается (чужие записи тоже считаются)
+      и удаляются самые старые по mtime, пока не останется EVICT_TO_RATIO от лимита.
+    """
+
+    EVICT_TO_RATIO = 0.9
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        self._root_override = root
+        self._max_bytes_override = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        if self._root_override:
+            return Path(self._root_override)
+        return Path(settings.IMAGE_CACHE_PATH or Path(settings.IMAGE_STORAGE_PATH) / "_cache")
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes_override if self._max_bytes_override is not None else settings.IMAGE_CACHE_MAX_BYTES
+
+    def _path(self, key: str) -> Path:
+        if not _KEY_RE.match(key):
+            raise ValueError(f"invalid image cache key: {key!r}")
+        return self.root / key[:2] / f"{key}.png"
+
+    # ---------- sync (выполняются в потоке) ----------
+
+    def _scan(self) -> None:
+        entries = []
+        if self.root.exists():
+            for path in self.root.glob("*/*.png"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, path.stem, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._index.values())
+        self._loaded = True
+
+    def _get_sync(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._total -= size
+            return None
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = len(data)
+                self._total += len(data)
+            self._index.move_to_end(key)
+        return data
+
+    def _put_sync(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if not self._loaded:
+                self._scan()
+            self._total += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._scan()
+        target = int(self.max_bytes * self.EVICT_TO_RATIO)
+        while self._total > target and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+        logger.info("image_cache_evicted", extra={"bytes": self._total, "entries": len(self._index)})
+
+    # ---------- async API ----------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        try:
+            await asyncio.to_thread(self._put_sync, key, data)
+        except OSError:
+            # кэш — оптимизация: нет места/прав — просто не кэшируем
+            logger.warning("image_cache_put_failed", extra={"key": key}, exc_info=True)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._index), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+image_cache = DiskImageCache()
@@ -0,0 +1,73 @@
+# app/images/processing.py
+"""
+CPU-тяжёлые операции над картинками (PIL): декодирование, ресайз, рендер текста, PNG-кодирование.
+
+Внутри конвейера картинка живёт как объект PIL.Image: фон декодируется один раз,
+ресайз/кадрирование и текст применяются к нему в памяти, PNG кодируется один раз —
+при выдаче результата. Наружу (в пул процессов "images", app.services.cpu_pool)
+ходят только байты: compose_image принимает и возвращает PNG.
+"""
+from __future__ import annotations
+
+import io
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.config import settings
+from app.images.template_renderer import TemplateRenderer
+
+
+def _parse_size(s: str) -> Tuple[int, int]:
+    w, h = s.lower().split("x")
+    return int(w), int(h)
+
+
+def decode_image(image_bytes: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(image_bytes))
+    # convert() всегда копирует; фон от генератора обычно уже RGB — лишняя копия 1536x1024 не нужна
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def encode_png(img: Image.Image, compress_level: Optional[int] = None) -> bytes:
+    level = settings.IMAGE_PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+    out = io.BytesIO()
+    img.save(out, format="PNG", compress_level=level)
+    return out.getvalue()
+
+
+def cover(img: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+    """
+    Масштаб “cover” + центральное кадрирование за один проход:
+    LANCZOS считается только по видимой области исходника (box), без промежуточной картинки.
+    """
+    tw, th = target_size
+    w, h = img.size
+    scale = max(tw / w, th / h)
+    cw, ch = tw / scale, th / scale
+    left, top = (w - cw) / 2, (h - ch) / 2
+    return img.resize((tw, th), Image.LANCZOS, box=(left, top, left + cw, top + ch))
+
+
+def resize_to_target(image_bytes: bytes, target_size: str) -> bytes:
+    img = decode_image(image_bytes)
+    return encode_png(img.resize(_parse_size(target_size), Image.LANCZOS))
+
+
+def compose_image(
+    background_bytes: bytes,
+    target_size: Tuple[int, int],
+    *,
+    overlay: Optional[Dict[str, str]] = None,
+    layout: str = "center",
+    palette: Optional[List[str]] = None,
+    compress_level: Optional[int] = None,
+) -> bytes:
+    """
+    Фон -> cover под target_size -> (overlay: текст шаблона) -> PNG.
+    Одно декодирование и одно кодирование на картинку; overlay=None — только ресайз (режим simple).
+    """
+    img = cover(decode_image(background_bytes), target_size)
+    if overlay is not None:
+        TemplateRenderer().draw_on(img, overlay, layout, palette)
+    return encode_png(img, compress_level)
@@ -0,0 +1,170 @@
+# app/images/storage.py
+"""
+Хранилище готовых картинок.
+
+Путь вычисляется из id: <IMAGE_STORAGE_PATH>/<id[:2]>/<id[2:4]>/<id>.png — поиск O(1)
+без обхода каталога, одинаковый во всех экземплярах и воркерах. Метаданные (владелец,
+пресет, хэш промпта, размер) пишутся в таблицу images в момент сохранения.
+
+Перенос картинок из прежней раскладки <root>/<user_id>/<id>.png:
+    python -m app.images.storage migrate
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_IMAGE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_SHARD_RE = re.compile(r"^[0-9a-f]{2}$")
+
+
+@dataclass
+class StoredImageRecord:
+    id: str
+    user_id: str
+    path: str  # относительно IMAGE_STORAGE_PATH
+    size_bytes: int
+    preset_id: Optional[str]
+    prompt_hash: Optional[str]
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()
+
+
+def image_relpath(image_id: str) -> str:
+    if not _IMAGE_ID_RE.match(image_id or ""):
+        raise ValueError(f"invalid image id: {image_id!r}")
+    return f"{image_id[:2]}/{image_id[2:4]}/{image_id}.png"
+
+
+def image_path(image_id: str) -> Optional[Path]:
+    """Путь к картинке, если она есть на диске (невалидный id -> None)."""
+    try:
+        path = Path(settings.IMAGE_STORAGE_PATH) / image_relpath(image_id)
+    except ValueError:
+        return None
+    return path if path.is_file() else None
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+async def save_image(
+    image_bytes: bytes,
+    *,
+    user_id: str,
+    preset_id: Optional[str] = None,
+    prompt_hash: Optional[str] = None,
+) -> StoredImageRecord:
+    image_id = uuid.uuid4().hex
+    rel = image_relpath(image_id)
+    await asyncio.to_thread(_write_atomic, Path(settings.IMAGE_STORAGE_PATH) / rel, image_bytes)
+    return StoredImageRecord(
+        id=image_id,
+        user_id=user_id or "anonymous",
+        path=rel,
+        size_bytes=len(image_bytes),
+        preset_id=preset_id,
+        prompt_hash=prompt_hash,
+    )
+
+
+async def record_images(records: List[StoredImageRecord]) -> None:
+    """
+    Строки в images одним INSERT. Файл уже на диске и находится по id,
+    поэтому сбой записи метаданных только логируем.
+    """
+    if not records:
+        return
+    from app.db import AsyncSessionLocal
+    from app.models import StoredImage
+
+    try:
+        async with AsyncSessionLocal() as session:
+            session.add_all([StoredImage(**asdict(r)) for r in records])
+            await session.commit()
+    except Exception:
+        logger.warning("image_record_failed", extra={"image_ids": [r.id for r in records]}, exc_info=True)
+
+
+# ------------- перенос из прежней раскладки (CLI) -------------
+
+
+async def _migrate_legacy(root: Path) -> int:
+    from sqlalchemy import select
+
+    from app.db import AsyncSessionLocal
+    from app.models import StoredImage
+
+    moved = 0
+    async with AsyncSessionLocal() as session:
+        # каталоги шардов и служебные (_cache) пропускаем — остальное каталоги пользователей
+        user_dirs = [
+            p for p in root.iterdir() if p.is_dir() and not _SHARD_RE.match(p.name) and not p.name.startswith("_")
+        ]
+        for user_dir in sorted(user_dirs):
+            for old in user_dir.glob("*.png"):
+                image_id = old.stem
+                if not _IMAGE_ID_RE.match(image_id):
+                    continue
+                rel = image_relpath(image_id)
+                new = root / rel
+                new.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(old, new)
+                exists = await session.execute(select(StoredImage.id).where(StoredImage.id == image_id))
+                if exists.scalar_one_or_none() is None:
+                    session.add(
+                        StoredImage(
+                            id=image_id,
+                            user_id=user_dir.name,
+                            path=rel,
+                            size_bytes=new.stat().st_size,
+                            preset_id=None,
+                            prompt_hash=None,
+                            created_at=datetime.utcfromtimestamp(new.stat().st_mtime),
+                        )
+                    )
+                moved += 1
+            await session.commit()
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Image storage maintenance")
+    parser.add_argument("command", choices=["migrate"], help="migrate: <root>/<user>/<id>.png -> sharded layout")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        moved = asyncio.run(_migrate_legacy(Path(settings.IMAGE_STORAGE_PATH)))
+        print(f"moved {moved} images to the sharded layout")
+
+
+if __name__ == "__main__":
+    main()
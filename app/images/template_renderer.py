@@ -63,15 +63,19 @@ class TemplateRenderer:
         draw_line(subtitle, subtitle_font)
         draw_line(cta, cta_font)
 
-    def render(
+    def draw_on(
         self,
-        background_bytes: bytes,
+        img: Image.Image,
         overlay: Dict[str, str],
         layout: str,
         palette: list[str] | None = None,
-    ) -> bytes:
+    ) -> Image.Image:
+        """
+        Рисует текст прямо на img (RGB) и возвращает его же — без декодирования и кодирования.
+        Подложка под текст непрозрачная: раньше (0, 0, 0, 160) рисовалась в RGBA без смешивания,
+        и альфа всё равно отбрасывалась при конвертации в RGB — результат тот же попиксельно.
+        """
         palette = palette or ["#FFFFFF"]
-        img = Image.open(io.BytesIO(background_bytes)).convert("RGBA")
         draw = ImageDraw.Draw(img)
         width, height = img.size
 
@@ -94,7 +98,7 @@ class TemplateRenderer:
             )
             draw.rectangle(
                 [text_box[0], text_box[1], text_box[2], text_box[3]],
-                fill=(0, 0, 0, 160),
+                fill=(0, 0, 0),
             )
         else:
             text_box = (
@@ -105,7 +109,18 @@ class TemplateRenderer:
             )
 
         self._draw_text_block(draw, text_box, overlay, palette)
+        return img
+
+    def render(
+        self,
+        background_bytes: bytes,
+        overlay: Dict[str, str],
+        layout: str,
+        palette: list[str] | None = None,
+    ) -> bytes:
+        img = Image.open(io.BytesIO(background_bytes)).convert("RGB")
+        self.draw_on(img, overlay, layout, palette)
 
         output = io.BytesIO()
-        img.convert("RGB").save(output, format="PNG")
+        img.save(output, format="PNG")
         return output.getvalue()
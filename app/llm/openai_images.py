@@ -14,6 +14,9 @@ log = logging.getLogger(__name__)
 
 RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
 
+# лимит одновременных генераций на процесс: параллельные варианты не упрутся в rate limit провайдера
+_generation_slots = asyncio.Semaphore(max(1, settings.IMAGE_MAX_CONCURRENCY))
+
 
 def _is_gpt_image_model(model: str) -> bool:
     m = (model or "").lower()
@@ -120,15 +123,16 @@ async def generate_image(
 
         raise RuntimeError("OpenAI image generation failed") from last_error
 
-    # 1) Пытаемся основной моделью
-    try:
-        return await _call(model)
-    except httpx.HTTPStatusError as e:
-        resp = e.response
-        body = resp.text if resp is not None else ""
-        # 2) Fallback: если gpt-image-* требует verification — пробуем dall-e-3
-        if resp is not None and resp.status_code == 403 and _is_verification_error(body):
-            fallback_model = getattr(settings, "FALLBACK_IMAGE_MODEL", "dall-e-3")
-            log.warning("Falling back to %s because org is not verified for %s", fallback_model, model)
-            return await _call(fallback_model)
-        raise
+    async with _generation_slots:
+        # 1) Пытаемся основной моделью
+        try:
+            return await _call(model)
+        except httpx.HTTPStatusError as e:
+            resp = e.response
+            body = resp.text if resp is not None else ""
+            # 2) Fallback: если gpt-image-* требует verification — пробуем dall-e-3
+            if resp is not None and resp.status_code == 403 and _is_verification_error(body):
+                fallback_model = getattr(settings, "FALLBACK_IMAGE_MODEL", "dall-e-3")
+                log.warning("Falling back to %s because org is not verified for %s", fallback_model, model)
+                return await _call(fallback_model)
+            raise
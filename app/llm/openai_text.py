@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Any, Dict, List, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import httpx
 
@@ -12,6 +14,33 @@ log = logging.getLogger(__name__)
 
 RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
 
+_USAGE_METER: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_usage_meter", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[Dict[str, int]]:
+    """
+    Суммирует usage всех chat()-вызовов внутри блока (включая дочерние asyncio-задачи,
+    созданные внутри). Нужен, чтобы считать стоимость фоновой работы.
+    """
+    meter = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    token = _USAGE_METER.set(meter)
+    try:
+        yield meter
+    finally:
+        _USAGE_METER.reset(token)
+
+
+def _record_usage(usage: Dict[str, Any]) -> None:
+    meter = _USAGE_METER.get()
+    if meter is None:
+        return
+    for key in meter:
+        try:
+            meter[key] += int(usage.get(key) or 0)
+        except (TypeError, ValueError):
+            continue
+
 
 def _extract_output_text(data: Dict[str, Any]) -> str:
     """
@@ -160,6 +189,7 @@ async def chat(
 
                 resp.raise_for_status()
                 data = resp.json()
+                _record_usage(data.get("usage", {}) or {})
 
                 content = _extract_output_text(data)
 
@@ -174,6 +204,7 @@ async def chat(
 
                     content2 = _extract_output_text(data2).strip()
                     usage2 = data2.get("usage", {}) or {}
+                    _record_usage(usage2)
 
                     if not content2:
                         raise RuntimeError(f"Responses returned no text even after retry: {data2}")
@@ -1,12 +1,18 @@
 from fastapi import FastAPI
+from sqlalchemy import text
 
 from pathlib import Path
 
 from app.config import settings
 from app.db import engine
 from app.logging import setup_logging
-from app.models import Base
-from app.routers import agents_router, tasks_router, images_router, chat_router
+from app.models import ADDED_COLUMNS_DDL, Base
+from app.routers import agents_router, tasks_router, images_router, chat_router, audit_router, watch_router
+from app.services.competitor_watch import competitor_watcher
+from app.services.cpu_pool import shutdown_cpu_pool
+from app.services.crawler import crawler
+from app.services.loop_monitor import loop_lag_monitor
+from app.services.url_cache_sweeper import url_cache_sweeper
 
 setup_logging()
 
@@ -17,15 +23,37 @@ app = FastAPI(title="SMM Swarm API")
 async def on_startup():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for ddl in ADDED_COLUMNS_DDL:
+            await conn.execute(text(ddl))
     Path(settings.IMAGE_STORAGE_PATH).mkdir(parents=True, exist_ok=True)
+    url_cache_sweeper.start()
+    competitor_watcher.start()
+    loop_lag_monitor.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await url_cache_sweeper.stop()
+    await competitor_watcher.stop()
+    await crawler.aclose()
+    await loop_lag_monitor.stop()
+    shutdown_cpu_pool()
 
 
 app.include_router(agents_router)
 app.include_router(tasks_router)
 app.include_router(images_router)
 app.include_router(chat_router)
+app.include_router(audit_router)
+app.include_router(watch_router)
 
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/health/loop")
+async def health_loop():
+    """Задержка event loop за последнюю минуту (см. LoopLagMonitor)."""
+    return loop_lag_monitor.stats()
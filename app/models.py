@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, DateTime, Float, ForeignKey, Integer, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -51,6 +51,8 @@ class Conversation(Base):
     user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
     summary: Mapped[str | None] = mapped_column(Text, nullable=True)
     facts_json: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    # тариф пользователя (SPECULATIVE_TIERS и др.) — задаётся на сервере, не клиентом
+    tier: Mapped[str] = mapped_column(String(32), default="default", server_default="default")
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     messages: Mapped[list["Message"]] = relationship(back_populates="conversation")
@@ -76,5 +78,105 @@ class UrlCache(Base):
     url: Mapped[str] = mapped_column(String(2048), primary_key=True)
     extracted_text_hash: Mapped[str] = mapped_column(String(128))
     summary_json: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    # валидаторы для условного запроса при обновлении (If-None-Match / If-Modified-Since)
+    etag: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String(64), nullable=True)
     expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class ScopeDecision(Base):
+    __tablename__ = "scope_decisions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
+    text: Mapped[str] = mapped_column(Text)
+    in_scope: Mapped[bool] = mapped_column(Boolean)
+    source: Mapped[str] = mapped_column(String(32), index=True)  # keywords / classifier / llm
+    confidence: Mapped[float | None] = mapped_column(Float, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class TurnContext(Base):
+    """Состояние последнего хода диалога (одна строка на пользователя)."""
+
+    __tablename__ = "turn_contexts"
+
+    user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    last_intent: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    last_in_scope: Mapped[bool] = mapped_column(Boolean, default=False)
+    actions: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    # контекст хода для быстрых нажатий actions (без повторного анализа ссылок)
+    url_summaries: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    url_insights: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class UrlInsightCache(Base):
+    """LLM-разбор страницы: общий для всех пользователей, ключ — (хэш извлечённого текста, версия промпта)."""
+
+    __tablename__ = "url_insight_cache"
+
+    content_hash: Mapped[str] = mapped_column(String(128), primary_key=True)
+    prompt_version: Mapped[str] = mapped_column(String(128), primary_key=True)
+    insight_json: Mapped[Any] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class StoredImage(Base):
+    """Сгенерированная картинка; файл лежит по пути из app.images.storage.image_relpath(id)."""
+
+    __tablename__ = "images"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(128), index=True)
+    path: Mapped[str] = mapped_column(String(255))
+    size_bytes: Mapped[int] = mapped_column(Integer)
+    preset_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    prompt_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class UrlFetchLease(Base):
+    """Кто из воркеров сейчас качает url: остальные ждут заполнения url_cache, а не качают сами."""
+
+    __tablename__ = "url_fetch_leases"
+
+    url: Mapped[str] = mapped_column(String(2048), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(255))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class WatchedUrl(Base):
+    """Страница конкурента под наблюдением: периодический перезапрос и сравнение с прошлым снимком."""
+
+    __tablename__ = "watched_urls"
+    __table_args__ = (UniqueConstraint("user_id", "url", name="uq_watched_urls_user_url"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(128), index=True)
+    url: Mapped[str] = mapped_column(String(2048))
+    interval_seconds: Mapped[int] = mapped_column(Integer)
+    # последний снимок: сводка UrlAnalyzer и её extracted_text_hash
+    extracted_text_hash: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    last_summary: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    last_insights: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    last_diff: Mapped[Any | None] = mapped_column(JSONB, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    checks: Mapped[int] = mapped_column(Integer, default=0)
+    changes: Mapped[int] = mapped_column(Integer, default=0)
+    last_checked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_changed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    next_check_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+# create_all не добавляет колонки и индексы в уже существующие таблицы — докатываем их при старте
+ADDED_COLUMNS_DDL = [
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS tier VARCHAR(32) NOT NULL DEFAULT 'default'",
+    "ALTER TABLE url_cache ADD COLUMN IF NOT EXISTS etag VARCHAR(512)",
+    "ALTER TABLE url_cache ADD COLUMN IF NOT EXISTS last_modified VARCHAR(64)",
+    "ALTER TABLE turn_contexts ADD COLUMN IF NOT EXISTS url_summaries JSONB",
+    "ALTER TABLE turn_contexts ADD COLUMN IF NOT EXISTS url_insights JSONB",
+    "CREATE INDEX IF NOT EXISTS ix_url_insight_cache_created_at ON url_insight_cache (created_at)",
+]
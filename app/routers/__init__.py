@@ -2,5 +2,7 @@ from .agents import router as agents_router
 from .tasks import router as tasks_router
 from .images import router as images_router
 from .chat_router import router as chat_router
+from .audit import router as audit_router
+from .watch import router as watch_router
 
-__all__ = ["agents_router", "tasks_router", "images_router", "chat_router"]
+__all__ = ["agents_router", "tasks_router", "images_router", "chat_router", "audit_router", "watch_router"]
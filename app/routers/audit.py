@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from app.schemas import AuditBatchRequest
+from app.services.competitor_audit import run_batch_audit
+
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+
+@router.post("/batch")
+async def audit_batch(payload: AuditBatchRequest):
+    """
+    Аудит списка конкурентов (ссылки или @handle).
+    Ответ — NDJSON: строка на каждую ссылку по мере готовности, последняя строка — type=digest.
+    """
+
+    async def _lines() -> AsyncIterator[str]:
+        async for event in run_batch_audit(payload.targets, with_insights=payload.insights):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
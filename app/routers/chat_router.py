@@ -1,39 +1,239 @@
 from __future__ import annotations
 
 import logging
+import re
 import uuid
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.db import get_session
 from app.models import Conversation, Message
-from app.schemas import ChatMessageRequest, ChatMessageResponse
-from app.services.assistant_core import generate_assistant_reply
+from app.schemas import ChatActionRequest, ChatMessageRequest, ChatMessageResponse
+from app.services.assistant_core import generate_assistant_reply, prepare_url_context, same_pages
 from app.services.assistant_normalizer import normalize_assistant_payload
 from app.services.facts_extractor import extract_facts
 from app.services.image_orchestrator import ImageOrchestrator
 from app.services.intent_router import detect_intent
+from app.services.message_features import MessageFeatures, extract_message_features
 from app.services.qc_shortener import qc_shorten
 from app.services.response_policy import enforce_policy
 from app.services.scope_guard import scope_guard  # <-- ДОБАВИЛИ
+from app.services.speculative import speculative_executor
 from app.services.summary_updater import update_summary
-from app.services.url_analyzer import UrlAnalyzer, extract_urls
+from app.services.turn_context import (
+    find_action,
+    load_turn_context,
+    remember_turn,
+    scope_context_from,
+)
+from app.services.url_analyzer import UrlAnalyzer
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 logger = logging.getLogger(__name__)
 
+# единственный довесок к тексту action, который бот добавляет сам (bot/handlers/chat.py, _augment_text_for_image_request)
+_IMAGE_HINTS_RE = re.compile(
+    r"\n\n\[image_hints: (?:style=(?:minimal|bright|premium)(?:, variants=[23])?|variants=[23])\]"
+)
+
+
+async def _load_last_messages(session: AsyncSession, user_id: str) -> List[Dict[str, str]]:
+    messages_result = await session.execute(
+        select(Message)
+        .where(Message.user_id == user_id)
+        .order_by(desc(Message.created_at))
+        .limit(20)
+    )
+    messages = list(reversed(messages_result.scalars().all()))
+    return [{"role": m.role, "text": m.text} for m in messages]
+
+
+def _has_text_besides_urls(features: MessageFeatures) -> bool:
+    text = features.text
+    for url in features.urls:
+        text = text.replace(url, " ")
+    return any(ch.isalnum() for ch in text)
+
+
+def _split_action_text(action_text: str, client_text: Optional[str]) -> Tuple[str, str]:
+    """
+    (текст хода, непроверенный довесок клиента).
+    Подсказки [image_hints: ...] от бота принимаются как есть; любой другой довесок к тексту action
+    возвращается отдельно — его нужно пропустить через scope guard. Текст не с начала action игнорируется.
+    """
+    if not client_text or not client_text.startswith(action_text):
+        return action_text, ""
+    suffix = client_text[len(action_text):]
+    if not suffix or _IMAGE_HINTS_RE.fullmatch(suffix):
+        return client_text, ""
+    return client_text, suffix
+
+
+async def _polish_reply(assistant_raw: Dict[str, Any]) -> Dict[str, Any]:
+    assistant_raw = enforce_policy(assistant_raw)
+    try:
+        assistant_qc = await qc_shorten(assistant_raw)
+    except Exception:
+        logger.exception("qc_shorten failed unexpectedly")
+        assistant_qc = assistant_raw
+    assistant = enforce_policy(assistant_qc)
+    return normalize_assistant_payload(assistant)
+
+
+async def _maybe_generate_image(
+    session: AsyncSession,
+    *,
+    features: MessageFeatures,
+    conversation: Conversation,
+    assistant: Dict[str, Any],
+    user_id: str,
+    request_id: str,
+) -> Optional[Dict[str, Any]]:
+    """
+    Image intent (если пользователь просит картинку).
+    Переписывает reply/actions в assistant и сохраняет второе assistant-сообщение.
+    """
+    if not features.wants_image:
+        return None
+
+    image_orchestrator = ImageOrchestrator()
+    platform = features.image_platform
+    use_case = features.image_use_case
+
+    facts = conversation.facts_json or {}
+    brand: Dict[str, Any] = {
+        "brand_name": facts.get("brand_name"),
+        "product_description": facts.get("product_description"),
+        "audience": facts.get("audience"),
+        "tone": facts.get("tone"),
+        "goals": facts.get("goals"),
+        "channels": facts.get("channels"),
+    }
+
+    # Генерация изображения (лучше message=payload.text — ок, но можно улучшить позже)
+    result = await image_orchestrator.generate(
+        platform=platform,
+        use_case=use_case,
+        message=features.text,
+        brand=brand,
+        overlay=None,
+        variants=1,
+        user_id=user_id,
+        request_id=request_id,
+    )
+
+    image_payload = {
+        "status": "done",
+        "mode": result["mode"],
+        "preset_id": result["preset_id"],
+        "size": result["size"],
+        "images": [{"url": f"/images/{image_id}.png"} for image_id in result["image_ids"]],
+    }
+
+    # UX: переписываем reply, чтобы не было “инструкций”, а было подтверждение
+    assistant["reply"] = (
+        "Сгенерировал креатив ✅\n\n"
+        "Хочешь ещё 2 варианта? Могу сделать: минимализм / яркий-игровой / премиум."
+    )
+    assistant["follow_up_question"] = "Какой стиль выбрать: минимализм / яркий / премиум?"
+    assistant["actions"] = [
+        {"type": "suggestion", "text": "Сделать ещё 2 варианта (разные стили)"},
+        {"type": "suggestion", "text": "Добавить текст на баннер (заголовок + CTA)"},
+    ]
+
+    # (опционально) можно сохранить ещё одно assistant message уже с новым reply
+    # чтобы история совпадала с тем, что увидел пользователь:
+    assistant_message2 = Message(user_id=user_id, role="assistant", text=assistant["reply"])
+    session.add(assistant_message2)
+    return image_payload
+
+
+def _schedule_speculation(
+    *,
+    user_id: str,
+    tier: str,
+    conversation: Conversation,
+    last_messages: List[Dict[str, str]],
+    assistant: Dict[str, Any],
+    actions: List[Dict[str, Any]],
+    url_summaries: List[Dict[str, Any]],
+    url_insights: Optional[Dict[str, Any]],
+) -> None:
+    """
+    Фоном считаем ответ на первую (самую вероятную) кнопку тем же путём, что и /chat/action.
+    Картинки не спекулируем — слишком дорого для промаха.
+    """
+    if not actions or not speculative_executor.enabled_for(tier):
+        return
+    top = actions[0]
+    text = top.get("text") or ""
+    features = extract_message_features(text)
+    if features.wants_image:
+        return
+
+    summary = conversation.summary or ""
+    facts_json = dict(conversation.facts_json or {})
+    history = list(last_messages) + [
+        {"role": "assistant", "text": assistant.get("reply", "")},
+        {"role": "user", "text": text},
+    ]
+
+    async def _compute() -> Dict[str, Any]:
+        assistant_raw = await generate_assistant_reply(
+            user_message=text,
+            summary=summary,
+            facts_json=facts_json,
+            last_messages=history[-10:],
+            url_summaries=url_summaries,
+            url_insights=url_insights,
+            features=features,
+        )
+        return await _polish_reply(assistant_raw)
+
+    speculative_executor.schedule(user_id, top["id"], _compute, tier=tier)
+
+
+async def _blocked_reply(
+    session: AsyncSession, user_id: str, turn: Any, blocked_payload: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Ответ scope guard на запрос не по теме: сохраняем его как ход вне темы и отдаём клиенту."""
+    blocked_payload = enforce_policy(blocked_payload)
+    blocked_payload = normalize_assistant_payload(blocked_payload)
+
+    assistant_message = Message(
+        user_id=user_id, role="assistant", text=blocked_payload.get("reply", "")
+    )
+    session.add(assistant_message)
+    turn = remember_turn(
+        session,
+        user_id,
+        turn,
+        intent="other",
+        in_scope=False,
+        actions=blocked_payload.get("actions", []),
+    )
+    await session.commit()
+
+    return {
+        "reply": blocked_payload.get("reply", ""),
+        "follow_up_question": blocked_payload.get("follow_up_question"),
+        "actions": turn.actions or [],
+        "debug": {"intent": "other", "used_url": False, "scope_blocked": True},
+        "image": None,
+    }
+
 
 @router.post("/message", response_model=ChatMessageResponse)
 async def chat_message(
     payload: ChatMessageRequest,
     session: AsyncSession = Depends(get_session),
 ):
-    image_orchestrator = ImageOrchestrator()
     request_id = uuid.uuid4().hex
     user_id = payload.user_id
 
@@ -54,56 +254,61 @@ async def chat_message(
     session.add(user_message)
     await session.commit()
 
+    # пользователь написал сам — предвычисленный ответ на кнопку больше не нужен
+    speculative_executor.discard(user_id)
+
+    # один проход по тексту: ключевые слова, ссылки, маркеры платформ
+    features = extract_message_features(payload.text)
+    turn = await load_turn_context(session, user_id)
+
     # ---------------------------
     # 1) Scope guard (маркетинг only)
     # ---------------------------
-    ok, blocked_payload = await scope_guard(payload.text, use_llm_fallback=True)
+    ok, blocked_payload = await scope_guard(
+        payload.text,
+        use_llm_fallback=True,
+        features=features,
+        db_session=session,
+        user_id=user_id,
+        context=scope_context_from(turn),
+    )
     if not ok and blocked_payload:
-        blocked_payload = enforce_policy(blocked_payload)
-        blocked_payload = normalize_assistant_payload(blocked_payload)
-
-        assistant_message = Message(
-            user_id=user_id, role="assistant", text=blocked_payload.get("reply", "")
-        )
-        session.add(assistant_message)
-        await session.commit()
-
-        return {
-            "reply": blocked_payload.get("reply", ""),
-            "follow_up_question": blocked_payload.get("follow_up_question"),
-            "actions": blocked_payload.get("actions", []),
-            "debug": {"intent": "other", "used_url": False, "scope_blocked": True},
-            "image": None,
-        }
+        return await _blocked_reply(session, user_id, turn, blocked_payload)
 
     # ---------------------------
     # 2) Load recent messages
     # ---------------------------
-    messages_result = await session.execute(
-        select(Message)
-        .where(Message.user_id == user_id)
-        .order_by(desc(Message.created_at))
-        .limit(20)
-    )
-    messages = list(reversed(messages_result.scalars().all()))
-    last_messages = [{"role": m.role, "text": m.text} for m in messages]
+    last_messages = await _load_last_messages(session, user_id)
 
     # ---------------------------
     # 3) URL analyze (если есть ссылки)
     # ---------------------------
     url_analyzer = UrlAnalyzer(session)
-    url_data = await url_analyzer.analyze(payload.text)
+    url_data = await url_analyzer.analyze(
+        payload.text,
+        features=features,
+        deadline=settings.URL_ANALYZE_DEADLINE_SECONDS or None,
+    )
     used_url = url_data is not None
+    new_url_summaries = url_data.url_summaries if url_data else None
+    if url_data is None and turn is not None and any(s.get("pending") for s in turn.url_summaries or []):
+        # ссылки прошлого хода не успели к ответу и догрузились в фоне — подхватываем полный анализ
+        new_url_summaries = await url_analyzer.resolve_pending(turn.url_summaries)
 
     # ---------------------------
     # 4) Facts update
     # ---------------------------
-    facts_update = await extract_facts(
-        current_facts=conversation.facts_json or {},
-        last_user_message=payload.text,
-        url_summaries=url_data.url_summaries if url_data else None,
-    )
-    conversation.facts_json = facts_update["facts"]
+    # страницы те же, что на прошлом ходе (304 / тот же content_hash) — факты по ним уже извлечены
+    facts_url_summaries = new_url_summaries
+    if new_url_summaries and turn is not None and same_pages(new_url_summaries[:3], turn.url_summaries):
+        facts_url_summaries = None
+    if facts_url_summaries or _has_text_besides_urls(features):
+        facts_update = await extract_facts(
+            current_facts=conversation.facts_json or {},
+            last_user_message=payload.text,
+            url_summaries=facts_url_summaries,
+        )
+        conversation.facts_json = facts_update["facts"]
 
     # ---------------------------
     # 5) Summary update
@@ -116,107 +321,186 @@ async def chat_message(
     # ---------------------------
     # 6) Assistant core (LLM)
     # ---------------------------
+    reply_facts, url_summaries, url_insights = await prepare_url_context(
+        payload.text,
+        conversation.facts_json or {},
+        new_url_summaries,
+        previous_url_context=(turn.url_summaries or [], turn.url_insights) if turn is not None else None,
+        db_session=session,
+    )
     assistant_raw = await generate_assistant_reply(
         user_message=payload.text,
         summary=conversation.summary or "",
-        facts_json=conversation.facts_json or {},
+        facts_json=reply_facts,
         last_messages=last_messages[-10:],
-        url_summaries=url_data.url_summaries if url_data else None,
+        url_summaries=url_summaries,
+        url_insights=url_insights,
+        features=features,
     )
-    assistant_raw = enforce_policy(assistant_raw)
-    try:
-        assistant_qc = await qc_shorten(assistant_raw)
-    except Exception:
-        logger.exception("qc_shorten failed unexpectedly")
-        assistant_qc = assistant_raw
-    assistant = enforce_policy(assistant_qc)
-    assistant = normalize_assistant_payload(assistant)
+    assistant = await _polish_reply(assistant_raw)
 
-    if not used_url and url_data is None and extract_urls(payload.text):
+    if not used_url and url_data is None and features.has_urls:
         assistant["reply"] = (assistant.get("reply") or "")
 
+    intent = detect_intent(payload.text, features=features)
+
     # persist assistant msg (по умолчанию — текст)
     assistant_message = Message(user_id=user_id, role="assistant", text=assistant.get("reply", ""))
     session.add(assistant_message)
+    turn = remember_turn(
+        session,
+        user_id,
+        turn,
+        intent=intent,
+        in_scope=True,
+        actions=assistant.get("actions", []),
+        url_context=(url_summaries, url_insights),
+    )
     await session.commit()
 
-    intent = detect_intent(payload.text)
-
     # ---------------------------
     # 7) Image intent (если пользователь просит картинку)
     # ---------------------------
-    image_payload = None
-
-    txt = (payload.text or "").lower()
-    wants_image = any(
-        k in txt
-        for k in [
-            "сгенерируй картин",
-            "сделай картин",
-            "картинк",
-            "баннер",
-            "креатив",
-            "обложк",
-            "визуал",
-            "изображен",
-        ]
-    )
-
-    if wants_image:
-        platform = "vk" if ("вк" in txt or "vk" in txt) else "auto"
-        use_case = "ad_post" if ("реклам" in txt or "промо" in txt) else "post"
-
-        facts = conversation.facts_json or {}
-        brand: Dict[str, Any] = {
-            "brand_name": facts.get("brand_name"),
-            "product_description": facts.get("product_description"),
-            "audience": facts.get("audience"),
-            "tone": facts.get("tone"),
-            "goals": facts.get("goals"),
-            "channels": facts.get("channels"),
-        }
-
-        # Генерация изображения (лучше message=payload.text — ок, но можно улучшить позже)
-        result = await image_orchestrator.generate(
-            platform=platform,
-            use_case=use_case,
-            message=payload.text,
-            brand=brand,
-            overlay=None,
-            variants=1,
-            user_id=user_id,
-            request_id=request_id,
+    image_payload = await _maybe_generate_image(
+        session,
+        features=features,
+        conversation=conversation,
+        assistant=assistant,
+        user_id=user_id,
+        request_id=request_id,
+    )
+    if image_payload:
+        turn = remember_turn(session, user_id, turn, intent=intent, in_scope=True, actions=assistant["actions"])
+        await session.commit()
+
+    _schedule_speculation(
+        user_id=user_id,
+        tier=conversation.tier or "default",
+        conversation=conversation,
+        last_messages=last_messages,
+        assistant=assistant,
+        actions=turn.actions or [],
+        url_summaries=url_summaries,
+        url_insights=url_insights,
+    )
+
+    return {
+        "reply": assistant.get("reply", ""),
+        "follow_up_question": assistant.get("follow_up_question"),
+        "actions": turn.actions or [],
+        "debug": {
+            "intent": intent,
+            "used_url": used_url,
+            "url_pending": url_data.pending_urls if url_data else [],
+        },
+        "image": image_payload,
+    }
+
+
+@router.post("/action", response_model=ChatMessageResponse)
+async def chat_action(
+    payload: ChatActionRequest,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Быстрый путь для нажатия action-кнопки.
+    Нового текста от пользователя нет (кроме подсказок [image_hints: ...] от бота; любой другой довесок
+    к тексту action проверяется scope guard), поэтому не гоняем анализ ссылок,
+    извлечение фактов и обновление summary — берём контекст хода из turn_contexts
+    и сразу генерируем ответ (reply + QC вместо 4–6 LLM-вызовов).
+    """
+    request_id = uuid.uuid4().hex
+    user_id = payload.user_id
+
+    conversation = await session.get(Conversation, user_id)
+    turn = await load_turn_context(session, user_id)
+    action = find_action(turn, payload.action_id)
+    if conversation is None or action is None:
+        raise HTTPException(status_code=404, detail="Action not found")
+
+    action_text = action.get("text") or ""
+    text, extra_text = _split_action_text(action_text, payload.text)
+    logger.info(
+        "chat_action",
+        extra={"request_id": request_id, "user_id": user_id, "agent_type": "assistant"},
+    )
+
+    session.add(Message(user_id=user_id, role="user", text=text))
+    await session.commit()
+
+    if extra_text.strip():
+        # довесок написал не наш бот: проверяем его как обычное сообщение (без контекста хода)
+        ok, blocked_payload = await scope_guard(
+            extra_text, use_llm_fallback=True, db_session=session, user_id=user_id
         )
+        if not ok and blocked_payload:
+            return await _blocked_reply(session, user_id, turn, blocked_payload)
 
-        image_payload = {
-            "status": "done",
-            "mode": result["mode"],
-            "preset_id": result["preset_id"],
-            "size": result["size"],
-            "images": [{"url": f"/images/{image_id}.png"} for image_id in result["image_ids"]],
-        }
-
-        # UX: переписываем reply, чтобы не было “инструкций”, а было подтверждение
-        assistant["reply"] = (
-            "Сгенерировал креатив ✅\n\n"
-            "Хочешь ещё 2 варианта? Могу сделать: минимализм / яркий-игровой / премиум."
+    features = extract_message_features(text)
+    last_messages = await _load_last_messages(session, user_id)
+    url_summaries = turn.url_summaries or []
+    url_insights = turn.url_insights
+
+    # спекуляция считалась по тексту action без подсказок клиента — с подсказками она не подходит
+    assistant = None
+    if text == action_text:
+        assistant = await speculative_executor.claim(user_id, payload.action_id)
+    speculative_hit = assistant is not None
+    if assistant is None:
+        assistant_raw = await generate_assistant_reply(
+            user_message=text,
+            summary=conversation.summary or "",
+            facts_json=conversation.facts_json or {},
+            last_messages=last_messages[-10:],
+            url_summaries=url_summaries,
+            url_insights=url_insights,
+            features=features,
         )
-        assistant["follow_up_question"] = "Какой стиль выбрать: минимализм / яркий / премиум?"
-        assistant["actions"] = [
-            {"type": "suggestion", "text": "Сделать ещё 2 варианта (разные стили)"},
-            {"type": "suggestion", "text": "Добавить текст на баннер (заголовок + CTA)"},
-        ]
-
-        # (опционально) можно сохранить ещё одно assistant message уже с новым reply
-        # чтобы история совпадала с тем, что увидел пользователь:
-        assistant_message2 = Message(user_id=user_id, role="assistant", text=assistant["reply"])
-        session.add(assistant_message2)
+        assistant = await _polish_reply(assistant_raw)
+
+    intent = detect_intent(text, features=features)
+
+    session.add(Message(user_id=user_id, role="assistant", text=assistant.get("reply", "")))
+    turn = remember_turn(session, user_id, turn, intent=intent, in_scope=True, actions=assistant.get("actions", []))
+    await session.commit()
+
+    image_payload = await _maybe_generate_image(
+        session,
+        features=features,
+        conversation=conversation,
+        assistant=assistant,
+        user_id=user_id,
+        request_id=request_id,
+    )
+    if image_payload:
+        turn = remember_turn(session, user_id, turn, intent=intent, in_scope=True, actions=assistant["actions"])
         await session.commit()
 
+    _schedule_speculation(
+        user_id=user_id,
+        tier=conversation.tier or "default",
+        conversation=conversation,
+        last_messages=last_messages,
+        assistant=assistant,
+        actions=turn.actions or [],
+        url_summaries=url_summaries,
+        url_insights=url_insights,
+    )
+
     return {
         "reply": assistant.get("reply", ""),
         "follow_up_question": assistant.get("follow_up_question"),
-        "actions": assistant.get("actions", []),
-        "debug": {"intent": intent, "used_url": used_url},
+        "actions": turn.actions or [],
+        "debug": {
+            "intent": intent,
+            "used_url": bool(url_summaries),
+            "action_id": payload.action_id,
+            "speculative_hit": speculative_hit,
+        },
         "image": image_payload,
     }
+
+
+@router.get("/speculative/stats")
+async def speculative_stats():
+    return speculative_executor.stats()
@@ -0,0 +1,64 @@
+# app/routers/watch.py
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import get_session
+from app.models import WatchedUrl
+from app.schemas import WatchCreateRequest, WatchRead
+from app.services.competitor_audit import resolve_target
+
+router = APIRouter(prefix="/watch", tags=["watch"])
+
+
+@router.post("", response_model=WatchRead)
+async def add_watch(payload: WatchCreateRequest, session: AsyncSession = Depends(get_session)):
+    url = resolve_target(payload.target)
+    if url is None:
+        raise HTTPException(status_code=422, detail="Unrecognized target")
+
+    interval = settings.WATCH_DEFAULT_INTERVAL_SECONDS
+    if payload.interval_hours is not None:
+        interval = max(settings.WATCH_MIN_INTERVAL_SECONDS, int(payload.interval_hours * 3600))
+
+    result = await session.execute(
+        select(WatchedUrl).where(WatchedUrl.user_id == payload.user_id, WatchedUrl.url == url)
+    )
+    watch = result.scalar_one_or_none()
+    if watch is None:
+        # первая проверка — на ближайшем тике планировщика
+        watch = WatchedUrl(
+            user_id=payload.user_id,
+            url=url,
+            interval_seconds=interval,
+            checks=0,
+            changes=0,
+            next_check_at=datetime.utcnow(),
+        )
+        session.add(watch)
+    else:
+        watch.interval_seconds = interval
+    await session.commit()
+    await session.refresh(watch)
+    return watch
+
+
+@router.get("", response_model=list[WatchRead])
+async def list_watches(user_id: str = Query(...), session: AsyncSession = Depends(get_session)):
+    result = await session.execute(
+        select(WatchedUrl).where(WatchedUrl.user_id == user_id).order_by(WatchedUrl.created_at)
+    )
+    return result.scalars().all()
+
+
+@router.delete("/{watch_id}")
+async def delete_watch(watch_id: int, user_id: str = Query(...), session: AsyncSession = Depends(get_session)):
+    watch = await session.get(WatchedUrl, watch_id)
+    if watch is None or watch.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Watch not found")
+    await session.delete(watch)
+    await session.commit()
+    return {"deleted": watch_id}
@@ -1,7 +1,10 @@
 # app/schemas.py
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.config import settings
 
 
 class UserCreate(BaseModel):
@@ -104,9 +107,45 @@ class ChatMessageRequest(BaseModel):
     attachments: List[Dict[str, Any]] = []
 
 
+class ChatActionRequest(BaseModel):
+    user_id: str
+    action_id: str
+    # текст action с подсказками бота ([image_hints: ...]); другой довесок к тексту action проходит scope guard
+    text: str | None = None
+
+
 class ChatMessageResponse(BaseModel):
     reply: str
     follow_up_question: str | None
     actions: List[Dict[str, str]]
     debug: Dict[str, Any]
     image: Dict[str, Any] | None = None
+
+
+class AuditBatchRequest(BaseModel):
+    targets: List[str] = Field(..., min_length=1, max_length=settings.AUDIT_BATCH_MAX_TARGETS)  # ссылки или @handle
+    insights: bool = True  # разбор страниц LLM + сводка по рынку в конце
+
+
+class WatchCreateRequest(BaseModel):
+    user_id: str
+    target: str  # ссылка или @handle
+    interval_hours: Optional[float] = None  # None — WATCH_DEFAULT_INTERVAL_SECONDS
+
+
+class WatchRead(BaseModel):
+    id: int
+    user_id: str
+    url: str
+    interval_seconds: int
+    checks: int
+    changes: int
+    last_error: Optional[str] = None
+    last_checked_at: Optional[datetime] = None
+    last_changed_at: Optional[datetime] = None
+    next_check_at: datetime
+    last_diff: Optional[Dict[str, Any]] = None
+    last_insights: Optional[Dict[str, Any]] = None
+
+    class Config:
+        from_attributes = True
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.config import settings
 from app.llm.openai_text import chat as openai_chat
@@ -34,21 +34,29 @@ def _fallback_assistant_payload(raw_text: str) -> Dict[str, Any]:
     }
 
 
-async def generate_assistant_reply(
+def same_pages(current: List[Dict[str, Any]], previous: Optional[List[Dict[str, Any]]]) -> bool:
+    def _keys(summaries: Optional[List[Dict[str, Any]]]) -> set:
+        return {(s.get("url"), s.get("content_hash")) for s in summaries or [] if isinstance(s, dict)}
+
+    keys = _keys(current)
+    return bool(keys) and all(h for _, h in keys) and keys == _keys(previous)
+
+
+async def prepare_url_context(
     user_message: str,
-    summary: str,
     facts_json: Dict[str, Any],
     url_summaries: Optional[List[Dict[str, Any]]] = None,
-    **kwargs,
-) -> Dict[str, Any]:
+    previous_url_context: Optional[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+    db_session: Any = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """
-    Основной генератор ответа ассистента.
-    Важно:
-    - url_summaries: список summaries по ссылкам (до 3)
-    - last_messages: реально пробрасываем (до 8)
+    Подготовка контекста перед ответом (шаги 1–4): IG-инсайты, url_insights, обновление facts.
+    Возвращает (facts_json, url_summaries, url_insights) — результат можно
+    закэшировать на ход и переиспользовать (например, для нажатий actions).
+    previous_url_context=(url_summaries, url_insights) прошлого хода: если страницы
+    не изменились (тот же content_hash), шаги 3–4 не повторяются.
+    db_session — для общего кэша разборов страниц (url_insight_cache).
     """
-    last_messages = kwargs.get("last_messages") or []
-
     # --- 1) intake Instagram инсайтов (если пользователь прислал IG_INSIGHTS)
     ig_intake = parse_instagram_insights(user_message)
     if ig_intake:
@@ -66,11 +74,19 @@ async def generate_assistant_reply(
         url_summaries = []
     url_summaries = url_summaries[:3]
 
+    # --- 3–4) те же страницы, что и в прошлый раз: инсайты и факты по ним уже посчитаны
+    if previous_url_context is not None:
+        prev_summaries, prev_insights = previous_url_context
+        if prev_insights and same_pages(url_summaries, prev_summaries):
+            return facts_json or {}, url_summaries, prev_insights
+
     # --- 3) LLM-инсайты по ссылкам
     url_insights = None
     if url_summaries:
         try:
-            url_insights = await build_url_insights(user_message=user_message, url_summaries=url_summaries)
+            url_insights = await build_url_insights(
+                user_message=user_message, url_summaries=url_summaries, db_session=db_session
+            )
         except Exception:
             url_insights = None
 
@@ -88,9 +104,39 @@ async def generate_assistant_reply(
         except Exception:
             pass
 
+    return facts_json or {}, url_summaries, url_insights
+
+
+async def generate_assistant_reply(
+    user_message: str,
+    summary: str,
+    facts_json: Dict[str, Any],
+    url_summaries: Optional[List[Dict[str, Any]]] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    Основной генератор ответа ассистента.
+    Важно:
+    - url_summaries: список summaries по ссылкам (до 3)
+    - last_messages: реально пробрасываем (до 8)
+    - features: MessageFeatures из роутера (чтобы не сканировать текст повторно)
+    - url_insights: если передан (даже None) — контекст уже подготовлен
+      через prepare_url_context, шаги 1–4 пропускаем
+    """
+    last_messages = kwargs.get("last_messages") or []
+    features = kwargs.get("features")
+
+    if "url_insights" in kwargs:
+        url_insights = kwargs["url_insights"]
+        url_summaries = (url_summaries if isinstance(url_summaries, list) else [])[:3]
+    else:
+        facts_json, url_summaries, url_insights = await prepare_url_context(
+            user_message, facts_json, url_summaries
+        )
+
     # --- 5) стратегия-шаблон (чтобы не было “допроса” и банальщины)
     scaffold: Optional[str] = None
-    if is_strategy_like(user_message):
+    if is_strategy_like(user_message, features=features):
         chosen_summary: Optional[Dict[str, Any]] = None
         for s in url_summaries:
             if isinstance(s, dict) and s.get("ok") is True:
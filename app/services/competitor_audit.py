@@ -0,0 +1,108 @@
+# app/services/competitor_audit.py
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.services.url_analyzer import UrlAnalyzer, extract_targets, normalize_url
+from app.services.url_insights import build_competitor_digest, build_url_insights
+
+
+def resolve_target(target: str) -> Optional[str]:
+    """Ссылка или @handle/“инст coffee.lab” -> нормализованный URL (как в чате)."""
+    found = extract_targets(target or "")
+    return normalize_url(found[0]) if found else None
+
+
+def _compact(summary: Dict[str, Any]) -> Dict[str, Any]:
+    keys = (
+        "ok", "url", "final_url", "status_code", "page_type", "title", "meta_description",
+        "h1", "cta_texts", "warnings", "error", "cache", "elapsed_ms",
+    )
+    return {k: summary.get(k) for k in keys if summary.get(k) is not None}
+
+
+def _stats(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ctas: Counter = Counter()
+    for s in summaries:
+        ctas.update({t.lower() for t in s.get("cta_texts") or []})
+    return {
+        "total": len(summaries),
+        "ok": sum(1 for s in summaries if s.get("ok")),
+        "failed": sum(1 for s in summaries if not s.get("ok")),
+        "blocked": sum(1 for s in summaries if "platform_may_block_scraping" in (s.get("warnings") or [])),
+        "page_types": dict(Counter(s.get("page_type") or "unknown" for s in summaries)),
+        "top_ctas": [t for t, _ in ctas.most_common(10)],
+    }
+
+
+async def _audit_one(url: str, with_insights: bool, sem: asyncio.Semaphore) -> Dict[str, Any]:
+    """Сводка + разбор одной ссылки; сбой не теряет url — он возвращается в поле error."""
+    try:
+        async with sem:
+            # своя сессия на ссылку: задачи идут параллельно
+            async with AsyncSessionLocal() as session:
+                summary = await UrlAnalyzer(session).summarize(url)
+                insights = None
+                if with_insights:
+                    try:
+                        insights = await build_url_insights(
+                            user_message="", url_summaries=[summary], db_session=session
+                        )
+                    except Exception:
+                        insights = None
+    except Exception as e:
+        return {"url": url, "error": f"audit_failed:{type(e).__name__}"}
+    return {"url": url, "summary": summary, "insights": insights}
+
+
+async def run_batch_audit(targets: List[str], *, with_insights: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Аудит списка конкурентов. События по мере готовности:
+      {"type": "url", ...}     — по каждой ссылке (в порядке завершения);
+      {"type": "error", ...}   — цель не распознана как ссылка/handle (target) или аудит ссылки упал (url);
+      {"type": "digest", ...}  — в конце: статистика + сводка по рынку.
+    Параллельность ограничена AUDIT_BATCH_CONCURRENCY; кэш сводок и разборов общий с чатом.
+    """
+    urls: List[str] = []
+    for target in targets[: settings.AUDIT_BATCH_MAX_TARGETS]:
+        url = resolve_target(target)
+        if url is None:
+            yield {"type": "error", "target": target, "error": "unrecognized_target"}
+        elif url not in urls:
+            urls.append(url)
+
+    sem = asyncio.Semaphore(max(1, settings.AUDIT_BATCH_CONCURRENCY))
+    tasks = [asyncio.create_task(_audit_one(u, with_insights, sem)) for u in urls]
+    summaries: List[Dict[str, Any]] = []
+    insights: List[Dict[str, Any]] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            if "error" in item:
+                yield {"type": "error", "url": item["url"], "error": item["error"]}
+                continue
+            summaries.append(item["summary"])
+            if item["insights"]:
+                insights.append(item["insights"])
+            yield {
+                "type": "url",
+                "url": item["url"],
+                "summary": _compact(item["summary"]),
+                "insights": item["insights"],
+            }
+    finally:
+        # клиент отключился посреди стрима — не продолжаем качать остальное
+        for t in tasks:
+            t.cancel()
+
+    digest = None
+    if with_insights and insights:
+        try:
+            digest = await build_competitor_digest(insights)
+        except Exception:
+            digest = None
+    yield {"type": "digest", "stats": _stats(summaries), "digest": digest}
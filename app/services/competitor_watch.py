@@ -0,0 +1,159 @@
+# app/services/competitor_watch.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import WatchedUrl
+from app.services.url_analyzer import UrlAnalyzer
+from app.services.url_insights import build_url_insights
+
+logger = logging.getLogger(__name__)
+
+
+def _added(old: List[str], new: List[str]) -> List[str]:
+    seen = set(old)
+    return [x for x in new if x not in seen]
+
+
+def diff_summaries(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Что поменялось между снимками страницы: заголовок, описание, CTA, заголовки, посты Telegram."""
+    old = old or {}
+    diff: Dict[str, Any] = {}
+    for field in ("title", "meta_description"):
+        if (old.get(field) or "") != (new.get(field) or ""):
+            diff[field] = {"old": old.get(field), "new": new.get(field)}
+
+    for field in ("cta_texts", "h1", "headings"):
+        before, after = list(old.get(field) or []), list(new.get(field) or [])
+        added, removed = _added(before, after), _added(after, before)
+        if added or removed:
+            diff[field] = {"added": added, "removed": removed}
+
+    new_posts = _added(list(old.get("telegram_last_posts") or []), list(new.get("telegram_last_posts") or []))
+    if new_posts:
+        diff["telegram_new_posts"] = new_posts
+    return diff
+
+
+async def refresh_watch(watch: WatchedUrl, analyzer: UrlAnalyzer, *, db_session: Any = None) -> bool:
+    """
+    Одна проверка наблюдаемой страницы (без commit). Возвращает True, если контент изменился.
+
+    Запрос условный (валидаторы прошлой сводки): 304 или тот же extracted_text_hash — страница
+    не разбирается заново и LLM не вызывается. Инсайты и diff считаются только для изменившихся страниц;
+    площадки, которые не загружаются (fetch_skipped), только фиксируются без инсайтов.
+    """
+    now = datetime.utcnow()
+    watch.checks = (watch.checks or 0) + 1
+    watch.last_checked_at = now
+    watch.next_check_at = now + timedelta(seconds=watch.interval_seconds)
+
+    summary = await analyzer.refresh(watch.url, previous=watch.last_summary)
+    if not summary.get("ok"):
+        # временный сбой не считаем изменением: прошлый снимок остаётся базой для сравнения
+        watch.last_error = str(summary.get("error") or "fetch_failed")[:255]
+        return False
+    watch.last_error = None
+    if "fetch_skipped" in (summary.get("warnings") or []):
+        # площадка за логин-стеной: страница не загружалась, разбирать и сравнивать нечего
+        watch.last_summary = summary
+        return False
+
+    new_hash = summary.get("content_hash")
+    if watch.last_summary is not None and new_hash == watch.extracted_text_hash:
+        watch.last_summary = {k: v for k, v in summary.items() if k != "cache"}  # свежие валидаторы
+        return False
+
+    first_snapshot = watch.last_summary is None
+    watch.last_diff = None if first_snapshot else diff_summaries(watch.last_summary, summary)
+    try:
+        watch.last_insights = await build_url_insights(user_message="", url_summaries=[summary], db_session=db_session)
+    except Exception:
+        logger.warning("watch_insights_failed", extra={"url": watch.url}, exc_info=True)
+    watch.extracted_text_hash = new_hash
+    watch.last_summary = {k: v for k, v in summary.items() if k != "cache"}
+    if not first_snapshot:
+        watch.changes = (watch.changes or 0) + 1
+        watch.last_changed_at = now
+    return not first_snapshot
+
+
+class CompetitorWatcher:
+    """
+    Раз в WATCH_TICK_SECONDS берёт наблюдаемые страницы, у которых подошёл next_check_at,
+    и проверяет их (refresh_watch) не более WATCH_CONCURRENCY одновременно.
+
+    Строки забираются через FOR UPDATE SKIP LOCKED со сдвигом next_check_at в той же транзакции —
+    при нескольких воркерах одна страница проверяется одним из них.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if settings.WATCH_TICK_SECONDS <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _claim_due(self) -> List[int]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as session:
+            res = await session.execute(
+                select(WatchedUrl)
+                .where(WatchedUrl.next_check_at <= now)
+                .order_by(WatchedUrl.next_check_at)
+                .limit(settings.WATCH_BATCH)
+                .with_for_update(skip_locked=True)
+            )
+            rows = res.scalars().all()
+            for row in rows:
+                row.next_check_at = now + timedelta(seconds=row.interval_seconds)
+            await session.commit()
+            return [row.id for row in rows]
+
+    async def _check(self, watch_id: int, sem: asyncio.Semaphore) -> bool:
+        async with sem:
+            async with AsyncSessionLocal() as session:
+                watch = await session.get(WatchedUrl, watch_id)
+                if watch is None:
+                    return False
+                changed = await refresh_watch(watch, UrlAnalyzer(session), db_session=session)
+                await session.commit()
+                return changed
+
+    async def run_once(self) -> Dict[str, int]:
+        ids = await self._claim_due()
+        sem = asyncio.Semaphore(max(1, settings.WATCH_CONCURRENCY))
+        results = await asyncio.gather(*(self._check(i, sem) for i in ids), return_exceptions=True)
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        return {"checked": len(ids), "changed": sum(1 for r in results if r is True), "failed": failed}
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.WATCH_TICK_SECONDS)
+            try:
+                stats = await self.run_once()
+                if stats["checked"]:
+                    logger.info("competitor_watch_tick", extra=stats)
+            except Exception:
+                logger.warning("competitor_watch_failed", exc_info=True)
+
+
+competitor_watcher = CompetitorWatcher()
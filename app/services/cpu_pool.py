@@ -0,0 +1,62 @@
+# app/services/cpu_pool.py
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from app.config import settings
+
+T = TypeVar("T")
+
+_executors: Dict[str, ProcessPoolExecutor] = {}
+
+
+def _pool_size(pool: str) -> int:
+    # свой пул под картинки: ресайз 1536x1024 + PNG-кодирование на сотни мс
+    # не должен вставать в очередь перед разбором HTML (и наоборот)
+    if pool == "images":
+        return settings.IMAGE_POOL_WORKERS
+    return settings.CPU_POOL_WORKERS
+
+
+def get_cpu_executor(pool: str = "default") -> Optional[ProcessPoolExecutor]:
+    """
+    Пулы процессов для CPU-тяжёлой работы: "default" (разбор HTML и т.п.) и "images" (PIL).
+    Размер пула <= 0 — пул выключен, всё выполняется прямо в event loop.
+    """
+    workers = _pool_size(pool)
+    if workers <= 0:
+        return None
+    executor = _executors.get(pool)
+    if executor is None:
+        # spawn: форк процесса с живым event loop и пулами соединений небезопасен
+        executor = _executors[pool] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return executor
+
+
+async def run_cpu_bound(
+    fn: Callable[..., T], *args: Any, inline: bool = False, pool: str = "default", **kwargs: Any
+) -> T:
+    """
+    Выполняет чистую функцию fn в пуле процессов pool.
+    inline=True (маленький вход) или выключенный пул — вызов на месте:
+    пересылка аргументов в другой процесс дороже самой работы.
+    fn и аргументы должны сериализоваться pickle.
+    """
+    executor = None if inline else get_cpu_executor(pool)
+    if executor is None:
+        return fn(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_cpu_pool() -> None:
+    while _executors:
+        _, executor = _executors.popitem()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,217 @@
+# app/services/crawler.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.request import getproxies
+
+import httpcore
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:  # HTTP/2 нужен пакет h2 (httpx[http2]); без него работаем по HTTP/1.1
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+CRAWLER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; ChatplaceBot/1.0; +https://chatplace.io)",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
+
+
+class _DnsCachingBackend(httpcore.AsyncNetworkBackend):
+    """
+    Резолвит host один раз на CRAWLER_DNS_TTL и подключается уже по IP (SNI остаётся по host).
+    Адреса перебираются по порядку, как в anyio: недоступный первый (например, IPv6) не ломает загрузку.
+    """
+
+    def __init__(self, inner: httpcore.AsyncNetworkBackend, ttl: float) -> None:
+        self._inner = inner
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        hit = self._cache.get(key)
+        now = time.monotonic()
+        if hit and hit[0] > now:
+            return hit[1]
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        ips = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[key] = (now + self._ttl, ips)
+        return ips
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        try:
+            ips = await self._resolve(host, port) or [host]
+        except OSError:
+            ips = [host]
+        last_exc: Optional[BaseException] = None
+        for ip in ips:
+            try:
+                return await self._inner.connect_tcp(
+                    ip, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except Exception as e:
+                last_exc = e
+        # адреса могли смениться — в следующий раз резолвим заново
+        self._cache.pop((host, port), None)
+        raise last_exc  # ips не пуст — хотя бы одна попытка была
+
+    async def connect_unix_socket(
+        self,
+        path: str,
+        timeout: Optional[float] = None,
+        socket_options: Optional[Iterable[Any]] = None,
+    ) -> httpcore.AsyncNetworkStream:
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._inner.sleep(seconds)
+
+
+def _build_transport(limits: httpx.Limits) -> httpx.AsyncHTTPTransport:
+    """
+    Транспорт httpx с пулом httpcore на _DnsCachingBackend.
+
+    httpx не даёт передать network_backend, а своя реализация AsyncBaseTransport
+    повторила бы его приватные маппинги исключений и потоков. Поэтому пул подменяется
+    в transport._pool — версии httpx/httpcore для этого закреплены в requirements.txt,
+    а tests/test_crawler.py падает, если подмена перестала работать.
+    """
+    transport = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=limits, retries=1)
+    pool = getattr(transport, "_pool", None)
+    ssl_context = getattr(pool, "_ssl_context", None)
+    if not isinstance(pool, httpcore.AsyncConnectionPool) or ssl_context is None:
+        logger.warning("crawler_dns_cache_unavailable", extra={"httpx": httpx.__version__})
+        return transport
+    transport._pool = httpcore.AsyncConnectionPool(
+        ssl_context=ssl_context,
+        max_connections=limits.max_connections,
+        max_keepalive_connections=limits.max_keepalive_connections,
+        keepalive_expiry=limits.keepalive_expiry,
+        http1=True,
+        http2=HTTP2_AVAILABLE,
+        retries=1,
+        network_backend=_DnsCachingBackend(httpcore.AnyIOBackend(), settings.CRAWLER_DNS_TTL),
+    )
+    return transport
+
+
+def _proxy_configured() -> bool:
+    """CRAWLER_PROXY или HTTP(S)_PROXY/ALL_PROXY в окружении (как их читает httpx при trust_env)."""
+    if settings.CRAWLER_PROXY:
+        return True
+    proxies = getproxies()
+    return any(proxies.get(scheme) for scheme in ("http", "https", "all"))
+
+
+MAX_TRACKED_HOSTS = 1024
+
+
+class _HostSlot:
+    __slots__ = ("sem", "users")
+
+    def __init__(self, sem: asyncio.Semaphore) -> None:
+        self.sem = sem
+        self.users = 0
+
+
+class CrawlerClient:
+    """
+    Долгоживущий HTTP-клиент для чужих страниц (UrlAnalyzer).
+
+    - один пул соединений на процесс: keep-alive и HTTP/2 к популярным хостам (t.me, youtube.com);
+    - глобальный лимит запросов “в полёте” и лимит на хост — всплеск ссылок
+      не откроет сотни сокетов и не упрётся в rate limit площадки;
+    - кэш DNS на CRAWLER_DNS_TTL (без прокси; с CRAWLER_PROXY/HTTP(S)_PROXY — обычный транспорт httpx).
+    """
+
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global = asyncio.Semaphore(settings.CRAWLER_MAX_IN_FLIGHT)
+        self._per_host: Dict[str, _HostSlot] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=settings.CRAWLER_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CRAWLER_MAX_KEEPALIVE,
+                keepalive_expiry=30.0,
+            )
+            common: Dict[str, Any] = {
+                "timeout": httpx.Timeout(settings.CRAWLER_TIMEOUT),
+                "follow_redirects": True,
+                "headers": CRAWLER_HEADERS,
+            }
+            if _proxy_configured():
+                # через прокси имена резолвит прокси — кэш DNS не нужен; httpx сам учтёт
+                # HTTP(S)_PROXY/NO_PROXY из окружения (trust_env), как и клиент по умолчанию
+                self._client = httpx.AsyncClient(
+                    proxy=settings.CRAWLER_PROXY or None,
+                    trust_env=True,
+                    limits=limits,
+                    http2=HTTP2_AVAILABLE,
+                    **common,
+                )
+            else:
+                self._client = httpx.AsyncClient(transport=_build_transport(limits), **common)
+        return self._client
+
+    def _host_slot(self, host: str) -> "_HostSlot":
+        slot = self._per_host.get(host)
+        if slot is None:
+            slot = _HostSlot(asyncio.Semaphore(settings.CRAWLER_PER_HOST))
+            self._per_host[host] = slot
+        return slot
+
+    @asynccontextmanager
+    async def _slot(self, url: str) -> AsyncIterator[None]:
+        host = (urlparse(url).hostname or "").lower()
+        slot = self._host_slot(host)
+        slot.users += 1
+        try:
+            async with self._global, slot.sem:
+                yield
+        finally:
+            slot.users -= 1
+            if slot.users == 0 and len(self._per_host) > MAX_TRACKED_HOSTS:
+                self._per_host.pop(host, None)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        async with self._slot(url):
+            return await self.client.get(url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, url: str, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """GET без чтения тела: вызывающий сам решает, сколько байт брать (слот занят до выхода)."""
+        async with self._slot(url):
+            async with self.client.stream("GET", url, **kwargs) as resp:
+                yield resp
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+crawler = CrawlerClient()
@@ -1,20 +1,20 @@
 # app/services/image_orchestrator.py
 from __future__ import annotations
 
+import asyncio
 import hashlib
-import io
 import logging
-import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Optional
-
-from PIL import Image
+from typing import Any, Dict, List, Optional
 
 from app.agents.image_brief_agent import ImageBriefAgent
 from app.config import settings
+from app.images.image_cache import image_cache
 from app.images.presets import resolve_preset
-from app.images.template_renderer import TemplateRenderer
+from app.images.processing import compose_image
+from app.images.storage import StoredImageRecord, image_path, prompt_hash, record_images, save_image
 from app.llm.openai_images import generate_image
+from app.services.cpu_pool import run_cpu_bound
 
 logger = logging.getLogger(__name__)
 
@@ -27,98 +27,57 @@ def _pick_generation_size(target_w: int, target_h: int) -> str:
     return "1024x1536"
 
 
-def _parse_size(s: str) -> Tuple[int, int]:
-    w, h = s.lower().split("x")
-    return int(w), int(h)
-
+# вариант 0 — исходный промпт; остальные просят другую композицию (и попадают в свои ключи кэша)
+VARIANT_HINTS = (
+    "",
+    "Variation: alternative composition and camera angle, different arrangement of objects.",
+    "Variation: different lighting and color accents, closer framing.",
+)
 
-def _resize_to_target(image_bytes: bytes, target_size: str) -> bytes:
-    target_w, target_h = _parse_size(target_size)
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    resized = img.resize((target_w, target_h), Image.LANCZOS)
 
-    out = io.BytesIO()
-    resized.save(out, format="PNG")
-    return out.getvalue()
+def _variant_prompt(prompt: str, variant: int) -> str:
+    hint = VARIANT_HINTS[variant % len(VARIANT_HINTS)]
+    if variant >= len(VARIANT_HINTS):
+        hint = f"{hint} Seed {variant}."
+    return f"{prompt}\n{hint}" if hint else prompt
 
 
 class ImageOrchestrator:
     def __init__(self) -> None:
         self.brief_agent = ImageBriefAgent()
-        self.renderer = TemplateRenderer()
-        self.cache: Dict[str, bytes] = {}
-        self.image_index: Dict[str, Path] = {}
-
-    def _cache_key(self, prompt: str, size: str, style: str, model: str, quality: str) -> str:
-        digest = hashlib.sha256(f"{model}|{quality}|{prompt}|{size}|{style}".encode("utf-8")).hexdigest()
-        return digest
-
-    def _resize_cover(self, image_bytes: bytes, target_size: Tuple[int, int]) -> bytes:
-        tw, th = target_size
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        w, h = img.size
-
-        # cover scale
-        scale = max(tw / w, th / h)
-        nw, nh = int(w * scale), int(h * scale)
-        img = img.resize((nw, nh), Image.LANCZOS)
-
-        # center crop
-        left = max((nw - tw) // 2, 0)
-        top = max((nh - th) // 2, 0)
-        img = img.crop((left, top, left + tw, top + th))
-
-        out = io.BytesIO()
-        img.save(out, format="PNG")
-        return out.getvalue()
-
-    def _save_image(self, image_bytes: bytes, user_id: str) -> str:
-        """
-        Сохраняет png на диск и возвращает image_id.
-        """
-        image_id = uuid.uuid4().hex
-        base_path = Path(settings.IMAGE_STORAGE_PATH) / (user_id or "anonymous")
-        base_path.mkdir(parents=True, exist_ok=True)
 
-        image_path = base_path / f"{image_id}.png"
-        image_path.write_bytes(image_bytes)
-
-        # индекс для быстрого доступа
-        self.image_index[image_id] = image_path
-        return image_id
+    def _cache_key(self, prompt: str, size: str, style: str, model: str, quality: str, variant: int = 0) -> str:
+        raw = f"{model}|{quality}|{prompt}|{size}|{style}"
+        if variant:
+            raw += f"|v{variant}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
     def resolve_image_path(self, image_id: str) -> Optional[Path]:
         """
-        Возвращает путь к image_id.png, если файл существует.
+        Возвращает путь к image_id.png, если файл существует (путь вычисляется из id, без обхода диска).
         """
-        p = self.image_index.get(image_id)
-        if p and p.exists():
-            return p
-
-        base_path = Path(settings.IMAGE_STORAGE_PATH)
-        # фолбэк: ищем по диску
-        for path in base_path.rglob(f"{image_id}.png"):
-            self.image_index[image_id] = path
-            return path
+        return image_path(image_id)
 
-        return None
-
-    async def _get_background(self, prompt: str, generation_size: str, style: str, *, user_id: str) -> bytes:
+    async def _get_background(
+        self, prompt: str, generation_size: str, style: str, *, user_id: str, variant: int = 0
+    ) -> bytes:
         model = settings.DEFAULT_IMAGE_MODEL
         quality = getattr(settings, "DEFAULT_IMAGE_QUALITY", "auto")
 
-        key = self._cache_key(prompt, generation_size, style, model=model, quality=quality)
-        if key in self.cache:
-            return self.cache[key]
+        # кэш на диске общий для всех экземпляров и воркеров: повторный промпт не генерируется заново
+        key = self._cache_key(prompt, generation_size, style, model=model, quality=quality, variant=variant)
+        cached = await image_cache.get(key)
+        if cached is not None:
+            return cached
 
         image_bytes = await generate_image(
-            prompt=prompt,
+            prompt=_variant_prompt(prompt, variant),
             size=generation_size,
             model=model,
             quality=quality,
             user=user_id,
         )
-        self.cache[key] = image_bytes
+        await image_cache.put(key, image_bytes)
         return image_bytes
 
     async def generate(
@@ -155,32 +114,49 @@ class ImageOrchestrator:
         if negative_prompt:
             prompt = f"{prompt}\nNegative prompt: {negative_prompt}"
 
-        image_ids: List[str] = []
         max_variants = max(1, min(int(variants or 1), 3))
 
-        for _ in range(max_variants):
+        # декодирование/ресайз/текст/PNG — одним вызовом в пуле процессов "images":
+        # картинка между шагами не перекодируется, event loop не блокируется
+        async def _compose(bg: bytes, *, with_text: bool) -> bytes:
+            return await run_cpu_bound(
+                compose_image,
+                bg,
+                target_size,
+                overlay=overlay_data if with_text else None,
+                layout=layout,
+                palette=palette,
+                pool="images",
+            )
+
+        async def _variant(v: int) -> bytes:
             if mode == "simple":
-                bg = await self._get_background(prompt, generation_size, style_hint, user_id=user_id)
-                image_bytes = self._resize_cover(bg, target_size)
-
-            elif mode == "template":
-                bg = await self._get_background(prompt, generation_size, style_hint, user_id=user_id)
-                bg = self._resize_cover(bg, target_size)
-                image_bytes = self.renderer.render(bg, overlay_data, layout, palette)
-
-            else:
-                hybrid_prompt = f"{prompt}\nText overlay: {overlay_data}"
-                bg = await self._get_background(hybrid_prompt, generation_size, style_hint, user_id=user_id)
-                image_bytes = self._resize_cover(bg, target_size)
-
-                # fallback если уверенность низкая — делаем template-рендер
-                if confidence == "low":
-                    bg2 = await self._get_background(prompt, generation_size, style_hint, user_id=user_id)
-                    bg2 = self._resize_cover(bg2, target_size)
-                    image_bytes = self.renderer.render(bg2, overlay_data, layout, palette)
-
-            image_id = self._save_image(image_bytes, user_id)
-            image_ids.append(image_id)
+                bg = await self._get_background(prompt, generation_size, style_hint, user_id=user_id, variant=v)
+                return await _compose(bg, with_text=False)
+
+            if mode == "template":
+                bg = await self._get_background(prompt, generation_size, style_hint, user_id=user_id, variant=v)
+                return await _compose(bg, with_text=True)
+
+            hybrid_prompt = f"{prompt}\nText overlay: {overlay_data}"
+            bg = await self._get_background(hybrid_prompt, generation_size, style_hint, user_id=user_id, variant=v)
+
+            # fallback если уверенность низкая — делаем template-рендер (hybrid-фон тогда не обрабатываем)
+            if confidence == "low":
+                bg2 = await self._get_background(prompt, generation_size, style_hint, user_id=user_id, variant=v)
+                return await _compose(bg2, with_text=True)
+            return await _compose(bg, with_text=False)
+
+        # варианты генерируются параллельно (в пределах IMAGE_MAX_CONCURRENCY), у каждого свой промпт и ключ кэша
+        rendered = await asyncio.gather(*(_variant(v) for v in range(max_variants)))
+        records: List[StoredImageRecord] = await asyncio.gather(
+            *(
+                save_image(image_bytes, user_id=user_id, preset_id=preset_id, prompt_hash=prompt_hash(prompt))
+                for image_bytes in rendered
+            )
+        )
+        await record_images(records)
+        image_ids = [r.id for r in records]
 
         logger.info(
             "image_generated",
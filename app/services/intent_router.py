@@ -1,19 +1,12 @@
 from __future__ import annotations
 
+from typing import Optional
 
-INTENT_KEYWORDS = {
-    "content": ["контент", "пост", "план", "текст", "рубрика", "сторис"],
-    "strategy": ["стратег", "ворон", "позиционир", "целевая", "цели"],
-    "audit": ["аудит", "разбор", "провер", "оценка"],
-    "ads": ["реклама", "таргет", "ads", "продвижение", "объявления"],
-    "analysis": ["аналит", "метрик", "отчет", "данные", "рост", "падение"],
-    "image": ["картин", "баннер", "изображен", "постер", "обложк", "сгенерируй визуал", "сделай креатив"]
-}
+# INTENT_KEYWORDS реэкспортируется для совместимости
+from app.services.message_features import INTENT_KEYWORDS, MessageFeatures, extract_message_features
 
 
-def detect_intent(text: str) -> str:
-    lowered = text.lower()
-    for intent, keywords in INTENT_KEYWORDS.items():
-        if any(word in lowered for word in keywords):
-            return intent
-    return "other"
+def detect_intent(text: str, features: Optional[MessageFeatures] = None) -> str:
+    if features is None:
+        features = extract_message_features(text)
+    return features.intent
@@ -0,0 +1,57 @@
+# app/services/loop_monitor.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class LoopLagMonitor:
+    """
+    Задержка event loop: раз в interval засыпаем и смотрим, насколько позже проснулись.
+    Большой лаг = кто-то держит loop синхронной работой (разбор HTML, PIL и т.п.).
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600) -> None:
+        self._interval = interval
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _loop(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            self._samples.append(max(0.0, time.perf_counter() - started - self._interval))
+
+    def reset(self) -> None:
+        self._samples.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._samples:
+            return {"samples": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(self._samples)
+        n = len(ordered)
+        return {
+            "samples": n,
+            "p50_ms": round(ordered[n // 2] * 1000, 2),
+            "p95_ms": round(ordered[min(n - 1, int(n * 0.95))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
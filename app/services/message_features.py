@@ -0,0 +1,205 @@
+# app/services/message_features.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Mapping, Optional, Sequence, Set, Tuple
+
+from app.services.url_analyzer import IG_MARKERS, TG_MARKERS, extract_urls
+
+
+# ------------- Словари ключевых слов -------------
+# Единое место для всех keyword-эвристик по входящему сообщению.
+# Модули (scope_guard, intent_router, strategy_template, chat_router, url_analyzer)
+# не сканируют текст сами, а читают готовый MessageFeatures.
+
+MARKETING_KEYWORDS = [
+    # общее
+    "маркет", "маркетинг", "продвиж", "реклам", "смм", "smm", "таргет",
+    "лиды", "лид", "заявк", "продаж", "воронк", "конверси", "cpa", "cpc", "cpm", "ctr", "roi", "romi",
+    "бренд", "позиционирован", "утп", "оффер", "цена", "прайс", "аудитория", "ца",
+    "контент", "контент-план", "пост", "рилс", "reels", "сторис", "stories", "креатив", "баннер",
+    "seo", "асо", "aso", "лендинг", "landing", "сайт",
+    # соцсети
+    "инст", "instagram", "vk", "вк", "telegram", "tg", "ютуб", "youtube", "tiktok", "тик", "dzen", "дзен",
+    # задачи
+    "стратег", "анализ", "аналит", "метрик", "отчёт", "кампан", "ads",
+]
+
+OFFTOPIC_KEYWORDS = [
+    # “явно не маркетинг”
+    "реши задачу", "математ", "код", "python", "sql", "реферат", "сочинение",
+    "психолог", "медицин", "диагноз", "лекарств", "юрид", "договор",
+    "гороскоп", "астролог",
+]
+
+# порядок важен: detect_intent возвращает первый совпавший интент
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "content": ["контент", "пост", "план", "текст", "рубрика", "сторис"],
+    "strategy": ["стратег", "ворон", "позиционир", "целевая", "цели"],
+    "audit": ["аудит", "разбор", "провер", "оценка"],
+    "ads": ["реклама", "таргет", "ads", "продвижение", "объявления"],
+    "analysis": ["аналит", "метрик", "отчет", "данные", "рост", "падение"],
+    "image": ["картин", "баннер", "изображен", "постер", "обложк", "сгенерируй визуал", "сделай креатив"],
+}
+
+STRATEGY_KEYWORDS = (
+    "стратег",
+    "продвиж",
+    "маркетинг план",
+    "план продвиж",
+    "go-to-market",
+    "gtm",
+    "growth",
+    "запуск",
+    "acquisition",
+)
+
+IMAGE_REQUEST_KEYWORDS = [
+    "сгенерируй картин",
+    "сделай картин",
+    "картинк",
+    "баннер",
+    "креатив",
+    "обложк",
+    "визуал",
+    "изображен",
+]
+
+IMAGE_VK_KEYWORDS = ["вк", "vk"]
+IMAGE_AD_KEYWORDS = ["реклам", "промо"]
+
+
+# ------------- Мульти-паттерн матчер -------------
+
+class KeywordMatcher:
+    """
+    Один проход по словарю -> множество категорий, чьи ключевые слова встретились в тексте.
+
+    Семантика совпадает с `any(k in text for k in keywords)` для каждой категории, но:
+    - слово, общее для нескольких категорий, ищется один раз;
+    - слово не ищется для категорий, которые гарантирует его подстрока
+      («маркетинг» не нужен для marketing, если есть «маркет»);
+    - слово пропускается, если все его категории уже найдены.
+
+    Таблица строится один раз при импорте; на длинных вставках (IG_INSIGHTS)
+    это быстрее и комбинированной регулярки, и россыпи any() по модулям.
+    """
+
+    def __init__(self, categories: Mapping[str, Sequence[str]]) -> None:
+        by_word: Dict[str, Set[str]] = {}
+        for category, words in categories.items():
+            for w in words:
+                by_word.setdefault(w, set()).add(category)
+
+        table: List[Tuple[str, FrozenSet[str]]] = []
+        for word, cats in by_word.items():
+            implied: Set[str] = set()
+            for other, other_cats in by_word.items():
+                if other != word and other in word:
+                    implied |= other_cats
+            own = cats - implied
+            if own:
+                table.append((word, frozenset(own)))
+
+        # короткие слова раньше: они чаще встречаются и быстрее закрывают категории
+        table.sort(key=lambda item: (len(item[0]), item[0]))
+        self._table: Tuple[Tuple[str, FrozenSet[str]], ...] = tuple(table)
+
+    def match(self, lowered: str) -> FrozenSet[str]:
+        found: Set[str] = set()
+        for word, cats in self._table:
+            if cats <= found:
+                continue
+            if word in lowered:
+                found |= cats
+        return frozenset(found)
+
+
+def _build_categories() -> Dict[str, Sequence[str]]:
+    categories: Dict[str, Sequence[str]] = {
+        "marketing": MARKETING_KEYWORDS,
+        "offtopic": OFFTOPIC_KEYWORDS,
+        "strategy": STRATEGY_KEYWORDS,
+        "image_request": IMAGE_REQUEST_KEYWORDS,
+        "image_vk": IMAGE_VK_KEYWORDS,
+        "image_ad": IMAGE_AD_KEYWORDS,
+        "ig_marker": IG_MARKERS,
+        "tg_marker": TG_MARKERS,
+    }
+    for intent, words in INTENT_KEYWORDS.items():
+        categories[f"intent:{intent}"] = words
+    return categories
+
+
+_MATCHER = KeywordMatcher(_build_categories())
+
+
+# ------------- MessageFeatures -------------
+
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    """Неизменяемый результат однократного разбора входящего сообщения."""
+
+    text: str
+    lowered: str
+    urls: Tuple[str, ...]
+    categories: FrozenSet[str]
+
+    def has(self, category: str) -> bool:
+        return category in self.categories
+
+    @property
+    def has_urls(self) -> bool:
+        return bool(self.urls)
+
+    @property
+    def looks_like_marketing(self) -> bool:
+        # если есть ссылка — чаще всего это “аудит/разбор” (в теме)
+        return self.has_urls or self.has("marketing")
+
+    @property
+    def looks_strongly_offtopic(self) -> bool:
+        return self.has("offtopic")
+
+    @property
+    def intent(self) -> str:
+        for intent in INTENT_KEYWORDS:
+            if self.has(f"intent:{intent}"):
+                return intent
+        return "other"
+
+    @property
+    def strategy_like(self) -> bool:
+        return self.has("strategy")
+
+    @property
+    def wants_image(self) -> bool:
+        return self.has("image_request")
+
+    @property
+    def image_platform(self) -> str:
+        return "vk" if self.has("image_vk") else "auto"
+
+    @property
+    def image_use_case(self) -> str:
+        return "ad_post" if self.has("image_ad") else "post"
+
+    @property
+    def prefer_ig(self) -> bool:
+        return self.has("ig_marker")
+
+    @property
+    def prefer_tg(self) -> bool:
+        return self.has("tg_marker")
+
+
+def extract_message_features(text: Optional[str]) -> MessageFeatures:
+    raw = text or ""
+    lowered = raw.lower()
+    return MessageFeatures(
+        text=raw,
+        lowered=lowered,
+        urls=tuple(extract_urls(raw)),
+        categories=_MATCHER.match(lowered),
+    )
@@ -0,0 +1,123 @@
+# app/services/page_extract.py
+"""
+Чистое (без I/O и глобального состояния) извлечение сводки из HTML.
+Модуль лёгкий по импортам: выполняется и в воркерах пула процессов.
+"""
+from __future__ import annotations
+
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from selectolax.parser import HTMLParser
+
+# бюджеты извлечения: больше этого в сводку всё равно не попадёт
+EXCERPT_BUDGET_CHARS = 5000
+H1_BUDGET = 3
+HEADINGS_BUDGET = 10
+CTA_BUDGET = 10
+CTA_KEYWORDS = (
+    "куп", "заказ", "рег", "скач", "подпис", "получ", "начать", "войти", "запис",
+    "book", "buy", "order", "sign", "download", "get", "start",
+)
+
+
+def excerpt_lines(text: str) -> List[str]:
+    lines = [ln.strip() for ln in text.splitlines()]
+    return [ln for ln in lines if 30 <= len(ln) <= 500]
+
+
+_CTA_RE = re.compile("|".join(re.escape(k) for k in CTA_KEYWORDS))
+
+
+def is_cta_text(text: str) -> bool:
+    return 0 < len(text) <= 50 and bool(_CTA_RE.search(text.lower()))
+
+
+_OG_FIELDS = {
+    "og:title": "title",
+    "og:description": "description",
+    "og:image": "image",
+    "og:type": "type",
+    "og:site_name": "site_name",
+    "og:url": "url",
+}
+NOISE_TAGS = ("script", "style", "noscript", "svg")
+TG_MESSAGE_CLASS = "tgme_widget_message_text"
+TG_POSTS_BUDGET = 5
+
+
+def extract_page(html: str, page_type: str) -> Dict[str, Any]:
+    """
+    Метаданные и текст страницы (title/meta/og/h1/h2/CTA/выдержка/посты Telegram)
+    за один обход элементов DOM: узел разбирается по тегу, шумовые узлы
+    (script/style/noscript/svg) собираются по ходу и удаляются перед body.text().
+    """
+    parsed = HTMLParser(html)
+
+    title: str | None = None
+    meta_desc: str | None = None
+    og: Dict[str, str] = {}
+    h1: List[str] = []
+    headings: List[str] = []
+    cta_texts: List[str] = []
+    cta_seen: set = set()
+    # превью t.me/s/ идёт от старых постов к новым — держим только последние TG_POSTS_BUDGET
+    tg_posts: Deque[str] = deque(maxlen=TG_POSTS_BUDGET)
+    noise: List[Any] = []
+    is_telegram = page_type == "telegram"
+
+    root = parsed.root
+    for node in root.traverse() if root is not None else ():
+        tag = node.tag
+
+        if tag in NOISE_TAGS:
+            noise.append(node)
+        elif tag == "title":
+            if title is None:
+                title = node.text(strip=True)
+        elif tag == "meta":
+            attrs = node.attributes
+            content = (attrs.get("content") or "").strip()
+            if not content:
+                continue
+            if meta_desc is None and attrs.get("name") == "description":
+                meta_desc = content
+            key = _OG_FIELDS.get(attrs.get("property") or "")
+            if key and key not in og:
+                og[key] = content
+        elif tag == "h1":
+            if len(h1) < H1_BUDGET:
+                h1.append(node.text(strip=True))
+        elif tag == "h2":
+            if len(headings) < HEADINGS_BUDGET:
+                headings.append(node.text(strip=True))
+        elif tag == "a" or tag == "button":
+            if len(cta_texts) < CTA_BUDGET:
+                t = (node.text(strip=True) or "").strip()
+                if t not in cta_seen and is_cta_text(t):
+                    cta_seen.add(t)
+                    cta_texts.append(t)
+
+        if is_telegram and TG_MESSAGE_CLASS in (node.attributes.get("class") or "").split():
+            t = (node.text(separator="\n", strip=True) or "").strip()
+            if t:
+                tg_posts.append(t[:500])
+
+    # с конца: вложенный шумовой узел удаляется раньше родителя
+    for node in reversed(noise):
+        node.decompose()
+
+    body = parsed.body
+    raw_text = body.text(separator="\n", strip=True) if body else parsed.text(separator="\n", strip=True)
+
+    return {
+        "title": title or "",
+        "meta_description": meta_desc or "",
+        "og": {k: og.get(k, "") for k in _OG_FIELDS.values()},
+        "h1": h1,
+        "headings": headings,
+        "cta_texts": cta_texts,
+        "main_text_excerpt": "\n".join(excerpt_lines(raw_text))[:EXCERPT_BUDGET_CHARS],
+        "telegram_last_posts": list(reversed(tg_posts)),  # новые первыми
+    }
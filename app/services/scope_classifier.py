@@ -0,0 +1,229 @@
+# app/services/scope_classifier.py
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+ARTIFACT_FORMAT = "scope_classifier/char_tfidf_logreg"
+ARTIFACT_FORMAT_VERSION = 1
+
+
+def _char_ngrams(text: str, n_min: int, n_max: int) -> Counter:
+    t = " " + " ".join((text or "").lower().split()) + " "
+    grams: Counter = Counter()
+    for n in range(n_min, n_max + 1):
+        for i in range(len(t) - n + 1):
+            grams[t[i : i + n]] += 1
+    return grams
+
+
+class ScopeClassifier:
+    """
+    Локальный классификатор “в теме / не в теме”:
+    char n-gram TF-IDF (sublinear tf, L2) + логистическая регрессия.
+
+    Чистый Python без зависимостей: обучается на логах scope_decisions,
+    сохраняется в версионированный JSON-артефакт, предсказывает за микросекунды.
+    """
+
+    def __init__(
+        self,
+        *,
+        ngram_range: Tuple[int, int] = (2, 4),
+        idf: Optional[Dict[str, float]] = None,
+        coef: Optional[Dict[str, float]] = None,
+        intercept: float = 0.0,
+        model_version: str = "untrained",
+    ) -> None:
+        self.ngram_range = ngram_range
+        self.idf: Dict[str, float] = idf or {}
+        self.coef: Dict[str, float] = coef or {}
+        self.intercept = intercept
+        self.model_version = model_version
+
+    # ---------- features ----------
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        n_min, n_max = self.ngram_range
+        vec: Dict[str, float] = {}
+        for gram, tf in _char_ngrams(text, n_min, n_max).items():
+            idf = self.idf.get(gram)
+            if idf is None:
+                continue
+            vec[gram] = (1.0 + math.log(tf)) * idf
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        if norm > 0:
+            for gram in vec:
+                vec[gram] /= norm
+        return vec
+
+    # ---------- training ----------
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[bool],
+        *,
+        max_features: int = 20000,
+        epochs: int = 15,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        seed: int = 13,
+    ) -> "ScopeClassifier":
+        if len(texts) != len(labels) or not texts:
+            raise ValueError("texts and labels must be non-empty and of equal length")
+
+        n_min, n_max = self.ngram_range
+        docs = [_char_ngrams(t, n_min, n_max) for t in texts]
+
+        df: Counter = Counter()
+        for grams in docs:
+            df.update(grams.keys())
+        vocab = [g for g, _ in df.most_common(max_features)]
+        n_docs = len(docs)
+        self.idf = {g: math.log((1 + n_docs) / (1 + df[g])) + 1.0 for g in vocab}
+
+        vectors = [self._vectorize(t) for t in texts]
+        ys = [1.0 if y else 0.0 for y in labels]
+
+        coef: Dict[str, float] = {}
+        intercept = 0.0
+        order = list(range(n_docs))
+        rnd = random.Random(seed)
+        for epoch in range(epochs):
+            rnd.shuffle(order)
+            lr = learning_rate / (1.0 + epoch)
+            for i in order:
+                x = vectors[i]
+                z = intercept + sum(coef.get(g, 0.0) * v for g, v in x.items())
+                grad = _sigmoid(z) - ys[i]
+                intercept -= lr * grad
+                for g, v in x.items():
+                    w = coef.get(g, 0.0)
+                    coef[g] = w - lr * (grad * v + l2 * w)
+
+        self.coef = {g: w for g, w in coef.items() if abs(w) > 1e-6}
+        self.intercept = intercept
+        return self
+
+    # ---------- inference ----------
+
+    def predict_proba(self, text: str) -> float:
+        """Вероятность того, что сообщение про маркетинг/СММ."""
+        x = self._vectorize(text)
+        z = self.intercept + sum(self.coef.get(g, 0.0) * v for g, v in x.items())
+        return _sigmoid(z)
+
+    def predict(self, text: str) -> Tuple[bool, float]:
+        """Возвращает (in_scope, confidence), где confidence в [0.5, 1]."""
+        p = self.predict_proba(text)
+        return p >= 0.5, max(p, 1.0 - p)
+
+    # ---------- artifact ----------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "format": ARTIFACT_FORMAT,
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "model_version": self.model_version,
+            "ngram_range": list(self.ngram_range),
+            "intercept": self.intercept,
+            "idf": self.idf,
+            "coef": self.coef,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScopeClassifier":
+        if data.get("format") != ARTIFACT_FORMAT or data.get("format_version") != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"unsupported scope classifier artifact: {data.get('format')}@{data.get('format_version')}")
+        n_min, n_max = data.get("ngram_range") or (2, 4)
+        return cls(
+            ngram_range=(int(n_min), int(n_max)),
+            idf={str(k): float(v) for k, v in (data.get("idf") or {}).items()},
+            coef={str(k): float(v) for k, v in (data.get("coef") or {}).items()},
+            intercept=float(data.get("intercept") or 0.0),
+            model_version=str(data.get("model_version") or "unknown"),
+        )
+
+    def save(self, path: str | Path) -> None:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ScopeClassifier":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+@lru_cache(maxsize=1)
+def get_scope_classifier() -> Optional[ScopeClassifier]:
+    """
+    Артефакт из settings.SCOPE_CLASSIFIER_PATH (один раз на процесс).
+    Нет файла / битый файл -> None, и scope_guard работает как раньше (через LLM).
+    """
+    path = (settings.SCOPE_CLASSIFIER_PATH or "").strip()
+    if not path or not Path(path).is_file():
+        return None
+    try:
+        return ScopeClassifier.load(path)
+    except Exception:
+        return None
+
+
+# ------------- обучение из логов (CLI) -------------
+
+
+async def _load_decisions(sources: Iterable[str], limit: int) -> Tuple[List[str], List[bool]]:
+    from sqlalchemy import desc, select
+
+    from app.db import AsyncSessionLocal
+    from app.models import ScopeDecision
+
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(
+            select(ScopeDecision)
+            .where(ScopeDecision.source.in_(list(sources)))
+            .order_by(desc(ScopeDecision.created_at))
+            .limit(limit)
+        )
+        rows = res.scalars().all()
+    return [r.text for r in rows], [bool(r.in_scope) for r in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train local scope classifier from logged scope decisions")
+    parser.add_argument("--out", required=True, help="path to the JSON artifact")
+    parser.add_argument("--model-version", required=True, help="e.g. 2026-10-19")
+    # по умолчанию — только разметка LLM: правила ключевых слов guard и так применяет до классификатора
+    parser.add_argument("--sources", default="llm", help="comma separated ScopeDecision.source values")
+    parser.add_argument("--limit", type=int, default=50000)
+    parser.add_argument("--epochs", type=int, default=15)
+    args = parser.parse_args()
+
+    texts, labels = asyncio.run(_load_decisions(args.sources.split(","), args.limit))
+    if not texts:
+        raise SystemExit("no scope decisions found")
+
+    clf = ScopeClassifier(model_version=args.model_version).fit(texts, labels, epochs=args.epochs)
+    clf.save(args.out)
+    print(f"trained on {len(texts)} decisions ({sum(labels)} in scope) -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,163 @@
 from __future__ import annotations
 
 import json
+import random
 import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import Any, Dict, Optional, Tuple
 
+from sqlalchemy import delete, select
+
 from app.config import settings
 from app.llm.openai_text import chat as openai_chat
-from app.services.url_analyzer import extract_urls
+from app.models import ScopeDecision
+# словари ключевых слов живут в message_features (реэкспорт для совместимости)
+from app.services.message_features import (
+    MARKETING_KEYWORDS,
+    OFFTOPIC_KEYWORDS,
+    MessageFeatures,
+    extract_message_features,
+)
+from app.services.scope_classifier import get_scope_classifier
 
 
 # ------------- Быстрый слой (без LLM) -------------
 
-MARKETING_KEYWORDS = [
-    # общее
-    "маркет", "маркетинг", "продвиж", "реклам", "смм", "smm", "таргет",
-    "лиды", "лид", "заявк", "продаж", "воронк", "конверси", "cpa", "cpc", "cpm", "ctr", "roi", "romi",
-    "бренд", "позиционирован", "утп", "оффер", "цена", "прайс", "аудитория", "ца",
-    "контент", "контент-план", "пост", "рилс", "reels", "сторис", "stories", "креатив", "баннер",
-    "seo", "асо", "aso", "лендинг", "landing", "сайт",
-    # соцсети
-    "инст", "instagram", "vk", "вк", "telegram", "tg", "ютуб", "youtube", "tiktok", "тик", "dzen", "дзен",
-    # задачи
-    "стратег", "анализ", "аналит", "метрик", "отчёт", "кампан", "ads",
-]
-
-OFFTOPIC_KEYWORDS = [
-    # “явно не маркетинг”
-    "реши задачу", "математ", "код", "python", "sql", "реферат", "сочинение",
-    "психолог", "медицин", "диагноз", "лекарств", "юрид", "договор",
-    "гороскоп", "астролог",
-]
-
-def _looks_like_marketing(text: str) -> bool:
-    t = (text or "").lower()
-
-    # если есть ссылка — чаще всего это “аудит/разбор” (в теме)
-    if extract_urls(t):
-        return True
+def _looks_like_marketing(features: MessageFeatures) -> bool:
+    return features.looks_like_marketing
+
+
+def _looks_strongly_offtopic(features: MessageFeatures) -> bool:
+    return features.looks_strongly_offtopic
+
+
+# ------------- Контекст диалога -------------
+
+FOLLOW_UP_MAX_CHARS = 80
+FOLLOW_UP_MAX_WORDS = 8
+
+_WS_RE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class ScopeContext:
+    """Что мы знаем о предыдущем ходе: хватает, чтобы не гонять guard на “да”."""
+
+    last_intent: Optional[str] = None
+    last_in_scope: bool = False
+    last_actions: Tuple[str, ...] = ()
+
+
+def _norm_action_text(text: str) -> str:
+    return _WS_RE.sub(" ", (text or "").lower()).strip().rstrip(".!?…")
+
+
+# короткие подтверждения и отсылки к прошлому ответу: “да”, “давай второй”, “ещё 3 варианта”
+CONFIRMATION_MAX_WORDS = 3
+_CONFIRMATION_WORDS = frozenset(
+    """
+    да ага угу ок окей ok okay yes sure го давай давайте хорошо отлично супер согласен согласна подходит
+    норм нормально верно точно можно ещё еще дальше продолжай продолжи подробнее короче и так этот это
+    эту этого эти тот та первый второй третий первую вторую третью последний последнюю вариант варианта
+    варианты вариантов раз два три пункт оба обе
+    """.split()
+)
+_NUMBER_RE = re.compile(r"^\d{1,2}$")
+
+
+def _is_confirmation(text: str) -> bool:
+    words = _norm_action_text(text).replace(",", " ").split()
+    return 0 < len(words) <= CONFIRMATION_MAX_WORDS and all(
+        w in _CONFIRMATION_WORDS or _NUMBER_RE.match(w) for w in words
+    )
+
+
+def _is_context_follow_up(features: MessageFeatures, context: Optional[ScopeContext]) -> bool:
+    """
+    Пропускаем guard целиком, если:
+    - текст совпадает с action, который мы сами показали на прошлом ходе;
+    - или это короткое подтверждение/отсылка (“да”, “давай 3 варианта”) в диалоге, который уже про маркетинг.
+    Остальные короткие сообщения проходят обычные проверки (см. _is_short_follow_up).
+    """
+    if context is None or not context.last_in_scope:
+        return False
 
-    # явные маркетинговые слова
-    if any(k in t for k in MARKETING_KEYWORDS):
+    normalized = _norm_action_text(features.text)
+    if normalized and normalized in {_norm_action_text(a) for a in context.last_actions}:
         return True
 
-    return False
+    if features.looks_strongly_offtopic:
+        return False
+    if not context.last_intent or context.last_intent == "other":
+        return False
+    return _is_confirmation(features.text)
+
 
+def _is_short_follow_up(features: MessageFeatures, context: Optional[ScopeContext]) -> bool:
+    """
+    Короткая реплика в маркетинговом диалоге (“а для тиктока?”): ключевые слова и локальный
+    классификатор её проверяют; если классификатор не уверен, но склоняется к “в теме” —
+    пропускаем без LLM, опираясь на контекст. Без классификатора такие реплики идут в LLM.
+    """
+    if context is None or not context.last_in_scope:
+        return False
+    if not context.last_intent or context.last_intent == "other":
+        return False
+    text = features.text.strip()
+    return len(text) <= FOLLOW_UP_MAX_CHARS and len(text.split()) <= FOLLOW_UP_MAX_WORDS
 
-def _looks_strongly_offtopic(text: str) -> bool:
-    t = (text or "").lower()
-    return any(k in t for k in OFFTOPIC_KEYWORDS)
+
+def _log_decision(
+    db_session: Any,
+    user_id: Optional[str],
+    user_text: str,
+    in_scope: bool,
+    source: str,
+    confidence: Optional[float] = None,
+) -> None:
+    """
+    Кладём решение в сессию без отдельного commit — оно уедет вместе
+    с ближайшим commit роутера. Логирование не должно ломать guard.
+
+    Пишем пограничные случаи (classifier/llm) — это датасет для scope_classifier;
+    решения по ключевым словам — только выборкой SCOPE_LOG_KEYWORD_SAMPLE_RATE:
+    они очевидны, а лишняя запись с текстом пользователя на каждом сообщении не нужна.
+    Старые строки удаляет sweep_old_scope_decisions.
+    """
+    if db_session is None:
+        return
+    if source == "keywords" and random.random() >= settings.SCOPE_LOG_KEYWORD_SAMPLE_RATE:
+        return
+    try:
+        db_session.add(
+            ScopeDecision(
+                user_id=user_id,
+                text=user_text[:2000],
+                in_scope=in_scope,
+                source=source,
+                confidence=confidence,
+            )
+        )
+    except Exception:
+        pass
+
+
+async def sweep_old_scope_decisions(db_session: Any, *, batch_size: int = 500, max_batches: int = 20) -> int:
+    """Удаляет строки scope_decisions старше SCOPE_DECISIONS_RETENTION_DAYS пачками по batch_size."""
+    if settings.SCOPE_DECISIONS_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=settings.SCOPE_DECISIONS_RETENTION_DAYS)
+    total = 0
+    for _ in range(max_batches):
+        old = select(ScopeDecision.id).where(ScopeDecision.created_at < cutoff).limit(batch_size)
+        res = await db_session.execute(delete(ScopeDecision).where(ScopeDecision.id.in_(old)))
+        await db_session.commit()
+        deleted = int(res.rowcount or 0)
+        total += deleted
+        if deleted < batch_size:
+            break
+    return total
 
 
 def _scope_block_payload(user_text: str) -> Dict[str, Any]:
@@ -89,25 +199,59 @@ async def scope_guard(
     user_text: str,
     *,
     use_llm_fallback: bool = True,
+    features: Optional[MessageFeatures] = None,
+    db_session: Any = None,
+    user_id: Optional[str] = None,
+    context: Optional[ScopeContext] = None,
 ) -> Tuple[bool, Optional[Dict[str, Any]]]:
     """
     Возвращает:
     - (True, None) если пропускаем
     - (False, assistant_payload) если блокируем
+
+    features: MessageFeatures, уже посчитанные роутером (иначе считаем сами).
+    db_session: если передан — решение логируется в scope_decisions (датасет для scope_classifier).
+    context: состояние прошлого хода — короткие follow-up и нажатия наших actions проходят без проверки.
     """
 
     if not user_text or not user_text.strip():
         return True, None
 
+    if features is None:
+        features = extract_message_features(user_text)
+
+    # 0) продолжение маркетингового диалога — не проверяем (и не логируем: “да” без контекста — шум)
+    if _is_context_follow_up(features, context):
+        return True, None
+
     # 1) если явно “не маркетинг” — блокируем сразу
-    if _looks_strongly_offtopic(user_text) and not _looks_like_marketing(user_text):
+    if _looks_strongly_offtopic(features) and not _looks_like_marketing(features):
+        _log_decision(db_session, user_id, user_text, False, "keywords")
         return False, _scope_block_payload(user_text)
 
     # 2) если явно “маркетинг” — пропускаем
-    if _looks_like_marketing(user_text):
+    if _looks_like_marketing(features):
+        _log_decision(db_session, user_id, user_text, True, "keywords")
+        return True, None
+
+    # 3) пограничный случай — локальный классификатор (если есть артефакт и он уверен)
+    clf = get_scope_classifier()
+    leans_in_scope = False
+    if clf is not None:
+        in_scope, confidence = clf.predict(user_text)
+        if confidence >= settings.SCOPE_CLASSIFIER_THRESHOLD:
+            _log_decision(db_session, user_id, user_text, in_scope, "classifier", confidence)
+            if in_scope:
+                return True, None
+            return False, _scope_block_payload(user_text)
+        leans_in_scope = in_scope
+
+    # 3.1) короткое продолжение маркетингового диалога, которое классификатор (неуверенно) счёл
+    # маркетингом, — пропускаем без LLM; без классификатора — только LLM
+    if leans_in_scope and _is_short_follow_up(features, context):
         return True, None
 
-    # 3) пограничный случай — спросим классификатор (опционально)
+    # 4) всё ещё неясно — спросим LLM (опционально)
     if not use_llm_fallback:
         return False, _scope_block_payload(user_text)
 
@@ -126,6 +270,7 @@ async def scope_guard(
         )
         data = json.loads(content)
         in_scope = bool(data.get("in_scope", False))
+        _log_decision(db_session, user_id, user_text, in_scope, "llm")
         if in_scope:
             return True, None
 
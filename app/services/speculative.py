@@ -0,0 +1,208 @@
+# app/services/speculative.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+from app.llm.openai_text import track_usage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Speculation:
+    action_id: str
+    tier: str
+    created_at: float
+    task: Optional["asyncio.Task[Dict[str, Any]]"] = None
+    tokens: int = 0
+
+
+@dataclass
+class _TierStats:
+    scheduled: int = 0
+    hits: int = 0
+    misses: int = 0
+    wasted: int = 0
+    skipped_budget: int = 0
+    failed: int = 0
+    tokens_used: int = 0
+    tokens_wasted: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "scheduled": self.scheduled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "wasted": self.wasted,
+            "skipped_budget": self.skipped_budget,
+            "failed": self.failed,
+            "hit_rate": round(self.hits / self.scheduled, 3) if self.scheduled else None,
+            "tokens_used": self.tokens_used,
+            "tokens_wasted": self.tokens_wasted,
+        }
+
+
+@dataclass
+class _UserBudget:
+    spent: Deque[Tuple[float, int]] = field(default_factory=deque)
+
+    def used(self, now: float, window: float) -> int:
+        while self.spent and now - self.spent[0][0] > window:
+            self.spent.popleft()
+        return sum(t for _, t in self.spent)
+
+
+class SpeculativeExecutor:
+    """
+    Предвычисление ответа для самого вероятного следующего action (первой кнопки).
+
+    - не более одной спекуляции на пользователя: новый ход отменяет прошлую;
+    - бюджет токенов на пользователя за час (SPECULATIVE_USER_TOKEN_BUDGET);
+    - результат живёт SPECULATIVE_TTL_SECONDS; если пользователь нажал кнопку,
+      пока расчёт ещё идёт — дожидаемся его, а не считаем заново;
+    - статистика по тарифам: hit rate и потраченные впустую токены;
+    - просроченные невостребованные результаты и бюджеты неактивных пользователей
+      вычищаются попутно (не чаще раза в SWEEP_INTERVAL_SECONDS) — память не растёт с числом пользователей,
+      а такие результаты считаются потраченными впустую.
+
+    Хранилище в памяти процесса: при нескольких воркерах попадание возможно
+    только в тот воркер, который посчитал (промах просто идёт обычным путём).
+    """
+
+    BUDGET_WINDOW_SECONDS = 3600.0
+    SWEEP_INTERVAL_SECONDS = 30.0
+
+    def __init__(self) -> None:
+        self._by_user: Dict[str, _Speculation] = {}
+        self._budgets: Dict[str, _UserBudget] = {}
+        self._stats: Dict[str, _TierStats] = {}
+        self._last_sweep = 0.0
+
+    # ---------- config ----------
+
+    def enabled_for(self, tier: str) -> bool:
+        if not settings.SPECULATIVE_ENABLED:
+            return False
+        tiers = {t.strip() for t in (settings.SPECULATIVE_TIERS or "").split(",") if t.strip()}
+        return tier in tiers
+
+    def _tier_stats(self, tier: str) -> _TierStats:
+        return self._stats.setdefault(tier, _TierStats())
+
+    # ---------- lifecycle ----------
+
+    def schedule(
+        self,
+        user_id: str,
+        action_id: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        *,
+        tier: str = "default",
+    ) -> bool:
+        self.discard(user_id)
+        if not self.enabled_for(tier):
+            return False
+
+        now = time.monotonic()
+        self._sweep(now)
+        budget = self._budgets.setdefault(user_id, _UserBudget())
+        if budget.used(now, self.BUDGET_WINDOW_SECONDS) >= settings.SPECULATIVE_USER_TOKEN_BUDGET:
+            self._tier_stats(tier).skipped_budget += 1
+            return False
+
+        spec = _Speculation(action_id=action_id, tier=tier, created_at=now)
+
+        async def _run() -> Dict[str, Any]:
+            with track_usage() as usage:
+                try:
+                    return await compute()
+                finally:
+                    spec.tokens = int(usage.get("total_tokens") or 0)
+                    budget.spent.append((time.monotonic(), spec.tokens))
+                    self._tier_stats(tier).tokens_used += spec.tokens
+
+        spec.task = asyncio.create_task(_run())
+        spec.task.add_done_callback(lambda t, s=spec, u=user_id: self._on_done(u, s, t))
+        self._by_user[user_id] = spec
+        self._tier_stats(tier).scheduled += 1
+        return True
+
+    def _sweep(self, now: float) -> None:
+        if now - self._last_sweep < self.SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        ttl = settings.SPECULATIVE_TTL_SECONDS
+        for user_id, spec in list(self._by_user.items()):
+            if now - spec.created_at > ttl:
+                del self._by_user[user_id]
+                self._waste(spec)
+        for user_id, budget in list(self._budgets.items()):
+            if user_id not in self._by_user and budget.used(now, self.BUDGET_WINDOW_SECONDS) == 0:
+                del self._budgets[user_id]
+
+    def _on_done(self, user_id: str, spec: _Speculation, task: "asyncio.Task[Dict[str, Any]]") -> None:
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._tier_stats(spec.tier).failed += 1
+            logger.warning("speculative_failed", extra={"user_id": user_id})
+            if self._by_user.get(user_id) is spec:
+                self._by_user.pop(user_id, None)
+
+    async def claim(self, user_id: str, action_id: str) -> Optional[Dict[str, Any]]:
+        """Готовый (или почти готовый) ответ для нажатого action; None — считать обычным путём."""
+        spec = self._by_user.pop(user_id, None)
+        if spec is None:
+            return None
+
+        stats = self._tier_stats(spec.tier)
+        expired = time.monotonic() - spec.created_at > settings.SPECULATIVE_TTL_SECONDS
+        if spec.action_id != action_id or expired:
+            self._waste(spec)
+            stats.misses += 1
+            return None
+
+        try:
+            result = await spec.task
+        except Exception:
+            stats.misses += 1
+            return None
+
+        stats.hits += 1
+        return result
+
+    def discard(self, user_id: str) -> None:
+        """Пользователь сделал что-то другое — спекуляция больше не нужна."""
+        spec = self._by_user.pop(user_id, None)
+        if spec is not None:
+            self._waste(spec)
+
+    def _waste(self, spec: _Speculation) -> None:
+        stats = self._tier_stats(spec.tier)
+        stats.wasted += 1
+        if spec.task.done():
+            stats.tokens_wasted += spec.tokens
+            return
+        # токены уже частично потрачены; точную цифру запишет finally в _run
+        spec.task.cancel()
+        spec.task.add_done_callback(lambda _t, s=spec: self._count_wasted_tokens(s))
+
+    def _count_wasted_tokens(self, spec: _Speculation) -> None:
+        self._tier_stats(spec.tier).tokens_wasted += spec.tokens
+
+    def stats(self) -> Dict[str, Any]:
+        self._sweep(time.monotonic())
+        return {
+            "enabled": bool(settings.SPECULATIVE_ENABLED),
+            "tiers": {tier: s.as_dict() for tier, s in self._stats.items()},
+            "in_flight": sum(1 for s in self._by_user.values() if not s.task.done()),
+        }
+
+
+speculative_executor = SpeculativeExecutor()
@@ -3,23 +3,13 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional
 
+from app.services.message_features import MessageFeatures, extract_message_features
 
-_STRATEGY_KEYWORDS = (
-    "стратег",
-    "продвиж",
-    "маркетинг план",
-    "план продвиж",
-    "go-to-market",
-    "gtm",
-    "growth",
-    "запуск",
-    "acquisition",
-)
-
-
-def is_strategy_like(text: str) -> bool:
-    t = (text or "").lower()
-    return any(k in t for k in _STRATEGY_KEYWORDS)
+
+def is_strategy_like(text: str, features: Optional[MessageFeatures] = None) -> bool:
+    if features is None:
+        features = extract_message_features(text)
+    return features.strategy_like
 
 
 def build_strategy_scaffold(
@@ -0,0 +1,198 @@
+# app/services/text_compress.py
+"""
+Локальное экстрактивное сжатие текста страницы перед LLM.
+
+- boilerplate: строки, которые встречаются на многих страницах (меню, cookie-баннеры, футеры),
+  плюс явные шаблоны вроде “Все права защищены”;
+- из оставшегося — TextRank по TF-IDF-сходству предложений, с небольшим бонусом
+  за слова из title/h1 и за цифры (цены, сроки, гарантии);
+- отбираются лучшие предложения в пределах бюджета токенов без почти-повторов,
+  порядок — как на странице.
+
+Без зависимостей и без I/O; единственное состояние — индекс BoilerplateIndex.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+# для русского текста токенайзер OpenAI даёт ~3 символа на токен, для английского ~4
+CHARS_PER_TOKEN = 3
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+(?=[A-ZА-ЯЁ0-9«\"])")
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+", re.IGNORECASE)
+_DIGIT_RE = re.compile(r"\d")
+_BOILERPLATE_RE = re.compile(
+    r"cookie|куки|все права защищены|all rights reserved|политик[аи] конфиденциальности|privacy policy"
+    r"|пользовательское соглашение|публичн(ая|ой) оферт|включите javascript|enable javascript",
+    re.IGNORECASE,
+)
+_STOPWORDS = frozenset(
+    """
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+    меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж вам
+    ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего
+    раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем
+    чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше тот
+    через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть
+    том нельзя такой им более всегда конечно всю между это вы ваш ваши вашего наш наши нашей
+    the a an and or of to in on for with is are be this that it as at by from your our you we
+    """.split()
+)
+
+
+def approx_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _line_key(line: str) -> str:
+    normalized = " ".join(_WORD_RE.findall(line.lower()))
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class BoilerplateIndex:
+    """
+    Строки, встреченные на min_pages разных страницах, считаются шаблонными.
+    LRU на max_lines строк: память ограничена, редкие строки вытесняются.
+    """
+
+    def __init__(self, *, min_pages: int = 3, max_lines: int = 50_000) -> None:
+        self._min_pages = min_pages
+        self._max_lines = max_lines
+        self._pages: "OrderedDict[str, Set[str]]" = OrderedDict()
+
+    def observe(self, page_id: str, lines: Iterable[str]) -> None:
+        page = _line_key(page_id)
+        for line in set(lines):
+            key = _line_key(line)
+            seen = self._pages.get(key)
+            if seen is None:
+                seen = self._pages[key] = set()
+            self._pages.move_to_end(key)
+            if len(seen) < self._min_pages:
+                seen.add(page)
+        while len(self._pages) > self._max_lines:
+            self._pages.popitem(last=False)
+
+    def is_boilerplate(self, line: str) -> bool:
+        if _BOILERPLATE_RE.search(line):
+            return True
+        seen = self._pages.get(_line_key(line))
+        return seen is not None and len(seen) >= self._min_pages
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+boilerplate_lines = BoilerplateIndex()
+
+
+def split_sentences(text: str) -> List[str]:
+    out: List[str] = []
+    for line in (text or "").splitlines():
+        for part in _SENTENCE_SPLIT_RE.split(line.strip()):
+            if part:
+                out.append(part)
+    return out
+
+
+def _terms(sentence: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(sentence.lower()) if len(w) > 2 and w not in _STOPWORDS]
+
+
+# предложение почти повторяет уже выбранное (карточки товаров, тарифы “за 4/5/6 недель”) — пропускаем
+REDUNDANCY_THRESHOLD = 0.7
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(t, 0.0) for t, v in a.items())
+
+
+def _textrank(vectors: Sequence[Dict[str, float]], *, damping: float = 0.85, iterations: int = 30) -> List[float]:
+    n = len(vectors)
+    weights: List[List[float]] = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            weights[i][j] = weights[j][i] = _cosine(vectors[i], vectors[j])
+    out_sum = [sum(row) for row in weights]
+
+    scores = [1.0] * n
+    for _ in range(iterations):
+        scores = [
+            (1 - damping)
+            + damping * sum(weights[j][i] / out_sum[j] * scores[j] for j in range(n) if weights[j][i] and out_sum[j])
+            for i in range(n)
+        ]
+    return scores
+
+
+def compress_text(
+    text: str,
+    *,
+    budget_tokens: int,
+    focus: Iterable[str] = (),
+    boilerplate: Optional[BoilerplateIndex] = None,
+) -> str:
+    """
+    Самые информативные предложения text в пределах budget_tokens.
+    focus — title/h1/meta: предложения с этими словами в приоритете.
+    Текст, который и так влезает в бюджет, только очищается от boilerplate.
+    """
+    index = boilerplate if boilerplate is not None else boilerplate_lines
+    seen: Set[str] = set()
+    lines: List[str] = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        key = _line_key(line)
+        if not line or key in seen or index.is_boilerplate(line):
+            continue
+        seen.add(key)
+        lines.append(line)
+
+    cleaned = "\n".join(lines)
+    if approx_tokens(cleaned) <= budget_tokens:
+        return cleaned
+
+    sentences = split_sentences(cleaned)
+    terms = [_terms(s) for s in sentences]
+    df: Counter = Counter()
+    for t in terms:
+        df.update(set(t))
+    n = len(sentences)
+    vectors: List[Dict[str, float]] = []
+    for t in terms:
+        tf = Counter(t)
+        vec = {w: (1 + math.log(c)) * math.log((1 + n) / (1 + df[w])) for w, c in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        vectors.append({w: v / norm for w, v in vec.items()})
+
+    focus_terms = {w for f in focus for w in _terms(f or "")}
+    ranks = _textrank(vectors)
+    scores = []
+    for i, (rank, t) in enumerate(zip(ranks, terms)):
+        bonus = 1.0
+        if focus_terms and focus_terms.intersection(t):
+            bonus += 0.3
+        if _DIGIT_RE.search(sentences[i]):
+            bonus += 0.2
+        if not t:
+            bonus = 0.0
+        scores.append(rank * bonus)
+
+    chosen: List[int] = []
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    used = 0
+    for i in sorted(range(n), key=lambda k: scores[k], reverse=True):
+        size = len(sentences[i]) + 1
+        if scores[i] <= 0 or used + size > budget_chars:
+            continue
+        if any(_cosine(vectors[i], vectors[j]) > REDUNDANCY_THRESHOLD for j in chosen):
+            continue
+        chosen.append(i)
+        used += size
+    return "\n".join(sentences[i] for i in sorted(chosen))
@@ -0,0 +1,84 @@
+# app/services/turn_context.py
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models import TurnContext
+from app.services.scope_guard import ScopeContext
+
+
+def action_id(text: str) -> str:
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()[:12]
+
+
+def with_action_ids(actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for a in actions or []:
+        if not isinstance(a, dict) or not (a.get("text") or "").strip():
+            continue
+        item = dict(a)
+        item["id"] = action_id(item["text"])
+        out.append(item)
+    return out
+
+
+def find_action(turn: Optional[TurnContext], action_id_: str) -> Optional[Dict[str, Any]]:
+    if turn is None:
+        return None
+    for a in turn.actions or []:
+        if isinstance(a, dict) and a.get("id") == action_id_:
+            return a
+    return None
+
+
+async def load_turn_context(db_session: Any, user_id: str) -> Optional[TurnContext]:
+    try:
+        return await db_session.get(TurnContext, user_id)
+    except Exception:
+        return None
+
+
+def scope_context_from(turn: Optional[TurnContext]) -> Optional[ScopeContext]:
+    if turn is None:
+        return None
+    actions = [a.get("text", "") for a in (turn.actions or []) if isinstance(a, dict)]
+    return ScopeContext(
+        last_intent=turn.last_intent,
+        last_in_scope=bool(turn.last_in_scope),
+        last_actions=tuple(a for a in actions if a),
+    )
+
+
+def remember_turn(
+    db_session: Any,
+    user_id: str,
+    turn: Optional[TurnContext],
+    *,
+    intent: str,
+    in_scope: bool,
+    actions: List[Dict[str, Any]],
+    url_context: Optional[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+) -> TurnContext:
+    """
+    Обновляет состояние хода без commit (уедет с ближайшим commit роутера).
+    - для “да”/“ок” интент не определяется — сохраняем прошлый, чтобы цепочка
+      коротких ответов не выпадала из контекста;
+    - actions сохраняются с id (по ним бот зовёт /chat/action);
+    - url_context=(url_summaries, url_insights); None — оставить прошлый.
+    """
+    if intent == "other" and turn is not None and turn.last_intent:
+        intent = turn.last_intent
+
+    if turn is None:
+        turn = TurnContext(user_id=user_id)
+        db_session.add(turn)
+
+    turn.last_intent = intent
+    turn.last_in_scope = in_scope
+    turn.actions = with_action_ids(actions)
+    if url_context is not None:
+        turn.url_summaries, turn.url_insights = url_context
+    turn.updated_at = datetime.utcnow()
+    return turn
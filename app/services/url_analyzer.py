@@ -3,19 +3,38 @@ from __future__ import annotations
 
 import asyncio
 import hashlib
+import logging
 import re
 import time
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlparse, urlunparse
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, quote, urlencode, urlparse, urlunparse
 
-import httpx
 from selectolax.parser import HTMLParser
-from sqlalchemy import delete, select
+from sqlalchemy import and_, delete, or_, select
 
 from app.config import settings
 from app.models import UrlCache
+from app.services.cpu_pool import run_cpu_bound
+from app.services.crawler import CrawlerClient, crawler
+from app.services.page_extract import (
+    CTA_BUDGET,
+    EXCERPT_BUDGET_CHARS,
+    H1_BUDGET,
+    NOISE_TAGS,
+    excerpt_lines,
+    extract_page,
+    is_cta_text,
+)
+from app.services.text_compress import boilerplate_lines
+from app.services.url_fetch_lease import acquire_fetch_lease, release_fetch_lease
+
+if TYPE_CHECKING:
+    from app.services.message_features import MessageFeatures
+
+logger = logging.getLogger(__name__)
 
 URL_RE = re.compile(r"(https?://[^\s\]\)>,\"']+)", re.IGNORECASE)
 HANDLE_RE = re.compile(r"(?<!\w)@([a-zA-Z0-9_\.]{3,30})(?!\w)")
@@ -32,11 +51,30 @@ WORD_HANDLE_RE = re.compile(
 )
 
 
+# маркеры платформы в тексте: решают, куда вести голый @handle
+IG_MARKERS = [
+    "instagram", "инстаграм", "инста", "инст",
+    "рилс", "reels", "сторис", "stories",
+    "шапка профиля", "профиль", "био", "bio",
+    "хайлайт", "highlights",
+    "таплинк", "taplink", "link in bio", "ссылка в био",
+    "просмотры рилс", "просмотры reels",
+    "подписчики",  # часто пишут "подписчики в инсте"
+]
+TG_MARKERS = [
+    "telegram", "телеграм", "тг",
+    "канал", "группа", "чат",
+    "пост", "репост", "переслать", "пересыл",
+    "реакции", "закреп", "закрепленный", "пин", "pinned",
+]
+
+
 def normalize_url(u: str) -> str:
     """
     Приводит URL к каноническому виду для кэша и анализа.
     - убирает fragment
-    - для instagram/t.me/vk/tiktok/youtube убирает query (обычно мусор)
+    - для instagram/t.me/vk/tiktok/youtu.be убирает query (обычно мусор);
+      для youtube.com оставляет только v (watch?v=<id> без него — уже не ссылка на видео)
     - приводит scheme/host к lower
     - убирает trailing slash (кроме корня)
     """
@@ -58,8 +96,13 @@ def normalize_url(u: str) -> str:
             path = p2.path or ""
 
         host = netloc
-        drop_query_hosts = ("instagram.com", "t.me", "vk.com", "tiktok.com", "youtube.com", "youtu.be")
-        query = "" if any(h in host for h in drop_query_hosts) else (p.query or "")
+        drop_query_hosts = ("instagram.com", "t.me", "vk.com", "tiktok.com", "youtu.be")
+        query = p.query or ""
+        if "youtube.com" in host:
+            video_id = parse_qs(query).get("v")
+            query = urlencode({"v": video_id[0]}) if video_id else ""
+        elif any(h in host for h in drop_query_hosts):
+            query = ""
         fragment = ""  # always drop fragments
 
         if path != "/" and path.endswith("/"):
@@ -90,7 +133,7 @@ def extract_urls(text: str) -> List[str]:
     return out[:3]
 
 
-def extract_targets(text: str) -> List[str]:
+def extract_targets(text: str, features: Optional["MessageFeatures"] = None) -> List[str]:
     """
     Возвращает до 3 целей (urls) из:
     - прямых ссылок
@@ -101,31 +144,21 @@ def extract_targets(text: str) -> List[str]:
     - Если пользователь явно про IG -> никогда не пробуем TG для @handle
     - Если явно про TG -> никогда не пробуем IG
     - Если неясно -> эвристика: точка в нике => IG, иначе TG
-    """
-    urls = extract_urls(text)
 
+    features: готовый MessageFeatures (ссылки и маркеры уже посчитаны за один проход).
+    """
     found: List[str] = []
     raw = text or ""
-    context = raw.lower()
-
-    ig_markers = [
-        "instagram", "инстаграм", "инста", "инст",
-        "рилс", "reels", "сторис", "stories",
-        "шапка профиля", "профиль", "био", "bio",
-        "хайлайт", "highlights",
-        "таплинк", "taplink", "link in bio", "ссылка в био",
-        "просмотры рилс", "просмотры reels",
-        "подписчики",  # часто пишут "подписчики в инсте"
-    ]
-    tg_markers = [
-        "telegram", "телеграм", "тг",
-        "канал", "группа", "чат",
-        "пост", "репост", "переслать", "пересыл",
-        "реакции", "закреп", "закрепленный", "пин", "pinned",
-    ]
-
-    prefer_ig = any(x in context for x in ig_markers)
-    prefer_tg = any(x in context for x in tg_markers)
+
+    if features is not None:
+        urls = list(features.urls)
+        prefer_ig = features.prefer_ig
+        prefer_tg = features.prefer_tg
+    else:
+        urls = extract_urls(text)
+        context = raw.lower()
+        prefer_ig = any(x in context for x in IG_MARKERS)
+        prefer_tg = any(x in context for x in TG_MARKERS)
 
     # 1) word-handle: "инсте @name", "instagram name", "tg name"
     for m in WORD_HANDLE_RE.finditer(raw):
@@ -170,6 +203,9 @@ def extract_targets(text: str) -> List[str]:
 class UrlAnalysisResult:
     urls: List[str]
     url_summaries: List[Dict[str, Any]]
+    # истёк deadline: для pending_urls в url_summaries заглушки (pending=True), загрузка идёт в фоне
+    partial: bool = False
+    pending_urls: List[str] = field(default_factory=list)
 
 
 def _sha(text: str) -> str:
@@ -188,6 +224,98 @@ def _ttl_for(page_type: str, ok: bool) -> timedelta:
     return timedelta(days=7)
 
 
+def _is_negative(summary: Dict[str, Any]) -> bool:
+    """Ошибка загрузки или площадка, отдавшая пустую заглушку вместо контента."""
+    return not summary.get("ok") or "platform_may_block_scraping" in (summary.get("warnings") or [])
+
+
+def _summary_ttl(summary: Dict[str, Any]) -> timedelta:
+    if _is_negative(summary):
+        return timedelta(seconds=settings.URL_CACHE_NEGATIVE_TTL_SECONDS)
+    return _ttl_for(summary.get("page_type", "website"), True)
+
+
+# ------------- in-memory tier -------------
+
+
+@dataclass
+class UrlSummary:
+    url: str
+    title: str
+    extracted_text: str
+    url_summary: Dict[str, Any]
+
+
+@dataclass
+class _MemoryEntry:
+    summary: UrlSummary
+    fresh_until: float
+    stale_until: float = field(default=0.0)
+
+
+class InMemoryUrlCacheStore:
+    """
+    LRU-кэш сводок по URL в памяти процесса (первый уровень перед UrlCache).
+
+    Запись свежая до fresh_until; после этого ещё stale_seconds её можно
+    отдать как “слегка устаревшую” (stale-while-revalidate), дальше — промах.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, _MemoryEntry]" = OrderedDict()
+
+    async def set(
+        self,
+        url: str,
+        title: str,
+        extracted_text: str,
+        url_summary: Dict[str, Any],
+        *,
+        ttl_seconds: Optional[float] = None,
+        stale_seconds: Optional[float] = None,
+    ) -> None:
+        now = time.monotonic()
+        ttl = settings.URL_CACHE_MEMORY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        stale = settings.URL_CACHE_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self._entries[url] = _MemoryEntry(
+            summary=UrlSummary(url=url, title=title, extracted_text=extracted_text, url_summary=url_summary),
+            fresh_until=now + ttl,
+            stale_until=now + ttl + stale,
+        )
+        self._entries.move_to_end(url)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def lookup(self, url: str) -> Optional[Tuple[UrlSummary, bool]]:
+        """(summary, is_stale) или None, если записи нет или она совсем протухла."""
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now >= entry.stale_until:
+            self._entries.pop(url, None)
+            return None
+        self._entries.move_to_end(url)
+        return entry.summary, now >= entry.fresh_until
+
+    async def get(self, url: str) -> Optional[UrlSummary]:
+        """Только свежая запись."""
+        hit = await self.lookup(url)
+        if hit is None or hit[1]:
+            return None
+        return hit[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+url_summary_cache = InMemoryUrlCacheStore(max_entries=settings.URL_CACHE_MEMORY_ENTRIES)
+
+
 def _classify(final_url: str) -> str:
     """Return coarse page type to tune extraction/caching."""
     host = urlparse(final_url).netloc.lower()
@@ -208,7 +336,62 @@ def _classify(final_url: str) -> str:
     return "website"
 
 
-async def _fetch_json(client: httpx.AsyncClient, url: str) -> Optional[Dict[str, Any]]:
+# ------------- стратегии по площадкам -------------
+
+
+@dataclass(frozen=True)
+class PlatformStrategy:
+    """
+    Как забирать ссылку площадки:
+    - "skip"   — не ходим вовсе (логин-стена вместо контента), сразу platform_may_block_scraping;
+    - "oembed" — один лёгкий JSON-запрос вместо тяжёлой страницы (для не-видео и при сбое — обычная загрузка);
+    - "page"   — обычная загрузка, при необходимости по переписанному адресу (rewrite).
+    """
+
+    mode: str
+    rewrite: Optional[Callable[[str], str]] = None
+
+
+_TG_RESERVED = {"s", "joinchat", "addstickers", "share", "proxy", "socks", "iv", "c"}
+
+
+def telegram_preview_url(url: str) -> str:
+    """t.me/<channel>[/<post>] -> t.me/s/<channel>[/<post>]: лёгкое превью с последними постами."""
+    parsed = urlparse(url)
+    parts = [p for p in parsed.path.split("/") if p]
+    if not parts or parts[0].lower() in _TG_RESERVED or parts[0].startswith("+"):
+        return url
+    return urlunparse(("https", "t.me", "/s/" + "/".join(parts[:2]), "", "", ""))
+
+
+PLATFORM_STRATEGIES: Dict[str, PlatformStrategy] = {
+    "instagram": PlatformStrategy("skip"),
+    "tiktok": PlatformStrategy("skip"),
+    "vk": PlatformStrategy("skip"),
+    "youtube": PlatformStrategy("oembed"),
+    "telegram": PlatformStrategy("page", rewrite=telegram_preview_url),
+}
+
+YOUTUBE_OEMBED_URL = "https://www.youtube.com/oembed?format=json&url={url}"
+_YOUTUBE_VIDEO_PATH_RE = re.compile(r"^/(shorts|embed|live|v)/[\w-]+$")
+
+
+def _is_youtube_video(url: str) -> bool:
+    """oEmbed отвечает только по видео: youtu.be/<id>, watch?v=<id>, /shorts|embed|live/<id>. Каналы (/@name) — нет."""
+    parsed = urlparse(url)
+    if "youtu.be" in parsed.netloc.lower():
+        return bool(parsed.path.strip("/"))
+    if parsed.path == "/watch":
+        return bool(parse_qs(parsed.query).get("v"))
+    return bool(_YOUTUBE_VIDEO_PATH_RE.match(parsed.path))
+
+
+def _handle_from(url: str) -> str:
+    parts = [p for p in urlparse(url).path.split("/") if p]
+    return parts[0].lstrip("@") if parts else ""
+
+
+async def _fetch_json(client: CrawlerClient, url: str) -> Optional[Dict[str, Any]]:
     try:
         r = await client.get(url)
         if r.status_code >= 400:
@@ -222,56 +405,272 @@ class UrlAnalyzer:
     """Fetch and extract lightweight metadata + text snippet from user provided URLs.
 
     Notes:
-    - Uses DB cache table UrlCache if session is provided.
+    - Two cache tiers: in-process LRU (url_summary_cache), then DB table UrlCache if session is provided.
+    - Failures and blocked platforms are cached briefly (URL_CACHE_NEGATIVE_TTL_SECONDS).
+    - Slightly expired summaries are returned at once and refreshed in background (stale-while-revalidate).
     - Avoids heavy scraping for platforms that are frequently blocked.
+    - Fetches through the shared process-wide crawler (keep-alive, per-host limits).
+    - Concurrent misses for one normalized URL share a single fetch (in-process single-flight);
+      across workers a url_fetch_leases row lets one worker fetch while the others wait for the cache.
     """
 
-    def __init__(self, db_session: Any = None) -> None:
-        self._db_session = db_session
+    # url -> общая загрузка (single-flight); задача живёт до конца загрузки, даже если все ждущие ушли
+    _inflight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
 
-    async def analyze(self, text: str) -> Optional[UrlAnalysisResult]:
-        urls = extract_targets(text)
+    def __init__(
+        self,
+        db_session: Any = None,
+        crawler_client: Optional[CrawlerClient] = None,
+        memory_cache: Optional[InMemoryUrlCacheStore] = None,
+    ) -> None:
+        self._db_session = db_session
+        self._crawler = crawler_client or crawler
+        self._memory = memory_cache if memory_cache is not None else url_summary_cache
+
+    async def analyze(
+        self,
+        text: str,
+        features: Optional["MessageFeatures"] = None,
+        *,
+        deadline: Optional[float] = None,
+    ) -> Optional[UrlAnalysisResult]:
+        """
+        deadline (сек): сколько ждём загрузку. Что не успело — возвращается заглушкой
+        с pending=True (result.partial), а загрузка доезжает в фоне и кладёт сводку в кэш:
+        следующий ход подхватит её через resolve_pending.
+        """
+        urls = extract_targets(text, features=features)
         if not urls:
             return None
 
         # дополнительно нормализуем (на всякий)
         urls = [normalize_url(u) for u in urls]
 
-        summaries = await asyncio.gather(*(self._fetch_and_summarize(u) for u in urls))
-        return UrlAnalysisResult(urls=urls, url_summaries=list(summaries))
+        expired: Dict[str, Dict[str, Any]] = {}
+        cached = await self._get_cached_many(urls, expired=expired)
 
-    async def _get_cached(self, url: str) -> Optional[Dict[str, Any]]:
-        if not self._db_session:
-            return None
+        if deadline is None:
+            summaries = await asyncio.gather(
+                *(self._cached_or_fetch(u, cached, expired.get(u)) for u in urls)
+            )
+            return UrlAnalysisResult(urls=urls, url_summaries=list(summaries))
 
-        try:
-            await self._db_session.execute(delete(UrlCache).where(UrlCache.expires_at < _now_utc()))
-            await self._db_session.commit()
+        # загрузки не завязаны на сессию запроса — им можно пережить сам запрос
+        tasks = {
+            u: _spawn_background(self._fetch_shared(u, expired.get(u)))
+            for u in dict.fromkeys(urls)
+            if u not in cached
+        }
+        if tasks:
+            await asyncio.wait(list(tasks.values()), timeout=deadline)
+
+        ready: Dict[str, Dict[str, Any]] = dict(cached)
+        pending: List[str] = []
+        for u, task in tasks.items():
+            if not task.done():
+                pending.append(u)
+                ready[u] = _pending_summary(u)
+            elif task.exception() is not None:
+                ready[u] = _fetch_error_summary(u, task.exception())
+            else:
+                ready[u] = task.result()
+
+        return UrlAnalysisResult(
+            urls=urls,
+            url_summaries=[ready[u] for u in urls],
+            partial=bool(pending),
+            pending_urls=pending,
+        )
+
+    async def summarize(self, url: str) -> Dict[str, Any]:
+        """Сводка по одной ссылке: кэш (память -> БД) или загрузка."""
+        return await self._fetch_and_summarize(url)
+
+    async def refresh(self, url: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Свежая загрузка мимо кэша (плановые перепроверки). previous — прошлая сводка:
+        по её валидаторам запрос идёт условным, 304 отдаёт её же без повторного разбора.
+        """
+        return await self._fetch_and_summarize(url, use_cache=False, previous=previous)
+
+    async def resolve_pending(self, summaries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Заменяет заглушки pending на сводки, которые уже доехали в кэш."""
+        pending = [s["url"] for s in summaries if isinstance(s, dict) and s.get("pending")]
+        if not pending:
+            return summaries
+        ready = await self._get_cached_many(pending)
+        return [ready.get(s["url"], s) if isinstance(s, dict) and s.get("pending") else s for s in summaries]
+
+    async def _cached_or_fetch(
+        self,
+        url: str,
+        cached: Dict[str, Dict[str, Any]],
+        previous: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        hit = cached.get(url)
+        if hit is not None:
+            return hit
+        return await self._fetch_shared(url, previous)
+
+    async def _get_cached(self, url: str) -> Optional[Dict[str, Any]]:
+        return (await self._get_cached_many([url])).get(url)
+
+    async def _get_cached_many(
+        self,
+        urls: List[str],
+        *,
+        expired: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Память -> БД (один SELECT ... WHERE url IN (...) на промахи памяти).
+        Только чтение: протухшие строки удаляет фоновый sweep_expired_url_cache.
+        Устаревшая (в пределах URL_CACHE_STALE_SECONDS) запись отдаётся сразу
+        с cache="stale", а в фоне запускается обновление.
+        Совсем протухшие строки складываются в expired — по их валидаторам
+        делается условный запрос (If-None-Match / If-Modified-Since).
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        stale: List[str] = []
+        stale_in_memory: Dict[str, Dict[str, Any]] = {}
+
+        for url in urls:
+            hit = await self._memory.lookup(url)
+            if hit is None:
+                continue
+            summary, is_stale = hit
+            if not is_stale:
+                out[url] = dict(summary.url_summary, cache="memory")
+            elif self._db_session:
+                # в БД может лежать более свежая версия (другой воркер уже обновил)
+                stale_in_memory[url] = summary.url_summary
+            else:
+                out[url] = dict(summary.url_summary, cache="stale")
+                stale.append(url)
+
+        missing = [u for u in urls if u not in out]
+        if self._db_session and missing:
+            try:
+                res = await self._db_session.execute(select(UrlCache).where(UrlCache.url.in_(set(missing))))
+                rows = res.scalars().all()
+            except Exception:
+                rows = []
 
-            res = await self._db_session.execute(select(UrlCache).where(UrlCache.url == url))
-            row = res.scalar_one_or_none()
-            if not row:
-                return None
-            if row.expires_at and row.expires_at < _now_utc():
-                return None
-            if row.summary_json:
+            now = _now_utc()
+            stale_window = timedelta(seconds=settings.URL_CACHE_STALE_SECONDS)
+            for row in rows:
+                if not row.summary_json:
+                    continue
                 data = dict(row.summary_json)
-                data["cache"] = "hit"
-                return data
-        except Exception:
-            return None
-        return None
+                data.setdefault("validators", {"etag": row.etag, "last_modified": row.last_modified})
+                expires_at = row.expires_at or now
+                is_stale = expires_at < now
+                if is_stale and (_is_negative(data) or expires_at + stale_window < now):
+                    if expired is not None and not _is_negative(data):
+                        expired[row.url] = data
+                    continue
+                if not is_stale:
+                    # прогреваем память на остаток жизни строки
+                    await self._remember(row.url, data, ttl_seconds=(expires_at - now).total_seconds())
+                data["cache"] = "stale" if is_stale else "hit"
+                out[row.url] = data
+                if is_stale:
+                    stale.append(row.url)
+
+        for url, summary in stale_in_memory.items():
+            if url not in out:
+                out[url] = dict(summary, cache="stale")
+                stale.append(url)
+
+        for url in stale:
+            self._schedule_refresh(url, previous=out[url])
+        return out
+
+    async def _remember(self, url: str, summary: Dict[str, Any], *, ttl_seconds: float) -> None:
+        negative = _is_negative(summary)
+        await self._memory.set(
+            url,
+            summary.get("title") or "",
+            summary.get("main_text_excerpt") or "",
+            summary,
+            ttl_seconds=min(ttl_seconds, settings.URL_CACHE_MEMORY_TTL_SECONDS),
+            # отрицательный результат не отдаём устаревшим: по истечении — честный повтор
+            stale_seconds=0 if negative else None,
+        )
+
+    async def _fetch_shared(self, url: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Single-flight по нормализованному URL: первый промах запускает загрузку,
+        остальные (в том числе от других пользователей) ждут её же.
+        Ждущего можно отменить (deadline) — сама загрузка при этом доезжает и заполняет кэш.
+        """
+        task = UrlAnalyzer._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_detached(url, previous))
+            UrlAnalyzer._inflight[url] = task
+            task.add_done_callback(lambda t, u=url: _forget_inflight(u, t))
+        summary = await asyncio.shield(task)
+        return dict(summary)
+
+    async def _fetch_detached(self, url: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Загрузка со своей сессией БД: сессия запроса к концу может быть уже закрыта."""
+        if self._db_session is None:
+            return await UrlAnalyzer(None, self._crawler, self._memory)._fetch_and_summarize(
+                url, use_cache=False, previous=previous
+            )
+        from app.db import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as session:
+            return await UrlAnalyzer(session, self._crawler, self._memory)._fetch_leased(url, previous)
+
+    async def _fetch_leased(self, url: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Межпроцессный single-flight: качает тот воркер, который взял аренду url в url_fetch_leases,
+        остальные опрашивают кэш. Держатель не успел за URL_FETCH_LEASE_WAIT_SECONDS — качаем сами.
+        """
+        if settings.URL_FETCH_LEASE_SECONDS <= 0 or self._db_session is None:
+            return await self._fetch_and_summarize(url, use_cache=False, previous=previous)
+
+        if await acquire_fetch_lease(self._db_session, url, ttl_seconds=settings.URL_FETCH_LEASE_SECONDS):
+            try:
+                return await self._fetch_and_summarize(url, use_cache=False, previous=previous)
+            finally:
+                await release_fetch_lease(self._db_session, url)
+
+        waited_until = time.monotonic() + settings.URL_FETCH_LEASE_WAIT_SECONDS
+        while time.monotonic() < waited_until:
+            await asyncio.sleep(settings.URL_FETCH_LEASE_POLL_SECONDS)
+            cached = await self._get_cached(url)
+            if cached is not None:
+                return cached
+        return await self._fetch_and_summarize(url, use_cache=False, previous=previous)
+
+    def _schedule_refresh(self, url: str, previous: Optional[Dict[str, Any]] = None) -> None:
+        if url in UrlAnalyzer._inflight:
+            return
+
+        async def _refresh() -> None:
+            try:
+                await self._fetch_shared(url, previous)
+            except Exception:
+                logger.warning("url_cache_refresh_failed", extra={"url": url}, exc_info=True)
+
+        _spawn_background(_refresh())
 
     async def _set_cache(self, url: str, extracted_hash: str, summary: Dict[str, Any]) -> None:
+        summary.pop("cache", None)
+        ttl = _summary_ttl(summary)
+        await self._remember(url, summary, ttl_seconds=ttl.total_seconds())
         if not self._db_session:
             return
+        validators = summary.get("validators") or {}
         try:
-            expires = _now_utc() + _ttl_for(summary.get("page_type", "website"), bool(summary.get("ok")))
             obj = UrlCache(
                 url=url,
                 extracted_text_hash=extracted_hash,
                 summary_json=summary,
-                expires_at=expires,
+                etag=validators.get("etag"),
+                last_modified=validators.get("last_modified"),
+                expires_at=_now_utc() + ttl,
             )
             await self._db_session.merge(obj)
             await self._db_session.commit()
@@ -281,197 +680,438 @@ class UrlAnalyzer:
             except Exception:
                 pass
 
-    async def _fetch_and_summarize(self, url: str) -> Dict[str, Any]:
+    async def _fetch_and_summarize(
+        self,
+        url: str,
+        *,
+        use_cache: bool = True,
+        previous: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        previous — прошлая сводка этого URL: по её валидаторам идёт условный запрос,
+        и если страница не изменилась (304 или тот же content_hash), возвращаем её же
+        с продлённым TTL, без разбора и без новых LLM-инсайтов.
+        """
         url = normalize_url(url)
 
-        cached = await self._get_cached(url)
-        if cached is not None:
-            return cached
+        if use_cache:
+            cached = await self._get_cached(url)
+            if cached is not None:
+                return cached
+            return await self._fetch_shared(url)
 
         started = time.time()
-        headers = {
-            "User-Agent": "Mozilla/5.0 (compatible; ChatplaceBot/1.0; +https://chatplace.io)",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        strategy = PLATFORM_STRATEGIES.get(_classify(url))
+        if strategy is not None and strategy.mode == "skip":
+            return await self._skipped_summary(url)
+        if strategy is not None and strategy.mode == "oembed" and _is_youtube_video(url):
+            oembed_summary = await self._oembed_summary(url, started)
+            if oembed_summary is not None:
+                return oembed_summary
+            # oEmbed не ответил (видео скрыто, сбой) — пробуем обычную страницу
+        fetch_url = strategy.rewrite(url) if strategy is not None and strategy.rewrite else url
+
+        try:
+            async with self._crawler.stream(fetch_url, headers=_conditional_headers(previous)) as resp:
+                status = resp.status_code
+                if status == 304 and previous is not None:
+                    return await self._revalidated(url, previous, resp.headers)
+
+                final_url = normalize_url(str(resp.url))
+                page_type = _classify(final_url)
+                ctype = (resp.headers.get("content-type") or "").lower()
+
+                # Fast-path: PDF / non-html — тело не качаем, соединение закрывается сразу после заголовков
+                if page_type == "pdf" or ("text/html" not in ctype and "application/xhtml+xml" not in ctype):
+                    summary = {
+                        "ok": status < 400,
+                        "url": url,
+                        "final_url": final_url,
+                        "status_code": status,
+                        "content_type": ctype,
+                        "page_type": page_type,
+                        "elapsed_ms": int((time.time() - started) * 1000),
+                        "warnings": ["not_html"],
+                    }
+                    await self._set_cache(url, _sha(final_url + ctype), summary)
+                    return summary
+
+                if status >= 400:
+                    summary = {
+                        "ok": False,
+                        "url": url,
+                        "final_url": final_url,
+                        "status_code": status,
+                        "error": f"http_{status}",
+                        "warnings": ["blocked_or_not_found"],
+                        "page_type": page_type,
+                        "elapsed_ms": int((time.time() - started) * 1000),
+                    }
+                    await self._set_cache(url, _sha(final_url + str(status)), summary)
+                    return summary
+
+                html, hit_byte_cap, stopped_early = await _read_html(resp)
+        except Exception as e:
+            summary = _fetch_error_summary(url, e)
+            await self._set_cache(url, _sha(str(summary)), summary)
+            return summary
+
+        # разбор большой страницы — в пуле процессов, чтобы не стопорить event loop
+        page = await run_cpu_bound(
+            extract_page, html, page_type, inline=len(html) < settings.URL_EXTRACT_INLINE_MAX_CHARS
+        )
+        title = page["title"]
+        og = page["og"]
+
+        warnings: List[str] = []
+        if not page["main_text_excerpt"] and not page["telegram_last_posts"]:
+            warnings.append("empty_main_text")
+
+        # Common blocked platforms
+        if page_type in {"instagram", "vk", "tiktok"} and ("empty_main_text" in warnings):
+            warnings.append("platform_may_block_scraping")
+
+        # тело дочитано не до конца, и в сводке чего-то не хватает — разбор мог это потерять
+        missing_fields = not page["h1"] or not page["cta_texts"] or not page["main_text_excerpt"]
+        if hit_byte_cap or (stopped_early and missing_fields):
+            warnings.append("page_truncated")
+
+        # строки, повторяющиеся на многих страницах (меню, cookie, футер), не пойдут в промпт разбора
+        boilerplate_lines.observe(final_url, page["main_text_excerpt"].splitlines())
+
+        validators = _validators_from(resp.headers)
+
+        elapsed_ms = int((time.time() - started) * 1000)
+
+        summary = {
+            "ok": True,
+            "url": url,
+            "final_url": final_url,
+            "status_code": status,
+            "elapsed_ms": elapsed_ms,
+            "content_type": ctype,
+            "page_type": page_type,
+            "title": (title or "")[:500],
+            "meta_description": (page["meta_description"] or "")[:800],
+            "og": {
+                "title": (og.get("title") or "")[:800],
+                "description": (og.get("description") or "")[:1200],
+                "image": (og.get("image") or "")[:1200],
+                "type": (og.get("type") or "")[:120],
+                "site_name": (og.get("site_name") or "")[:200],
+                "url": (og.get("url") or "")[:1200],
+            },
+            "h1": [x[:300] for x in page["h1"]],
+            "headings": [x[:300] for x in page["headings"]],
+            "cta_texts": page["cta_texts"],
+            "main_text_excerpt": page["main_text_excerpt"],
+            "telegram_last_posts": page["telegram_last_posts"],
+            "warnings": warnings,
+            "validators": validators,
         }
 
-        timeout = httpx.Timeout(20.0)
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, headers=headers) as client:
-            try:
-                resp = await client.get(url)
-            except Exception as e:
-                summary = {
-                    "ok": False,
-                    "url": url,
-                    "status_code": None,
-                    "error": f"fetch_error:{type(e).__name__}",
-                    "warnings": ["fetch_failed"],
-                    "page_type": "unknown",
-                }
-                await self._set_cache(url, _sha(str(summary)), summary)
-                return summary
-
-            status = resp.status_code
-            final_url = normalize_url(str(resp.url))
-            page_type = _classify(final_url)
-            ctype = (resp.headers.get("content-type") or "").lower()
-
-            # Fast-path: PDF / non-html
-            if page_type == "pdf" or ("text/html" not in ctype and "application/xhtml+xml" not in ctype):
-                summary = {
-                    "ok": status < 400,
-                    "url": url,
-                    "final_url": final_url,
-                    "status_code": status,
-                    "content_type": ctype,
-                    "page_type": page_type,
-                    "elapsed_ms": int((time.time() - started) * 1000),
-                    "warnings": ["not_html"],
-                }
-                await self._set_cache(url, _sha(final_url + ctype), summary)
-                return summary
-
-            if status >= 400:
-                summary = {
-                    "ok": False,
-                    "url": url,
-                    "final_url": final_url,
-                    "status_code": status,
-                    "error": f"http_{status}",
-                    "warnings": ["blocked_or_not_found"],
-                    "page_type": page_type,
-                    "elapsed_ms": int((time.time() - started) * 1000),
-                }
-                await self._set_cache(url, _sha(final_url + str(status)), summary)
-                return summary
-
-            html = resp.text or ""
-
-            # Try oEmbed for platforms where it exists
-            oembed: Optional[Dict[str, Any]] = None
-            if page_type == "youtube":
-                oembed = await _fetch_json(client, f"https://www.youtube.com/oembed?format=json&url={final_url}")
-
-            parsed = HTMLParser(html)
-
-            def _meta_name(name: str) -> str:
-                n = parsed.css_first(f'meta[name="{name}"]')
-                if n and n.attributes.get("content"):
-                    return n.attributes["content"].strip()
-                return ""
-
-            def _meta_prop(prop: str) -> str:
-                n = parsed.css_first(f'meta[property="{prop}"]')
-                if n and n.attributes.get("content"):
-                    return n.attributes["content"].strip()
-                return ""
-
-            title = (parsed.css_first("title").text(strip=True) if parsed.css_first("title") else "")
-            meta_desc = _meta_name("description")
-
-            og = {
-                "title": _meta_prop("og:title"),
-                "description": _meta_prop("og:description"),
-                "image": _meta_prop("og:image"),
-                "type": _meta_prop("og:type"),
-                "site_name": _meta_prop("og:site_name"),
-                "url": _meta_prop("og:url"),
-            }
-
-            if oembed:
-                title = title or oembed.get("title") or ""
-                og["image"] = og.get("image") or oembed.get("thumbnail_url") or ""
-
-            h1 = [n.text(strip=True) for n in parsed.css("h1")][:3]
-            headings = [n.text(strip=True) for n in parsed.css("h2")][:10]
-
-            # CTA texts: buttons/links
-            ctas: List[str] = []
-            for n in parsed.css("a,button"):
-                t = (n.text(strip=True) or "").strip()
-                if 0 < len(t) <= 50:
-                    if any(
-                        k in t.lower()
-                        for k in [
-                            "куп", "заказ", "рег", "скач", "подпис", "получ", "начать", "войти", "запис",
-                            "book", "buy", "order", "sign", "download", "get", "start",
-                        ]
-                    ):
-                        ctas.append(t)
-
-            seen = set()
-            cta_texts: List[str] = []
-            for x in ctas:
-                if x not in seen:
-                    seen.add(x)
-                    cta_texts.append(x)
-            cta_texts = cta_texts[:10]
-
-            # Remove noise
-            for bad in parsed.css("script,style,noscript,svg"):
-                bad.decompose()
-
-            # Telegram pages: try extract last post snippets
-            tg_posts: List[str] = []
-            if page_type == "telegram":
-                for n in parsed.css(".tgme_widget_message_text"):
-                    t = (n.text(separator="\n", strip=True) or "").strip()
-                    if t:
-                        tg_posts.append(t[:500])
-                    if len(tg_posts) >= 5:
-                        break
-
-            body = parsed.css_first("body")
-            raw_text = body.text(separator="\n", strip=True) if body else parsed.text(separator="\n", strip=True)
-            lines = [ln.strip() for ln in raw_text.splitlines()]
-            lines = [ln for ln in lines if 30 <= len(ln) <= 500]
-            main_text_excerpt = "\n".join(lines)[:5000]
-
-            warnings: List[str] = []
-            if not main_text_excerpt and not tg_posts:
-                warnings.append("empty_main_text")
-
-            # Common blocked platforms
-            if page_type in {"instagram", "vk", "tiktok"} and ("empty_main_text" in warnings):
-                warnings.append("platform_may_block_scraping")
-
-            elapsed_ms = int((time.time() - started) * 1000)
-
-            summary = {
-                "ok": True,
+        extracted_hash = _sha(
+            "\n".join(
+                [
+                    summary.get("title", ""),
+                    summary.get("meta_description", ""),
+                    summary.get("main_text_excerpt", ""),
+                    "\n".join(summary.get("cta_texts", []) or []),
+                    "\n".join(summary.get("telegram_last_posts", []) or []),
+                ]
+            )
+        )
+        if previous is not None and previous.get("content_hash") == extracted_hash:
+            return await self._revalidated(url, previous, resp.headers)
+
+        summary["content_hash"] = extracted_hash
+        await self._set_cache(url, extracted_hash, summary)
+        return summary
+
+    async def _skipped_summary(self, url: str) -> Dict[str, Any]:
+        """Площадка отдаёт логин-стену: не тратим запрос, сразу просим данные у пользователя."""
+        page_type = _classify(url)
+        summary = {
+            "ok": True,
+            "url": url,
+            "final_url": url,
+            "status_code": None,
+            "elapsed_ms": 0,
+            "page_type": page_type,
+            "handle": _handle_from(url),
+            "warnings": ["empty_main_text", "platform_may_block_scraping", "fetch_skipped"],
+        }
+        await self._set_cache(url, _sha(url + page_type), summary)
+        return summary
+
+    async def _oembed_summary(self, url: str, started: float) -> Optional[Dict[str, Any]]:
+        """Сводка видео по oEmbed; None — oEmbed не ответил, вызывающий загружает страницу."""
+        oembed = await _fetch_json(self._crawler, YOUTUBE_OEMBED_URL.format(url=quote(url, safe="")))
+        elapsed_ms = int((time.time() - started) * 1000)
+        if not oembed:
+            return None
+
+        title = str(oembed.get("title") or "")
+        author = str(oembed.get("author_name") or "")
+        summary = {
+            "ok": True,
+            "url": url,
+            "final_url": url,
+            "status_code": 200,
+            "elapsed_ms": elapsed_ms,
+            "content_type": "application/json+oembed",
+            "page_type": "youtube",
+            "title": title[:500],
+            "author_name": author[:200],
+            "meta_description": "",
+            "og": {
+                "title": title[:800],
+                "description": "",
+                "image": str(oembed.get("thumbnail_url") or "")[:1200],
+                "type": str(oembed.get("type") or "")[:120],
+                "site_name": str(oembed.get("provider_name") or "YouTube")[:200],
                 "url": url,
-                "final_url": final_url,
-                "status_code": status,
-                "elapsed_ms": elapsed_ms,
-                "content_type": ctype,
-                "page_type": page_type,
-                "title": (title or "")[:500],
-                "meta_description": (meta_desc or "")[:800],
-                "og": {
-                    "title": (og.get("title") or "")[:800],
-                    "description": (og.get("description") or "")[:1200],
-                    "image": (og.get("image") or "")[:1200],
-                    "type": (og.get("type") or "")[:120],
-                    "site_name": (og.get("site_name") or "")[:200],
-                    "url": (og.get("url") or "")[:1200],
-                },
-                "h1": [x[:300] for x in h1],
-                "headings": [x[:300] for x in headings],
-                "cta_texts": cta_texts,
-                "main_text_excerpt": main_text_excerpt,
-                "telegram_last_posts": tg_posts,
-                "warnings": warnings,
-            }
-
-            extracted_hash = _sha(
-                "\n".join(
-                    [
-                        summary.get("title", ""),
-                        summary.get("meta_description", ""),
-                        summary.get("main_text_excerpt", ""),
-                        "\n".join(summary.get("cta_texts", []) or []),
-                        "\n".join(summary.get("telegram_last_posts", []) or []),
-                    ]
+            },
+            "h1": [],
+            "headings": [],
+            "cta_texts": [],
+            "main_text_excerpt": "",
+            "telegram_last_posts": [],
+            "warnings": ["oembed_only"],
+        }
+        extracted_hash = _sha("\n".join([title, author]))
+        summary["content_hash"] = extracted_hash
+        await self._set_cache(url, extracted_hash, summary)
+        return summary
+
+    async def _revalidated(self, url: str, previous: Dict[str, Any], headers: Any) -> Dict[str, Any]:
+        summary = dict(previous)
+        summary["validators"] = _validators_from(headers) or previous.get("validators") or {}
+        await self._set_cache(url, summary.get("content_hash") or "", summary)
+        return dict(summary, cache="revalidated")
+
+
+# ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background_tasks: Set["asyncio.Task[Any]"] = set()
+
+
+def _spawn_background(coro: Any) -> "asyncio.Task[Any]":
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _forget_inflight(url: str, task: "asyncio.Task[Any]") -> None:
+    if UrlAnalyzer._inflight.get(url) is task:
+        UrlAnalyzer._inflight.pop(url, None)
+    # все ждущие могли уйти по deadline — ошибку тогда никто не увидит, пишем в лог
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("url_fetch_failed", extra={"url": url}, exc_info=task.exception())
+
+
+def _pending_summary(url: str) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "pending": True,
+        "url": url,
+        "status_code": None,
+        "page_type": _classify(url),
+        "warnings": ["analysis_pending"],
+    }
+
+
+def _fetch_error_summary(url: str, exc: BaseException) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "url": url,
+        "status_code": None,
+        "error": f"fetch_error:{type(exc).__name__}",
+        "warnings": ["fetch_failed"],
+        "page_type": "unknown",
+    }
+
+
+def _validators_from(headers: Any) -> Dict[str, Optional[str]]:
+    etag = headers.get("etag")
+    last_modified = headers.get("last-modified")
+    if not etag and not last_modified:
+        return {}
+    return {"etag": etag, "last_modified": last_modified}
+
+
+def _conditional_headers(previous: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    validators = (previous or {}).get("validators") or {}
+    headers: Dict[str, str] = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+# ------------- загрузка и разбор страницы -------------
+
+_HEAD_END_RE = re.compile(rb"</head\s*>", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+_EARLY_STOP_CHECK_BYTES = 64 * 1024
+
+
+def _sniff_encoding(declared: Optional[str], head: bytes) -> str:
+    if declared:
+        return declared
+    m = _META_CHARSET_RE.search(head)
+    if m:
+        name = m.group(1).decode("ascii", errors="ignore")
+        try:
+            "".encode(name)
+            return name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+_RAW_TEXT_OPEN_RE = re.compile(rb"<(script|style|noscript)\b", re.IGNORECASE)
+
+
+def _raw_text_end(buf: bytearray, pos: int) -> Optional[int]:
+    """
+    Если pos внутри незакрытого <script>/<style>/<noscript> — позиция сразу после закрывающего тега
+    (None — он ещё не пришёл); иначе сам pos. Кусок, начатый посреди скрипта, парсер принял бы за текст.
+    """
+    last = None
+    for m in _RAW_TEXT_OPEN_RE.finditer(buf, 0, pos):
+        last = m
+    if last is None:
+        return pos
+    close_re = re.compile(rb"</" + last.group(1) + rb"\s*>", re.IGNORECASE)
+    closed = close_re.search(buf, last.end())
+    if closed is None:
+        return None
+    return pos if closed.end() <= pos else closed.end()
+
+
+class _ExtractionBudget:
+    """Сколько текста/h1/CTA уже пришло в теле — по видимому тексту, без script/style."""
+
+    def __init__(self) -> None:
+        self.body_chars = 0
+        self.h1 = 0
+        self.cta: set = set()
+
+    def observe(self, piece: str) -> bool:
+        """Учитывает кусок тела; True — он добавил h1 или CTA в пределах их бюджетов."""
+        parsed = HTMLParser(piece)
+        parsed.strip_tags(list(NOISE_TAGS))
+        h1_before, cta_before = self.h1, len(self.cta)
+        self.h1 += len(parsed.css("h1"))
+        for node in parsed.css("a, button"):
+            t = (node.text(strip=True) or "").strip()
+            if len(self.cta) < CTA_BUDGET and is_cta_text(t):
+                self.cta.add(t)
+        self.body_chars += sum(len(ln) for ln in excerpt_lines(parsed.text(separator="\n", strip=True)))
+        return (h1_before < H1_BUDGET and self.h1 > h1_before) or len(self.cta) > cta_before
+
+    @property
+    def excerpt_met(self) -> bool:
+        return self.body_chars >= EXCERPT_BUDGET_CHARS
+
+    @property
+    def met(self) -> bool:
+        return self.excerpt_met and self.h1 >= H1_BUDGET and len(self.cta) >= CTA_BUDGET
+
+
+async def _read_html(resp: Any) -> Tuple[str, bool, bool]:
+    """
+    Читает тело потоком, не больше URL_FETCH_MAX_BYTES.
+    Дальше не качаем, как только <head> получен и в видимом тексте body уже набрана выдержка
+    (EXCERPT_BUDGET_CHARS), а затем либо набраны и остальные бюджеты (H1_BUDGET h1, CTA_BUDGET кнопок),
+    либо URL_FETCH_QUIET_WINDOW_BYTES байт не принесли ни одного нового h1/CTA — типичный лендинг
+    с одним h1 и парой кнопок до максимумов не дойдёт.
+    Возвращает (html, упёрлись_в_лимит_байт, остановились_до_конца_тела).
+    """
+    max_bytes = settings.URL_FETCH_MAX_BYTES
+    buf = bytearray()
+    head_end: Optional[int] = None
+    scanned = 0
+    budget = _ExtractionBudget()
+    quiet_from: Optional[int] = None  # с какого байта после набора выдержки нет новых h1/CTA
+    hit_cap = False
+    stopped_early = False
+
+    async for chunk in resp.aiter_bytes():
+        buf += chunk
+        if len(buf) >= max_bytes:
+            del buf[max_bytes:]
+            hit_cap = True
+            break
+
+        if head_end is None:
+            m = _HEAD_END_RE.search(buf)
+            if m is None:
+                continue
+            head_end = scanned = m.end()
+
+        if len(buf) - scanned < _EARLY_STOP_CHECK_BYTES:
+            continue
+        # считаем только новый кусок — без повторного разбора всего документа;
+        # если он начинается внутри скрипта, пропускаем скрипт целиком
+        start = _raw_text_end(buf, scanned)
+        if start is None:
+            continue
+        piece = bytes(buf[start:]).decode("utf-8", errors="ignore")
+        scanned = len(buf)
+        progressed = budget.observe(piece)
+        if budget.met:
+            stopped_early = True
+            break
+        if not budget.excerpt_met:
+            continue
+        if progressed or quiet_from is None:
+            quiet_from = len(buf)
+        elif len(buf) - quiet_from >= settings.URL_FETCH_QUIET_WINDOW_BYTES:
+            stopped_early = True
+            break
+
+    encoding = _sniff_encoding(getattr(resp, "charset_encoding", None), bytes(buf[:4096]))
+    return bytes(buf).decode(encoding, errors="replace"), hit_cap, stopped_early
+
+
+async def sweep_expired_url_cache(db_session: Any, *, batch_size: int = 500, max_batches: int = 20) -> int:
+    """
+    Удаляет протухшие строки UrlCache пачками по batch_size (каждая — своя короткая транзакция),
+    чтобы не держать долгую блокировку и не мешать чтению. Возвращает число удалённых строк.
+
+    - без валидаторов — после окна stale-while-revalidate (URL_CACHE_STALE_SECONDS);
+    - с ETag/Last-Modified — только через URL_CACHE_VALIDATOR_RETENTION_SECONDS:
+      по ним _get_cached_many делает условный запрос, и 304 избавляет от загрузки и разбора.
+    """
+    total = 0
+    for _ in range(max_batches):
+        now = _now_utc()
+        # строки в окне stale-while-revalidate ещё нужны читателям
+        stale_cutoff = now - timedelta(seconds=settings.URL_CACHE_STALE_SECONDS)
+        validator_cutoff = now - timedelta(
+            seconds=max(settings.URL_CACHE_VALIDATOR_RETENTION_SECONDS, settings.URL_CACHE_STALE_SECONDS)
+        )
+        expired = (
+            select(UrlCache.url)
+            .where(
+                or_(
+                    and_(
+                        UrlCache.expires_at < stale_cutoff,
+                        UrlCache.etag.is_(None),
+                        UrlCache.last_modified.is_(None),
+                    ),
+                    UrlCache.expires_at < validator_cutoff,
                 )
             )
-            await self._set_cache(url, extracted_hash, summary)
-            return summary
+            .limit(batch_size)
+        )
+        res = await db_session.execute(delete(UrlCache).where(UrlCache.url.in_(expired)))
+        await db_session.commit()
+        deleted = int(res.rowcount or 0)
+        total += deleted
+        if deleted < batch_size:
+            break
+    return total
@@ -0,0 +1,61 @@
+# app/services/url_cache_sweeper.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Optional
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.services.scope_guard import sweep_old_scope_decisions
+from app.services.url_analyzer import sweep_expired_url_cache
+from app.services.url_insights import sweep_old_url_insights
+
+logger = logging.getLogger(__name__)
+
+
+class UrlCacheSweeper:
+    """
+    Фоновая чистка url_cache раз в URL_CACHE_SWEEP_INTERVAL_SECONDS
+    (вместо DELETE на каждом чтении кэша). 0 — выключено.
+    Заодно удаляет разборы url_insight_cache старше URL_INSIGHTS_CACHE_TTL_DAYS
+    и строки scope_decisions старше SCOPE_DECISIONS_RETENTION_DAYS.
+    """
+
+    def __init__(self) -> None:
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if settings.URL_CACHE_SWEEP_INTERVAL_SECONDS <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def run_once(self) -> int:
+        async with AsyncSessionLocal() as session:
+            deleted = await sweep_expired_url_cache(session, batch_size=settings.URL_CACHE_SWEEP_BATCH)
+            deleted += await sweep_old_url_insights(session, batch_size=settings.URL_CACHE_SWEEP_BATCH)
+            deleted += await sweep_old_scope_decisions(session, batch_size=settings.URL_CACHE_SWEEP_BATCH)
+            return deleted
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.URL_CACHE_SWEEP_INTERVAL_SECONDS)
+            try:
+                deleted = await self.run_once()
+                if deleted:
+                    logger.info("url_cache_swept", extra={"deleted": deleted})
+            except Exception:
+                logger.warning("url_cache_sweep_failed", exc_info=True)
+
+
+url_cache_sweeper = UrlCacheSweeper()
@@ -0,0 +1,58 @@
+# app/services/url_fetch_lease.py
+from __future__ import annotations
+
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models import UrlFetchLease
+
+logger = logging.getLogger(__name__)
+
+# один держатель на процесс: внутри процесса загрузки уже схлопнуты single-flight в UrlAnalyzer
+LEASE_HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_fetch_lease(db_session: Any, url: str, *, ttl_seconds: float) -> bool:
+    """
+    Берёт аренду url (INSERT ... ON CONFLICT DO UPDATE только поверх истёкшей).
+    Упавший держатель не блокирует url дольше ttl_seconds.
+    Ошибка БД -> True: лучше лишняя загрузка, чем ожидание впустую.
+    """
+    now = datetime.utcnow()
+    stmt = insert(UrlFetchLease).values(url=url, holder=LEASE_HOLDER, expires_at=now + timedelta(seconds=ttl_seconds))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UrlFetchLease.url],
+        set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+        where=UrlFetchLease.expires_at < now,
+    ).returning(UrlFetchLease.holder)
+    try:
+        res = await db_session.execute(stmt)
+        acquired = res.first() is not None
+        await db_session.commit()
+        return acquired
+    except Exception:
+        logger.warning("url_fetch_lease_failed", extra={"url": url}, exc_info=True)
+        try:
+            await db_session.rollback()
+        except Exception:
+            pass
+        return True
+
+
+async def release_fetch_lease(db_session: Any, url: str) -> None:
+    try:
+        await db_session.execute(
+            delete(UrlFetchLease).where(UrlFetchLease.url == url, UrlFetchLease.holder == LEASE_HOLDER)
+        )
+        await db_session.commit()
+    except Exception:
+        try:
+            await db_session.rollback()
+        except Exception:
+            pass
@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_
 
 from app.config import settings
 from app.llm.openai_text import chat as openai_chat
 from app.agents.utils import safe_json_parse
+from app.models import UrlInsightCache
+from app.services.text_compress import compress_text
 
 URL_INSIGHTS_SYSTEM = """Ты — маркетинговый аналитик. 
-Тебе дают краткие извлечения из ссылок (url_summaries): заголовки, мета, CTA, кусок текста и предупреждения.
+Тебе дают краткое извлечение из одной страницы (url_summary): заголовки, мета, CTA, кусок текста и предупреждения.
 
 Если по Instagram стоит предупреждение platform_may_block_scraping или empty_main_text:
 - НЕ делай выводы о ЦА по контенту.
@@ -41,7 +49,7 @@ IG_INSIGHTS
 
 
 Задача:
-1) Для каждой ссылки сделать практичный маркетинговый разбор: оффер, ЦА, УТП, возражения, CTA, воронка, сильные/слабые места.
+1) Сделать практичный маркетинговый разбор страницы: оффер, ЦА, УТП, возражения, CTA, воронка, сильные/слабые места.
 2) Если данных недостаточно (например, social platform block) — явно указать, какие данные нужны, и сформировать короткие вопросы пользователю.
 3) Дать конкретные рекомендации по улучшению (в приоритете то, что даст быстрый рост конверсии/подписок).
 4) Не выдумывай факты. Если чего-то нет — пиши "недостаточно данных".
@@ -51,7 +59,7 @@ IG_INSIGHTS
 
 URL_INSIGHTS_SCHEMA = {
     "type": "json_schema",
-    "name": "url_insights",
+    "name": "url_page_insights",
     "strict": True,
     "schema": {
         "type": "object",
@@ -83,97 +91,365 @@ URL_INSIGHTS_SCHEMA = {
                     "risks_or_unknowns",
                 ],
             },
-            "per_url": {
-                "type": "array",
-                "items": {
-                    "type": "object",
-                    "additionalProperties": False,
-                    "properties": {
-                        "url": {"type": "string"},
-                        "page_type": {"type": "string"},
-                        "ok": {"type": "boolean"},
-                        "what_it_is": {"type": ["string", "null"]},
-                        "offer": {"type": ["string", "null"]},
-                        "cta_found": {"type": "array", "items": {"type": "string"}},
-                        "strengths": {"type": "array", "items": {"type": "string"}},
-                        "weaknesses": {"type": "array", "items": {"type": "string"}},
-                        "quick_wins": {"type": "array", "items": {"type": "string"}},
-                        "missing_data": {"type": "array", "items": {"type": "string"}},
-                        "warnings": {"type": "array", "items": {"type": "string"}},
-                    },
-                    "required": [
-                        "url",
-                        "page_type",
-                        "ok",
-                        "what_it_is",
-                        "offer",
-                        "cta_found",
-                        "strengths",
-                        "weaknesses",
-                        "quick_wins",
-                        "missing_data",
-                        "warnings",
-                    ],
+            "page": {
+                "type": "object",
+                "additionalProperties": False,
+                "properties": {
+                    "url": {"type": "string"},
+                    "page_type": {"type": "string"},
+                    "ok": {"type": "boolean"},
+                    "what_it_is": {"type": ["string", "null"]},
+                    "offer": {"type": ["string", "null"]},
+                    "cta_found": {"type": "array", "items": {"type": "string"}},
+                    "strengths": {"type": "array", "items": {"type": "string"}},
+                    "weaknesses": {"type": "array", "items": {"type": "string"}},
+                    "quick_wins": {"type": "array", "items": {"type": "string"}},
+                    "missing_data": {"type": "array", "items": {"type": "string"}},
+                    "warnings": {"type": "array", "items": {"type": "string"}},
                 },
+                "required": [
+                    "url",
+                    "page_type",
+                    "ok",
+                    "what_it_is",
+                    "offer",
+                    "cta_found",
+                    "strengths",
+                    "weaknesses",
+                    "quick_wins",
+                    "missing_data",
+                    "warnings",
+                ],
             },
             "questions_to_user": {"type": "array", "items": {"type": "string"}},
         },
-        "required": ["overall", "per_url", "questions_to_user"],
+        "required": ["overall", "page", "questions_to_user"],
     },
 }
 
 
-def _minimal_url_payload(url_summaries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for s in (url_summaries or [])[:3]:
-        if not isinstance(s, dict):
-            continue
+# Меняешь URL_INSIGHTS_SYSTEM / URL_INSIGHTS_SCHEMA — подними версию: старые записи кэша перестанут находиться.
+URL_INSIGHTS_PROMPT_VERSION = "page-v3"
+
+_OVERALL_LIST_FIELDS = ("key_pains", "key_benefits", "funnel_guess", "top_recommendations", "risks_or_unknowns")
+_OVERALL_TEXT_FIELDS = ("brand_guess", "niche_guess", "main_offer", "target_audience")
+
+
+def _minimal_page_payload(s: Dict[str, Any]) -> Dict[str, Any]:
+    tg_posts = (s.get("telegram_last_posts") or [])[:5]
+    tg_posts = [str(p)[:800] for p in tg_posts]
+
+    return {
+        "url": s.get("final_url") or s.get("url"),
+        "page_type": s.get("page_type"),
+        "ok": bool(s.get("ok")),
+        "title": s.get("title"),
+        "author_name": s.get("author_name"),
+        "handle": s.get("handle"),
+        "meta_description": s.get("meta_description"),
+        "h1": s.get("h1"),
+        "headings": s.get("headings"),
+        "cta_texts": s.get("cta_texts"),
+        "main_text_excerpt": compress_text(
+            s.get("main_text_excerpt") or "",
+            budget_tokens=settings.URL_INSIGHTS_EXCERPT_TOKENS,
+            focus=[s.get("title") or "", s.get("meta_description") or "", *(s.get("h1") or [])],
+        ),
+        "telegram_last_posts": tg_posts,
+        "warnings": s.get("warnings") or [],
+        "status_code": s.get("status_code"),
+    }
+
+
+def _prompt_version() -> str:
+    return f"{URL_INSIGHTS_PROMPT_VERSION}:{settings.DEFAULT_TEXT_MODEL_LIGHT}"
+
+
+def page_content_key(summary: Dict[str, Any]) -> str:
+    """
+    Ключ кэша разбора страницы: extracted_text_hash из UrlAnalyzer (content_hash),
+    а для сводок без него (ошибки, not_html) — хэш того, что уйдёт в промпт.
+    """
+    if summary.get("content_hash"):
+        return str(summary["content_hash"])
+    payload = json.dumps(_minimal_page_payload(summary), ensure_ascii=False, sort_keys=True)
+    return "p:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _PageInsightsLRU:
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        hit = self._entries.get(key)
+        if hit is not None:
+            self._entries.move_to_end(key)
+        return hit
+
+    def set(self, key: Tuple[str, str], value: Dict[str, Any]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_page_insights_memory = _PageInsightsLRU(max_entries=2048)
+
+
+async def _analyze_page(summary: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Разбор одной страницы без сообщения пользователя — результат общий для всех."""
+    messages = [
+        {"role": "system", "content": URL_INSIGHTS_SYSTEM},
+        {
+            "role": "user",
+            "content": "INPUT_JSON:\n" + json.dumps({"url_summary": _minimal_page_payload(summary)}, ensure_ascii=False),
+        },
+    ]
+
+    content, _usage = await openai_chat(
+        messages=messages,
+        model=settings.DEFAULT_TEXT_MODEL_LIGHT,
+        temperature=None,
+        response_format=URL_INSIGHTS_SCHEMA,
+        task="url_insights_json",
+    )
+
+    data = safe_json_parse(content)
+    if isinstance(data, dict) and isinstance(data.get("page"), dict):
+        return data
+    return None
+
+
+async def _load_cached(db_session: Any, keys: List[str], version: str) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for key in keys:
+        hit = _page_insights_memory.get((key, version))
+        if hit is not None:
+            out[key] = hit
 
-        tg_posts = (s.get("telegram_last_posts") or [])[:5]
-        tg_posts = [str(p)[:800] for p in tg_posts]
-
-        out.append(
-            {
-                "url": s.get("final_url") or s.get("url"),
-                "page_type": s.get("page_type"),
-                "ok": bool(s.get("ok")),
-                "title": s.get("title"),
-                "meta_description": s.get("meta_description"),
-                "h1": s.get("h1"),
-                "headings": s.get("headings"),
-                "cta_texts": s.get("cta_texts"),
-                "main_text_excerpt": (s.get("main_text_excerpt") or "")[:2500],
-                "telegram_last_posts": tg_posts,
-                "warnings": s.get("warnings") or [],
-                "status_code": s.get("status_code"),
-            }
+    missing = [k for k in keys if k not in out]
+    if db_session is None or not missing:
+        return out
+
+    try:
+        res = await db_session.execute(
+            select(UrlInsightCache).where(
+                UrlInsightCache.prompt_version == version,
+                UrlInsightCache.content_hash.in_(set(missing)),
+            )
         )
+        rows = res.scalars().all()
+    except Exception:
+        return out
+
+    for row in rows:
+        if isinstance(row.insight_json, dict):
+            out[row.content_hash] = row.insight_json
+            _page_insights_memory.set((row.content_hash, version), row.insight_json)
     return out
 
 
+async def _store(db_session: Any, fresh: Dict[str, Dict[str, Any]], version: str) -> None:
+    for key, value in fresh.items():
+        _page_insights_memory.set((key, version), value)
+    if db_session is None or not fresh:
+        return
+    try:
+        for key, value in fresh.items():
+            await db_session.merge(UrlInsightCache(content_hash=key, prompt_version=version, insight_json=value))
+        await db_session.commit()
+    except Exception:
+        try:
+            await db_session.rollback()
+        except Exception:
+            pass
+
+
+async def sweep_old_url_insights(db_session: Any, *, batch_size: int = 500, max_batches: int = 20) -> int:
+    """
+    Удаляет разборы из url_insight_cache старше URL_INSIGHTS_CACHE_TTL_DAYS пачками по batch_size:
+    иначе таблица растёт с каждым новым хэшем страницы и каждой версией промпта.
+    """
+    if settings.URL_INSIGHTS_CACHE_TTL_DAYS <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=settings.URL_INSIGHTS_CACHE_TTL_DAYS)
+    total = 0
+    for _ in range(max_batches):
+        old = (
+            select(UrlInsightCache.content_hash, UrlInsightCache.prompt_version)
+            .where(UrlInsightCache.created_at < cutoff)
+            .limit(batch_size)
+        )
+        res = await db_session.execute(
+            delete(UrlInsightCache).where(tuple_(UrlInsightCache.content_hash, UrlInsightCache.prompt_version).in_(old))
+        )
+        await db_session.commit()
+        deleted = int(res.rowcount or 0)
+        total += deleted
+        if deleted < batch_size:
+            break
+    return total
+
+
+def _merge_overall(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    overall: Dict[str, Any] = {}
+    for field in _OVERALL_TEXT_FIELDS:
+        overall[field] = next(
+            (p["overall"].get(field) for p in pages if (p.get("overall") or {}).get(field)),
+            None,
+        )
+    for field in _OVERALL_LIST_FIELDS:
+        seen: List[str] = []
+        for p in pages:
+            for item in (p.get("overall") or {}).get(field) or []:
+                if item not in seen:
+                    seen.append(item)
+        overall[field] = seen[:8]
+    return overall
+
+
 async def build_url_insights(
     user_message: str,
     url_summaries: Optional[List[Dict[str, Any]]],
+    *,
+    db_session: Any = None,
 ) -> Optional[Dict[str, Any]]:
+    """
+    Инсайты по ссылкам в прежнем формате {overall, per_url, questions_to_user}.
+
+    Дорогой LLM-разбор делается по каждой странице отдельно и без user_message,
+    кэшируется по (extracted_text_hash, версия промпта) — в памяти процесса и в
+    таблице url_insight_cache, общей для всех пользователей. Вопрос пользователя
+    (user_message) со страницей соединяет уже основной ответ ассистента.
+    """
     if not isinstance(url_summaries, list) or not url_summaries:
         return None
 
-    payload = {
-        "user_message": user_message,
-        "url_summaries": _minimal_url_payload(url_summaries),
+    # заглушки ещё не догруженных страниц (deadline в UrlAnalyzer) не разбираем
+    summaries = [s for s in url_summaries[:3] if isinstance(s, dict) and not s.get("pending")]
+    if not summaries:
+        return None
+
+    version = _prompt_version()
+    keys = [page_content_key(s) for s in summaries]
+    cached = await _load_cached(db_session, keys, version)
+
+    todo = {k: s for k, s in zip(keys, summaries) if k not in cached}
+    results = await asyncio.gather(*(_analyze_page(s) for s in todo.values()), return_exceptions=True)
+    fresh = {k: r for k, r in zip(todo.keys(), results) if isinstance(r, dict)}
+    await _store(db_session, fresh, version)
+
+    pages: List[Dict[str, Any]] = []
+    for key, summary in zip(keys, summaries):
+        page = cached.get(key) or fresh.get(key)
+        if page:
+            # тот же контент мог прийти по другому адресу (utm, редирект) — url берём из текущей сводки
+            url = summary.get("final_url") or summary.get("url")
+            pages.append(dict(page, page=dict(page["page"], url=url or page["page"].get("url"))))
+    if not pages:
+        return None
+
+    questions: List[str] = []
+    for p in pages:
+        for q in p.get("questions_to_user") or []:
+            if q not in questions:
+                questions.append(q)
+
+    return {
+        "overall": _merge_overall(pages),
+        "per_url": [p["page"] for p in pages],
+        "questions_to_user": questions,
     }
 
+
+COMPETITOR_DIGEST_SYSTEM = """Ты — маркетинговый аналитик. 
+Тебе дают разборы страниц конкурентов (competitors): оффер, ЦА, выгоды, CTA, сильные и слабые стороны.
+
+Задача — сводка по рынку:
+1) Коротко: кто эти конкуренты и как они продают (market_summary).
+2) Что делают почти все (common_patterns).
+3) Чем отдельные игроки выделяются — с указанием url (differentiators).
+4) Какие ниши/возражения/форматы никто не закрывает (gaps_and_opportunities).
+5) Что сделать клиенту, чтобы выделиться (recommendations) — конкретно и по приоритету.
+Не выдумывай факты. Страницы без данных (ok=false, platform_may_block_scraping) не анализируй, а перечисли в risks_or_unknowns.
+
+Вывод строго JSON (без markdown, без пояснений).
+"""
+
+_STR_LIST = {"type": "array", "items": {"type": "string"}}
+
+COMPETITOR_DIGEST_SCHEMA = {
+    "type": "json_schema",
+    "name": "competitor_digest",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "market_summary": {"type": "string"},
+            "common_patterns": _STR_LIST,
+            "differentiators": _STR_LIST,
+            "gaps_and_opportunities": _STR_LIST,
+            "recommendations": _STR_LIST,
+            "risks_or_unknowns": _STR_LIST,
+        },
+        "required": [
+            "market_summary",
+            "common_patterns",
+            "differentiators",
+            "gaps_and_opportunities",
+            "recommendations",
+            "risks_or_unknowns",
+        ],
+    },
+}
+
+
+async def build_competitor_digest(insights: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Сводка по рынку поверх уже посчитанных разборов страниц (build_url_insights на каждый URL):
+    на вход идут компактные overall/per_url, а не тексты страниц — вызов дешёвый.
+    """
+    competitors: List[Dict[str, Any]] = []
+    for item in insights:
+        if not isinstance(item, dict):
+            continue
+        overall = item.get("overall") or {}
+        for page in item.get("per_url") or []:
+            competitors.append(
+                {
+                    "url": page.get("url"),
+                    "page_type": page.get("page_type"),
+                    "ok": page.get("ok"),
+                    "brand": overall.get("brand_guess"),
+                    "niche": overall.get("niche_guess"),
+                    "offer": page.get("offer") or overall.get("main_offer"),
+                    "target_audience": overall.get("target_audience"),
+                    "key_benefits": overall.get("key_benefits") or [],
+                    "cta_found": page.get("cta_found") or [],
+                    "strengths": page.get("strengths") or [],
+                    "weaknesses": page.get("weaknesses") or [],
+                    "warnings": page.get("warnings") or [],
+                }
+            )
+    if not competitors:
+        return None
+
     messages = [
-        {"role": "system", "content": URL_INSIGHTS_SYSTEM},
-        {"role": "user", "content": "INPUT_JSON:\n" + json.dumps(payload, ensure_ascii=False)},
+        {"role": "system", "content": COMPETITOR_DIGEST_SYSTEM},
+        {"role": "user", "content": "INPUT_JSON:\n" + json.dumps({"competitors": competitors}, ensure_ascii=False)},
     ]
 
     content, _usage = await openai_chat(
         messages=messages,
         model=settings.DEFAULT_TEXT_MODEL_LIGHT,
         temperature=None,
-        response_format=URL_INSIGHTS_SCHEMA,
-        task="url_insights_json",
+        response_format=COMPETITOR_DIGEST_SCHEMA,
+        task="analysis",
     )
 
     data = safe_json_parse(content)
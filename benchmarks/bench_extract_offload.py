@@ -0,0 +1,66 @@
+"""
+Лаг event loop при разборе больших страниц: inline против пула процессов.
+
+Пока идут N параллельных разборов, LoopLagMonitor каждые 5 мс меряет,
+насколько поздно просыпается loop — так выглядят задержки остальных
+запросов воркера, пока UrlAnalyzer разбирает чужой лендинг.
+
+Запуск:
+    python -m benchmarks.bench_extract_offload
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.config import settings
+from app.services.cpu_pool import run_cpu_bound, shutdown_cpu_pool
+from app.services.loop_monitor import LoopLagMonitor
+from app.services.page_extract import extract_page
+
+CONCURRENCY = 8
+
+
+def synthetic_landing(sections: int = 1500) -> str:
+    block = (
+        "<section><h2>Доставка свежеобжаренного кофе</h2>"
+        "<p>Обжариваем зерно каждый понедельник и отправляем в день обжарки по всей России.</p>"
+        "<a class='btn' href='/shop'>Купить набор</a><button>Подписаться на рассылку</button>"
+        "<script>window.dataLayer.push({event: 'view'});</script>"
+        "<svg><path d='M0 0L10 10'/></svg></section>"
+    )
+    return (
+        "<html><head><title>Coffee Lab</title>"
+        "<meta name='description' content='Спешелти кофе с доставкой'>"
+        "<meta property='og:title' content='Coffee Lab'></head><body><h1>Coffee Lab</h1>"
+        + block * sections
+        + "</body></html>"
+    )
+
+
+async def run(html: str, *, inline: bool) -> dict:
+    monitor = LoopLagMonitor(interval=0.005, window=100_000)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(run_cpu_bound(extract_page, html, "website", inline=inline) for _ in range(CONCURRENCY)))
+    wall = time.perf_counter() - started
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    return {"wall_ms": round(wall * 1000, 1), **monitor.stats()}
+
+
+async def main() -> None:
+    html = synthetic_landing()
+    print(f"page: {len(html) / 1e6:.2f} MB, concurrency: {CONCURRENCY}, pool workers: {settings.CPU_POOL_WORKERS}")
+
+    # прогрев пула: spawn + импорт модулей не должен попасть в замер
+    await run_cpu_bound(extract_page, "<html></html>", "website")
+
+    for label, inline in (("inline (event loop)", True), ("process pool", False)):
+        print(f"{label:22s}", await run(html, inline=inline))
+    shutdown_cpu_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
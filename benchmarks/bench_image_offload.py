@@ -0,0 +1,78 @@
+"""
+Обработка картинок: inline в event loop против пула процессов "images".
+
+N параллельных “template”-вариантов: compose_image — ресайз фона 1536x1024 под пресет
+(LANCZOS), рендер текста и PNG-кодирование одним вызовом. LoopLagMonitor каждые 5 мс меряет,
+насколько поздно просыпается loop — так выглядит задержка остальных ходов чата,
+пока воркер готовит картинку. Печатает images/s и лаг loop (p50/p95/max).
+
+Запуск:
+    python -m benchmarks.bench_image_offload [--images 12]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import random
+import time
+
+from PIL import Image
+
+from app.config import settings
+from app.images.processing import compose_image
+from app.services.cpu_pool import run_cpu_bound, shutdown_cpu_pool
+from app.services.loop_monitor import LoopLagMonitor
+
+TARGET_SIZE = (1280, 720)
+OVERLAY = {"headline": "Свежая обжарка каждый понедельник", "subtitle": "Доставка за 2 дня", "cta": "Заказать"}
+
+
+def synthetic_background(size=(1536, 1024), seed: int = 7) -> bytes:
+    """Градиент с шумом: сжимается в PNG примерно как сгенерированная картинка, а не как заливка."""
+    rnd = random.Random(seed)
+    w, h = size
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    noise = Image.frombytes("RGB", (w // 4, h // 4), bytes(rnd.getrandbits(8) for _ in range(w // 4 * h // 4 * 3)))
+    img = Image.blend(img, noise.resize(size), 0.35)
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+async def _one(bg: bytes, *, inline: bool) -> bytes:
+    return await run_cpu_bound(
+        compose_image, bg, TARGET_SIZE, overlay=OVERLAY, layout="bottom", palette=["#FFFFFF"], inline=inline, pool="images"
+    )
+
+
+async def run(bg: bytes, images: int, *, inline: bool) -> dict:
+    monitor = LoopLagMonitor(interval=0.005, window=100_000)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(bg, inline=inline) for _ in range(images)))
+    wall = time.perf_counter() - started
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    return {"images_per_s": round(images / wall, 2), "wall_ms": round(wall * 1000, 1), **monitor.stats()}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=12)
+    args = parser.parse_args()
+
+    bg = synthetic_background()
+    print(f"background: {len(bg) / 1e6:.2f} MB PNG, images: {args.images}, pool workers: {settings.IMAGE_POOL_WORKERS}")
+
+    # прогрев пула: spawn + импорт PIL не должен попасть в замер
+    await asyncio.gather(*(_one(bg, inline=False) for _ in range(max(1, settings.IMAGE_POOL_WORKERS))))
+
+    for label, inline in (("inline (event loop)", True), ("process pool", False)):
+        print(f"{label:22s}", await run(bg, args.images, inline=inline))
+    shutdown_cpu_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Template-картинка: прежний конвейер на байтах против compose_image (объекты PIL, одно кодирование).
+
+Прежний путь (до compose_image): decode -> convert RGB -> resize -> crop -> PNG,
+затем decode -> RGBA -> текст -> RGB -> PNG — три декодирования и два PNG-кодирования.
+Новый: decode -> cover (resize по box) -> текст -> PNG.
+
+Каждый вариант гоняется в отдельном свежем процессе: пиковый RSS (ru_maxrss) не смешивается
+между замерами. Печатает CPU-время на картинку (p50/p95), размер PNG и прирост пикового RSS
+относительно процесса с уже импортированным PIL.
+
+Запуск:
+    python -m benchmarks.bench_image_pipeline [--images 10]
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image
+
+from app.images.processing import compose_image, decode_image
+from app.images.template_renderer import TemplateRenderer
+from benchmarks.bench_image_offload import OVERLAY, TARGET_SIZE, synthetic_background
+
+
+def legacy_template(bg: bytes) -> bytes:
+    """Прежние _resize_cover + TemplateRenderer.render, повторены здесь один в один."""
+    tw, th = TARGET_SIZE
+    img = Image.open(io.BytesIO(bg)).convert("RGB")
+    w, h = img.size
+    scale = max(tw / w, th / h)
+    nw, nh = int(w * scale), int(h * scale)
+    img = img.resize((nw, nh), Image.LANCZOS)
+    left, top = max((nw - tw) // 2, 0), max((nh - th) // 2, 0)
+    img = img.crop((left, top, left + tw, top + th))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+
+    img = Image.open(io.BytesIO(out.getvalue())).convert("RGBA")
+    TemplateRenderer().draw_on(img, OVERLAY, "bottom", ["#FFFFFF"])
+    out = io.BytesIO()
+    img.convert("RGB").save(out, format="PNG")
+    return out.getvalue()
+
+
+def _worker(mode: str, images: int, compress_level: Optional[int]) -> dict:
+    bg = synthetic_background()
+    # прогрев на маленькой картинке: кодеки и шрифты не должны попасть в замер,
+    # а в базовый пик RSS не попадал полноразмерный декодированный фон
+    decode_image(synthetic_background((64, 64))).load()
+    TemplateRenderer()._load_font(32, bold=True)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times, size = [], 0
+    for _ in range(images):
+        started = time.process_time()
+        if mode == "legacy":
+            out = legacy_template(bg)
+        else:
+            out = compose_image(
+                bg, TARGET_SIZE, overlay=OVERLAY, layout="bottom", palette=["#FFFFFF"], compress_level=compress_level
+            )
+        times.append((time.process_time() - started) * 1000)
+        size = len(out)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "cpu_p50_ms": round(statistics.median(times), 1),
+        "cpu_p95_ms": round(sorted(times)[min(len(times) - 1, int(0.95 * len(times)))], 1),
+        "png_kb": round(size / 1024, 1),
+        "peak_rss_delta_mb": round((peak - baseline) / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [("legacy (2 encodes)", "legacy", None)] + [
+        (f"compose_image level={level}", "compose", level) for level in (1, 3, 6, 9)
+    ]
+    ctx = multiprocessing.get_context("spawn")
+    print(f"template {TARGET_SIZE[0]}x{TARGET_SIZE[1]} from 1536x1024, {args.images} images per run")
+    for label, mode, level in runs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            print(f"{label:26s}", pool.submit(_worker, mode, args.images, level).result())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Микробенчмарк разбора входящего сообщения.
+
+Сравнивает старую схему (каждый модуль сам делает lower() + any(k in t ...),
+extract_urls три раза) с однопроходным extract_message_features.
+
+Запуск:
+    python -m benchmarks.bench_message_features
+"""
+from __future__ import annotations
+
+import timeit
+
+from app.services.message_features import (
+    IMAGE_REQUEST_KEYWORDS,
+    INTENT_KEYWORDS,
+    MARKETING_KEYWORDS,
+    OFFTOPIC_KEYWORDS,
+    STRATEGY_KEYWORDS,
+    extract_message_features,
+)
+from app.services.url_analyzer import IG_MARKERS, TG_MARKERS, extract_urls
+
+IG_INSIGHTS_DUMP = """IG_INSIGHTS
+@аккаунт: @coffee.lab
+цель: продажи
+ниша/продукт: спешелти кофе, зерно и дрип-пакеты
+гео: Москва, СПб
+язык: русский
+
+подписчики: 12 400
+ср.охват поста: 1 900
+ср.охват рилс: 7 300
+
+аудитория (если есть): 68% женщины
+возраст топ-3: 25-34, 18-24, 35-44
+топ-гео: Москва, Санкт-Петербург, Казань
+
+топ-5 контента (тема — охват — сохранения — комментарии):
+1) как заварить в турке — 21 000 — 940 — 55
+2) обзор зерна месяца — 9 800 — 310 — 12
+3) бариста отвечает на вопросы — 8 100 — 120 — 64
+4) распаковка дрип-пакетов — 6 900 — 80 — 9
+5) коллаб с кондитерской — 6 200 — 75 — 21
+
+ссылки/воронка: taplink -> сайт https://coffee-lab.example/shop -> корзина
+средний чек: 1 850 ₽
+"""
+
+SHORT_MESSAGE = "Сделай стратегию продвижения для кофейни в инсте"
+
+
+def legacy_scan(text: str) -> tuple:
+    # scope_guard
+    t = (text or "").lower()
+    marketing = bool(extract_urls(t)) or any(k in t for k in MARKETING_KEYWORDS)
+    offtopic = any(k in t for k in OFFTOPIC_KEYWORDS)
+    t2 = (text or "").lower()
+    marketing = marketing or bool(extract_urls(t2)) or any(k in t2 for k in MARKETING_KEYWORDS)
+    # url_analyzer.extract_targets
+    urls = extract_urls(text)
+    ctx = text.lower()
+    prefer_ig = any(x in ctx for x in IG_MARKERS)
+    prefer_tg = any(x in ctx for x in TG_MARKERS)
+    # strategy_template.is_strategy_like
+    strategy = any(k in text.lower() for k in STRATEGY_KEYWORDS)
+    # chat_router: extract_urls + detect_intent + wants_image
+    has_urls = bool(extract_urls(text))
+    lowered = text.lower()
+    intent = "other"
+    for name, words in INTENT_KEYWORDS.items():
+        if any(w in lowered for w in words):
+            intent = name
+            break
+    txt = text.lower()
+    wants_image = any(k in txt for k in IMAGE_REQUEST_KEYWORDS)
+    return marketing, offtopic, urls, prefer_ig, prefer_tg, strategy, has_urls, intent, wants_image
+
+
+def single_pass(text: str) -> tuple:
+    f = extract_message_features(text)
+    return (
+        f.looks_like_marketing,
+        f.looks_strongly_offtopic,
+        list(f.urls),
+        f.prefer_ig,
+        f.prefer_tg,
+        f.strategy_like,
+        f.has_urls,
+        f.intent,
+        f.wants_image,
+    )
+
+
+def _bench(name: str, text: str, number: int) -> None:
+    assert legacy_scan(text) == single_pass(text), name
+    legacy = min(timeit.repeat(lambda: legacy_scan(text), number=number, repeat=5)) / number
+    fast = min(timeit.repeat(lambda: single_pass(text), number=number, repeat=5)) / number
+    print(
+        f"{name:<22} chars={len(text):>6}  legacy={legacy * 1e6:9.1f}us  "
+        f"single_pass={fast * 1e6:9.1f}us  x{legacy / fast:4.1f}"
+    )
+
+
+def main() -> None:
+    _bench("short", SHORT_MESSAGE, 5000)
+    _bench("ig_insights", IG_INSIGHTS_DUMP, 1000)
+    _bench("ig_insights x10", IG_INSIGHTS_DUMP * 10, 200)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Бенчмарк извлечения сводки из HTML на сохранённом корпусе (benchmarks/corpus/*.html).
+
+Сравнивает прежний extract_page (css_first на каждый meta, css("h1"), css("h2"),
+css("a,button"), decompose шума, body.text()) с однопроходным extract_page
+и проверяет, что результаты совпадают.
+
+Запуск:
+    python -m benchmarks.bench_page_extract [--repeat 50]
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+from pathlib import Path
+from typing import Any, Dict, List
+
+from selectolax.parser import HTMLParser
+
+from app.services.page_extract import CTA_KEYWORDS, EXCERPT_BUDGET_CHARS, excerpt_lines, extract_page
+from app.services.url_analyzer import _sniff_encoding
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+
+
+def legacy_extract_page(html: str, page_type: str) -> Dict[str, Any]:
+    """Прежний extract_page: отдельный проход по DOM на каждый селектор."""
+    parsed = HTMLParser(html)
+
+    def _meta_name(name: str) -> str:
+        n = parsed.css_first(f'meta[name="{name}"]')
+        if n and n.attributes.get("content"):
+            return n.attributes["content"].strip()
+        return ""
+
+    def _meta_prop(prop: str) -> str:
+        n = parsed.css_first(f'meta[property="{prop}"]')
+        if n and n.attributes.get("content"):
+            return n.attributes["content"].strip()
+        return ""
+
+    title = (parsed.css_first("title").text(strip=True) if parsed.css_first("title") else "")
+    meta_desc = _meta_name("description")
+
+    og = {
+        "title": _meta_prop("og:title"),
+        "description": _meta_prop("og:description"),
+        "image": _meta_prop("og:image"),
+        "type": _meta_prop("og:type"),
+        "site_name": _meta_prop("og:site_name"),
+        "url": _meta_prop("og:url"),
+    }
+
+    h1 = [n.text(strip=True) for n in parsed.css("h1")][:3]
+    headings = [n.text(strip=True) for n in parsed.css("h2")][:10]
+
+    # CTA texts: buttons/links
+    ctas: List[str] = []
+    for n in parsed.css("a,button"):
+        t = (n.text(strip=True) or "").strip()
+        if 0 < len(t) <= 50:
+            if any(k in t.lower() for k in CTA_KEYWORDS):
+                ctas.append(t)
+
+    seen = set()
+    cta_texts: List[str] = []
+    for x in ctas:
+        if x not in seen:
+            seen.add(x)
+            cta_texts.append(x)
+    cta_texts = cta_texts[:10]
+
+    # Remove noise
+    for bad in parsed.css("script,style,noscript,svg"):
+        bad.decompose()
+
+    # Telegram pages: last post snippets, newest first (preview lists posts oldest to newest)
+    tg_posts: List[str] = []
+    if page_type == "telegram":
+        for n in parsed.css(".tgme_widget_message_text"):
+            t = (n.text(separator="\n", strip=True) or "").strip()
+            if t:
+                tg_posts.append(t[:500])
+        tg_posts = tg_posts[-5:][::-1]
+
+    body = parsed.css_first("body")
+    raw_text = body.text(separator="\n", strip=True) if body else parsed.text(separator="\n", strip=True)
+    main_text_excerpt = "\n".join(excerpt_lines(raw_text))[:EXCERPT_BUDGET_CHARS]
+
+    return {
+        "title": title,
+        "meta_description": meta_desc,
+        "og": og,
+        "h1": h1,
+        "headings": headings,
+        "cta_texts": cta_texts,
+        "main_text_excerpt": main_text_excerpt,
+        "telegram_last_posts": tg_posts,
+    }
+
+
+def decode_page(raw: bytes) -> str:
+    """Как UrlAnalyzer: кодировка из <meta charset>, иначе utf-8."""
+    return raw.decode(_sniff_encoding(None, raw[:4096]), errors="replace")
+
+
+def load_corpus(path: Path = CORPUS_DIR) -> Dict[str, str]:
+    return {p.name: decode_page(p.read_bytes()) for p in sorted(path.glob("*.html"))}
+
+
+def page_type_for(name: str) -> str:
+    for page_type in ("telegram", "instagram"):
+        if page_type in name:
+            return page_type
+    return "website"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    if not corpus:
+        raise SystemExit(f"no *.html in {CORPUS_DIR}")
+
+    total_old = total_new = 0.0
+    for name, html in corpus.items():
+        page_type = page_type_for(name)
+        old = legacy_extract_page(html, page_type)
+        new = extract_page(html, page_type)
+        diff = sorted(k for k in old if old[k] != new[k])
+
+        t_old = timeit.timeit(lambda: legacy_extract_page(html, page_type), number=args.repeat) / args.repeat
+        t_new = timeit.timeit(lambda: extract_page(html, page_type), number=args.repeat) / args.repeat
+        total_old += t_old
+        total_new += t_new
+        print(
+            f"{name:24s} {len(html) / 1024:6.1f} KB  legacy {t_old * 1000:6.2f} ms  "
+            f"single-pass {t_new * 1000:6.2f} ms  x{t_old / t_new:4.2f}  diff={diff or '-'}"
+        )
+
+    print(f"{'total':24s} {'':9s} legacy {total_old * 1000:6.2f} ms  single-pass {total_new * 1000:6.2f} ms  x{total_old / total_new:4.2f}")
+
+
+if __name__ == "__main__":
+    main()
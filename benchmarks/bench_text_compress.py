@@ -0,0 +1,58 @@
+"""
+Сколько текста страницы уходит в промпт разбора (build_url_insights):
+прежние первые 2500 символов main_text_excerpt против compress_text
+(boilerplate + TextRank в пределах URL_INSIGHTS_EXCERPT_TOKENS).
+
+Печатает размер в токенах (оценка approx_tokens), время сжатия и первые
+строки результата — чтобы глазами проверить, что меню и cookie ушли.
+
+Запуск:
+    python -m benchmarks.bench_text_compress [--repeat 20]
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from app.config import settings
+from app.services.page_extract import extract_page
+from app.services.text_compress import BoilerplateIndex, approx_tokens, compress_text
+from benchmarks.bench_page_extract import load_corpus, page_type_for
+
+LEGACY_EXCERPT_CHARS = 2500
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = {name: extract_page(html, page_type_for(name)) for name, html in load_corpus().items()}
+    index = BoilerplateIndex(min_pages=2)
+    for name, page in pages.items():
+        index.observe(name, page["main_text_excerpt"].splitlines())
+
+    total_old = total_new = 0
+    for name, page in pages.items():
+        excerpt = page["main_text_excerpt"]
+        focus = [page["title"], page["meta_description"], *page["h1"]]
+
+        def run() -> str:
+            return compress_text(
+                excerpt, budget_tokens=settings.URL_INSIGHTS_EXCERPT_TOKENS, focus=focus, boilerplate=index
+            )
+
+        compressed = run()
+        took = timeit.timeit(run, number=args.repeat) / args.repeat
+        old, new = approx_tokens(excerpt[:LEGACY_EXCERPT_CHARS]), approx_tokens(compressed)
+        total_old += old
+        total_new += new
+        print(f"{name:26s} tokens {old:5d} -> {new:5d}  compress {took * 1000:6.2f} ms")
+        for line in compressed.splitlines()[:3]:
+            print(f"    | {line[:110]}")
+
+    print(f"{'total':26s} tokens {total_old:5d} -> {total_new:5d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Пропускная способность конвейера ссылок на корпусе benchmarks/corpus/*.html.
+
+Три замера:
+- extract_targets + normalize_url на наборе сообщений (ссылки, @handle, “инст …”);
+- extract_page на каждой странице корпуса — p50/p95 времени разбора;
+- полный UrlAnalyzer._fetch_and_summarize против локального HTTP-сервера,
+  который раздаёт корпус (чтение потоком, кодировка, разбор, сводка) — pages/s и p95.
+В конце — пиковый RSS процесса и воркеров пула.
+
+Огромная страница не хранится в репозитории: её собирает huge_page() из лендинга
+корпуса (больше URL_FETCH_MAX_BYTES — без ранней остановки чтения упёрлась бы в лимит байт).
+
+Запуск:
+    python -m benchmarks.bench_url_pipeline [--repeat 20] [--concurrency 8]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import resource
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from app.config import settings
+from app.services.cpu_pool import run_cpu_bound, shutdown_cpu_pool
+from app.services.crawler import CrawlerClient
+from app.services.page_extract import extract_page
+from app.services.url_analyzer import InMemoryUrlCacheStore, UrlAnalyzer, extract_targets, normalize_url
+from benchmarks.bench_page_extract import CORPUS_DIR, load_corpus, page_type_for
+
+HUGE_PAGE_NAME = "huge_landing.html"
+
+MESSAGES = [
+    "Разбери, пожалуйста, лендинг https://smm-school.example/courses/target/?utm_source=tg#price",
+    "вот наш канал @coffee_lab_news и инст coffee.lab — что улучшить?",
+    "Сравни https://t.me/s/coffee_lab_news/ и https://www.instagram.com/coffee.lab/?igshid=abc",
+    "Привет! Хочу больше подписчиков, с чего начать?",
+    "сайт конкурента: https://shop.example/catalog/ , их тг t.me/competitor_shop и vk.com/competitor",
+    "глянь https://youtu.be/dQw4w9WgXcQ?t=42 — так можно сделать рилс?",
+]
+
+
+def huge_page(corpus: Dict[str, str], target_bytes: int = 3_000_000) -> str:
+    """Лендинг корпуса, у которого секции <main> повторены до target_bytes."""
+    html = corpus["landing_course.html"]
+    start, end = html.index("<main>") + len("<main>"), html.index("</main>")
+    body = html[start:end]
+    repeats = max(1, target_bytes // max(1, len(body.encode("utf-8"))))
+    return html[:start] + body * repeats + html[end:]
+
+
+def _declared_charset(raw: bytes) -> str:
+    m = re.search(rb"charset=[\"']?([\w-]+)", raw[:2048], re.IGNORECASE)
+    return m.group(1).decode("ascii").lower() if m else "utf-8"
+
+
+def serve_corpus(pages: Dict[str, bytes]) -> Tuple[ThreadingHTTPServer, str]:
+    """Локальный сервер: /<name> -> байты страницы; charset в заголовке не отдаём, как многие сайты."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            body = pages.get(self.path.lstrip("/"))
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ранняя остановка чтения в _read_html
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _pct(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench_targets(repeat: int) -> None:
+    n = repeat * 500
+    started = time.perf_counter()
+    for i in range(n):
+        for u in extract_targets(MESSAGES[i % len(MESSAGES)]):
+            normalize_url(u)
+    elapsed = time.perf_counter() - started
+    print(f"extract_targets+normalize_url  {n / elapsed:10.0f} msg/s")
+
+
+def bench_parse(corpus: Dict[str, str], repeat: int) -> None:
+    print("extract_page (in-process):")
+    for name, html in corpus.items():
+        page_type = page_type_for(name)
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            extract_page(html, page_type)
+            times.append((time.perf_counter() - started) * 1000)
+        print(
+            f"  {name:26s} {len(html) / 1024:8.1f} KB  "
+            f"p50 {statistics.median(times):7.2f} ms  p95 {_pct(times, 0.95):7.2f} ms"
+        )
+
+
+async def bench_fetch(base_url: str, names: List[str], repeat: int, concurrency: int) -> None:
+    client = CrawlerClient()
+    analyzer = UrlAnalyzer(None, client, InMemoryUrlCacheStore(max_entries=16))
+    sem = asyncio.Semaphore(concurrency)
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    warnings: Dict[str, List[str]] = {}
+
+    async def one(name: str) -> None:
+        async with sem:
+            started = time.perf_counter()
+            summary = await analyzer._fetch_and_summarize(f"{base_url}/{name}", use_cache=False)
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            warnings[name] = summary.get("warnings") or []
+
+    # прогрев: соединения и пул процессов не должны попасть в замер
+    await asyncio.gather(*(one(name) for name in names))
+    for values in latencies.values():
+        values.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(name) for _ in range(repeat) for name in names))
+    wall = time.perf_counter() - started
+    await client.aclose()
+
+    total = repeat * len(names)
+    print(f"_fetch_and_summarize (local HTTP, concurrency {concurrency}): {total / wall:.1f} pages/s")
+    for name in names:
+        values = latencies[name]
+        print(
+            f"  {name:26s} p50 {statistics.median(values):7.2f} ms  p95 {_pct(values, 0.95):7.2f} ms  "
+            f"warnings={warnings[name] or '-'}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    raw = {p.name: p.read_bytes() for p in sorted(CORPUS_DIR.glob("*.html"))}
+    if not raw:
+        raise SystemExit(f"no *.html in {CORPUS_DIR}")
+    corpus = load_corpus()
+    corpus[HUGE_PAGE_NAME] = huge_page(corpus)
+    raw[HUGE_PAGE_NAME] = corpus[HUGE_PAGE_NAME].encode("utf-8")
+
+    print(
+        f"corpus: {len(raw)} pages ({', '.join(f'{n}={_declared_charset(b)}' for n, b in raw.items())}), "
+        f"max bytes {settings.URL_FETCH_MAX_BYTES}, pool workers {settings.CPU_POOL_WORKERS}"
+    )
+    bench_targets(args.repeat)
+    bench_parse(corpus, args.repeat)
+
+    server, base_url = serve_corpus(raw)
+    try:
+        asyncio.run(bench_fetch(base_url, list(raw), args.repeat, args.concurrency))
+    finally:
+        server.shutdown()
+        shutdown_cpu_pool()
+
+    # ru_maxrss в Linux — КБ; RUSAGE_CHILDREN учитывает уже завершённые воркеры пула
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"peak RSS: process {own:.1f} MB, largest pool worker {children:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,7 +37,8 @@ def _actions_keyboard(user_id: int, actions: Any):
         text = (action.get("text") or "").strip()
         if not text:
             continue
-        key = _make_action_key(user_id, text)
+        # id от бэкенда -> кнопка идёт в /chat/action (быстрый путь без повторного пайплайна)
+        key = str(action.get("id") or "") or _make_action_key(user_id, text)
         store[key] = text
         kb.button(text=text[:30], callback_data=f"action:{key}")
 
@@ -246,16 +247,50 @@ async def _long_request_indicator(status_msg: types.Message) -> None:
         return
 
 
-async def _send_to_backend(message: types.Message, text: str) -> None:
+async def _send_to_backend(message: types.Message, text: str, user_id: Optional[int] = None) -> None:
     wants_image = _wants_image(text)
     prepared_text = _augment_text_for_image_request(text) if wants_image else text
+    user_id = user_id or message.from_user.id
 
     payload = {
-        "user_id": f"tg:{message.from_user.id}",
+        "user_id": f"tg:{user_id}",
         "text": prepared_text,
         "attachments": [],
     }
+    await _call_backend(message, user_id, "/chat/message", payload, wants_image=wants_image)
 
+
+async def _send_action_to_backend(message: types.Message, user_id: int, action_id: str, text: str) -> bool:
+    """
+    Нажатие action: бэкенд переиспользует контекст прошлого хода.
+    False — бэкенд не знает такой action (устарел), нужно отправить текст обычным сообщением.
+    """
+    wants_image = _wants_image(text)
+    payload: Dict[str, Any] = {"user_id": f"tg:{user_id}", "action_id": action_id}
+    if wants_image:
+        # те же подсказки style/variants, что и для набранного текста
+        prepared_text = _augment_text_for_image_request(text)
+        if prepared_text != text:
+            payload["text"] = prepared_text
+    return await _call_backend(
+        message,
+        user_id,
+        "/chat/action",
+        payload,
+        wants_image=wants_image,
+        missing_ok=True,
+    )
+
+
+async def _call_backend(
+    message: types.Message,
+    user_id: int,
+    path: str,
+    payload: Dict[str, Any],
+    *,
+    wants_image: bool,
+    missing_ok: bool = False,
+) -> bool:
     # 0) мгновенная индикация “в процессе”
     status_msg = await message.answer("⏳ Выполняю запрос…")
 
@@ -266,16 +301,23 @@ async def _send_to_backend(message: types.Message, text: str) -> None:
     try:
         async with httpx.AsyncClient(timeout=180) as client:
             resp = await client.post(
-                f"{settings.API_BASE_URL.rstrip('/')}/chat/message",
+                f"{settings.API_BASE_URL.rstrip('/')}{path}",
                 json=payload,
             )
 
+        if missing_ok and resp.status_code == 404:
+            try:
+                await status_msg.delete()
+            except Exception:
+                pass
+            return False
+
         if resp.status_code >= 400:
             try:
                 await status_msg.edit_text("Не получилось обработать сообщение. Попробуй ещё раз.")
             except Exception:
                 await message.answer("Не получилось обработать сообщение. Попробуй ещё раз.")
-            return
+            return True
 
         data: Dict[str, Any] = resp.json()
 
@@ -301,7 +343,7 @@ async def _send_to_backend(message: types.Message, text: str) -> None:
         if not reply:
             reply = "Готово."
 
-        kb = _actions_keyboard(message.from_user.id, actions)
+        kb = _actions_keyboard(user_id, actions)
         try:
             await message.answer(reply[:4000], parse_mode=ParseMode.MARKDOWN, reply_markup=kb)
         except Exception:
@@ -318,6 +360,7 @@ async def _send_to_backend(message: types.Message, text: str) -> None:
             await status_msg.delete()
         except Exception:
             pass
+        return True
 
     finally:
         action_task.cancel()
@@ -341,4 +384,6 @@ async def on_action(callback: types.CallbackQuery):
 
     # более UX-но: не спамим “Ок, делаю...” в чат, а показываем toast
     await callback.answer("Ок, выполняю…")
-    await _send_to_backend(callback.message, text)
+    user_id = callback.from_user.id
+    if not await _send_action_to_backend(callback.message, user_id, key, text):
+        await _send_to_backend(callback.message, text, user_id=user_id)
@@ -1,4 +1,4 @@
-from app.schemas import ChatMessageResponse
+from app.schemas import ChatActionRequest, ChatMessageRequest, ChatMessageResponse
 
 
 def test_chat_response_schema():
@@ -10,3 +10,9 @@ def test_chat_response_schema():
     }
     parsed = ChatMessageResponse(**payload)
     assert parsed.reply == "Ответ"
+
+
+def test_requests_do_not_take_tier_from_client():
+    message = ChatMessageRequest(user_id="tg:1", text="привет", tier="premium")
+    action = ChatActionRequest(user_id="tg:1", action_id="a1", tier="premium")
+    assert not hasattr(message, "tier") and not hasattr(action, "tier")
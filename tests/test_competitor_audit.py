@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.services import competitor_audit
+from app.services.competitor_audit import resolve_target, run_batch_audit
+
+
+class _FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _patch(monkeypatch, delays):
+    async def summarize(self, url):
+        await asyncio.sleep(delays.get(url, 0))
+        return {"ok": True, "url": url, "page_type": "website", "cta_texts": ["Купить"], "warnings": []}
+
+    async def insights(user_message, url_summaries, db_session=None):
+        url = url_summaries[0]["url"]
+        return {"overall": {"brand_guess": url}, "per_url": [{"url": url, "ok": True}], "questions_to_user": []}
+
+    async def digest(items):
+        return {"market_summary": f"{len(items)} competitors"}
+
+    monkeypatch.setattr(competitor_audit, "AsyncSessionLocal", _FakeSession)
+    monkeypatch.setattr(competitor_audit.UrlAnalyzer, "summarize", summarize)
+    monkeypatch.setattr(competitor_audit, "build_url_insights", insights)
+    monkeypatch.setattr(competitor_audit, "build_competitor_digest", digest)
+
+
+def test_resolve_target_accepts_urls_and_handles():
+    assert resolve_target("https://Example.com/page/") == "https://example.com/page"
+    assert resolve_target("@coffee.lab").startswith("https://www.instagram.com/coffee.lab")
+    assert resolve_target("просто текст") is None
+
+
+@pytest.mark.asyncio
+async def test_batch_audit_streams_in_completion_order_then_digest(monkeypatch):
+    _patch(monkeypatch, {"https://slow.example": 0.05})
+
+    events = [
+        e
+        async for e in run_batch_audit(
+            ["https://slow.example", "https://fast.example/a", "https://fast.example/a/", "не ссылка"]
+        )
+    ]
+
+    assert events[0] == {"type": "error", "target": "не ссылка", "error": "unrecognized_target"}
+    urls = [e["url"] for e in events if e["type"] == "url"]
+    assert urls == ["https://fast.example/a", "https://slow.example"]  # дубль схлопнут, быстрый первым
+
+    digest = events[-1]
+    assert digest["type"] == "digest"
+    assert digest["stats"]["ok"] == 2
+    assert digest["stats"]["top_ctas"] == ["купить"]
+    assert digest["digest"] == {"market_summary": "2 competitors"}
+
+
+@pytest.mark.asyncio
+async def test_batch_audit_without_insights_skips_llm(monkeypatch):
+    _patch(monkeypatch, {})
+
+    async def boom(*a, **kw):
+        raise AssertionError("LLM must not be called")
+
+    monkeypatch.setattr(competitor_audit, "build_url_insights", boom)
+    monkeypatch.setattr(competitor_audit, "build_competitor_digest", boom)
+
+    events = [e async for e in run_batch_audit(["https://a.example"], with_insights=False)]
+    assert [e["type"] for e in events] == ["url", "digest"]
+    assert events[0]["insights"] is None
+    assert events[-1]["digest"] is None
+
+
+@pytest.mark.asyncio
+async def test_failed_target_error_event_names_the_url(monkeypatch):
+    _patch(monkeypatch, {})
+    ok_summarize = competitor_audit.UrlAnalyzer.summarize
+
+    async def summarize(self, url):
+        if "broken" in url:
+            raise RuntimeError("boom")
+        return await ok_summarize(self, url)
+
+    monkeypatch.setattr(competitor_audit.UrlAnalyzer, "summarize", summarize)
+
+    events = [e async for e in run_batch_audit(["https://broken.example", "https://a.example"], with_insights=False)]
+    assert {"type": "error", "url": "https://broken.example", "error": "audit_failed:RuntimeError"} in events
+    assert events[-1]["stats"]["total"] == 1
+
+
+def test_batch_request_limit_follows_setting():
+    from pydantic import ValidationError
+
+    from app.config import settings
+    from app.schemas import AuditBatchRequest
+
+    AuditBatchRequest(targets=["https://a.example"] * settings.AUDIT_BATCH_MAX_TARGETS)
+    with pytest.raises(ValidationError):
+        AuditBatchRequest(targets=["https://a.example"] * (settings.AUDIT_BATCH_MAX_TARGETS + 1))
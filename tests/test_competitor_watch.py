@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import WatchedUrl
+from app.services import competitor_watch
+from app.services.competitor_watch import diff_summaries, refresh_watch
+
+
+class _ScriptedAnalyzer:
+    def __init__(self, *summaries):
+        self._summaries = list(summaries)
+        self.previous = []
+
+    async def refresh(self, url, previous=None):
+        self.previous.append(previous)
+        return self._summaries.pop(0)
+
+
+def _summary(content_hash, **fields):
+    return dict({"ok": True, "url": "https://example.com", "content_hash": content_hash}, **fields)
+
+
+def _watch():
+    return WatchedUrl(
+        user_id="u1", url="https://example.com", interval_seconds=3600, checks=0, changes=0,
+        next_check_at=datetime.utcnow(),
+    )
+
+
+@pytest.fixture
+def insights_calls(monkeypatch):
+    calls = []
+
+    async def fake_insights(user_message, url_summaries, db_session=None):
+        calls.append(url_summaries[0]["content_hash"])
+        return {"overall": {}, "per_url": [], "questions_to_user": []}
+
+    monkeypatch.setattr(competitor_watch, "build_url_insights", fake_insights)
+    return calls
+
+
+def test_diff_summaries_reports_ctas_headings_and_new_posts():
+    old = {"title": "A", "cta_texts": ["Купить"], "h1": ["Кофе"], "telegram_last_posts": ["p1", "p2"]}
+    new = {"title": "A", "cta_texts": ["Записаться"], "h1": ["Кофе"], "telegram_last_posts": ["p2", "p3"]}
+
+    assert diff_summaries(old, new) == {
+        "cta_texts": {"added": ["Записаться"], "removed": ["Купить"]},
+        "telegram_new_posts": ["p3"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_unchanged_page_skips_insights(insights_calls):
+    watch = _watch()
+    analyzer = _ScriptedAnalyzer(
+        _summary("h1", cta_texts=["Купить"]),
+        dict(_summary("h1", cta_texts=["Купить"]), cache="revalidated"),
+    )
+
+    assert await refresh_watch(watch, analyzer) is False  # первый снимок — база, не изменение
+    assert await refresh_watch(watch, analyzer) is False
+
+    assert insights_calls == ["h1"]
+    assert analyzer.previous[1]["content_hash"] == "h1"  # второй запрос условный
+    assert "cache" not in watch.last_summary
+    assert (watch.checks, watch.changes) == (2, 0)
+
+
+@pytest.mark.asyncio
+async def test_changed_page_gets_diff_and_fresh_insights(insights_calls):
+    watch = _watch()
+    analyzer = _ScriptedAnalyzer(
+        _summary("h1", headings=["Меню"]),
+        _summary("h2", headings=["Меню", "Доставка"]),
+    )
+
+    await refresh_watch(watch, analyzer)
+    assert await refresh_watch(watch, analyzer) is True
+
+    assert insights_calls == ["h1", "h2"]
+    assert watch.extracted_text_hash == "h2"
+    assert watch.last_diff == {"headings": {"added": ["Доставка"], "removed": []}}
+    assert watch.changes == 1 and watch.last_changed_at is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_keeps_previous_snapshot(insights_calls):
+    watch = _watch()
+    analyzer = _ScriptedAnalyzer(_summary("h1"), {"ok": False, "url": "https://example.com", "error": "timeout"})
+
+    await refresh_watch(watch, analyzer)
+    assert await refresh_watch(watch, analyzer) is False
+
+    assert watch.extracted_text_hash == "h1"
+    assert watch.last_error == "timeout"
+    assert insights_calls == ["h1"]
+
+
+@pytest.mark.asyncio
+async def test_skipped_fetch_gets_no_insights(insights_calls):
+    watch = _watch()
+    skipped = {"ok": True, "url": "https://instagram.com/brand", "warnings": ["fetch_skipped"]}
+    analyzer = _ScriptedAnalyzer(skipped, skipped)
+
+    assert await refresh_watch(watch, analyzer) is False
+    assert await refresh_watch(watch, analyzer) is False
+
+    assert insights_calls == []
+    assert watch.last_summary == skipped
+    assert (watch.checks, watch.changes) == (2, 0)
@@ -0,0 +1,61 @@
+import httpcore
+import httpx
+import pytest
+
+from app.config import settings
+from app.services import crawler as crawler_module
+from app.services.crawler import CrawlerClient, _build_transport, _DnsCachingBackend
+
+
+class _FakeBackend:
+    def __init__(self, reachable):
+        self.reachable = reachable
+        self.attempts = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.attempts.append(host)
+        if host not in self.reachable:
+            raise httpcore.ConnectError(f"unreachable {host}")
+        return f"stream:{host}"
+
+
+@pytest.mark.asyncio
+async def test_dns_backend_tries_every_resolved_address():
+    inner = _FakeBackend(reachable={"203.0.113.7"})
+    backend = _DnsCachingBackend(inner, ttl=300)
+
+    async def fake_resolve(host, port):
+        return ["2001:db8::1", "203.0.113.7"]
+
+    backend._resolve = fake_resolve
+    assert await backend.connect_tcp("example.com", 443) == "stream:203.0.113.7"
+    assert inner.attempts == ["2001:db8::1", "203.0.113.7"]
+
+
+@pytest.mark.asyncio
+async def test_dns_backend_drops_cache_when_all_addresses_fail():
+    backend = _DnsCachingBackend(_FakeBackend(reachable=set()), ttl=300)
+    backend._cache[("example.com", 443)] = (float("inf"), ["2001:db8::1"])
+
+    with pytest.raises(httpcore.ConnectError):
+        await backend.connect_tcp("example.com", 443)
+    assert ("example.com", 443) not in backend._cache
+
+
+def test_transport_uses_dns_caching_pool():
+    # если обновление httpx/httpcore сломает подмену пула — тест упадёт (версии закреплены в requirements.txt)
+    transport = _build_transport(httpx.Limits(max_connections=4))
+    assert isinstance(transport._pool, httpcore.AsyncConnectionPool)
+    assert isinstance(transport._pool._network_backend, _DnsCachingBackend)
+
+
+def test_proxy_from_settings_or_environment_disables_custom_transport(monkeypatch):
+    monkeypatch.setattr(settings, "CRAWLER_PROXY", "")
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    assert crawler_module._proxy_configured() is False
+
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.internal:3128")
+    assert crawler_module._proxy_configured() is True
+    client = CrawlerClient().client
+    assert not isinstance(client._transport._pool._network_backend, _DnsCachingBackend)
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from app.images.image_cache import DiskImageCache
+
+
+def _key(i: int) -> str:
+    return f"{i:064x}"
+
+
+@pytest.mark.asyncio
+async def test_roundtrip_is_shared_between_instances(tmp_path):
+    await DiskImageCache(str(tmp_path), max_bytes=10_000).put(_key(1), b"png-bytes")
+
+    other = DiskImageCache(str(tmp_path), max_bytes=10_000)  # другой воркер
+    assert await other.get(_key(1)) == b"png-bytes"
+    assert await other.get(_key(2)) is None
+    assert (tmp_path / _key(1)[:2] / f"{_key(1)}.png").exists()
+
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used_over_limit(tmp_path):
+    cache = DiskImageCache(str(tmp_path), max_bytes=300)
+    for i in range(3):
+        await cache.put(_key(i), b"x" * 100)
+        path = tmp_path / _key(i)[:2] / f"{_key(i)}.png"
+        os.utime(path, (1000 + i, 1000 + i))  # порядок записи без sleep
+
+    assert await cache.get(_key(0)) is not None  # свежий доступ: теперь самый новый
+    await cache.put(_key(3), b"x" * 100)
+
+    assert await cache.get(_key(1)) is None
+    assert await cache.get(_key(0)) is not None
+    assert await cache.get(_key(3)) is not None
+    assert cache.stats()["bytes"] <= 300
+
+
+@pytest.mark.asyncio
+async def test_rejects_path_like_keys(tmp_path):
+    with pytest.raises(ValueError):
+        await DiskImageCache(str(tmp_path)).get("../../etc/passwd")
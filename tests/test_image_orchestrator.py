@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+
+from app.config import settings
+from app.images.image_cache import DiskImageCache
+from app.services import image_orchestrator as orchestrator_module
+from app.services.image_orchestrator import ImageOrchestrator
+
+
+def _png(color) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def orchestrator(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_STORAGE_PATH", str(tmp_path / "images"))
+    monkeypatch.setattr(settings, "IMAGE_POOL_WORKERS", 0)
+    monkeypatch.setattr(orchestrator_module, "image_cache", DiskImageCache(str(tmp_path / "cache")))
+
+    calls = {"prompts": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def fake_generate_image(prompt, size, model, quality="auto", *, user=None):
+        calls["prompts"].append(prompt)
+        calls["in_flight"] += 1
+        calls["max_in_flight"] = max(calls["max_in_flight"], calls["in_flight"])
+        await asyncio.sleep(0.05)
+        calls["in_flight"] -= 1
+        return _png(tuple(hashlib.sha256(prompt.encode("utf-8")).digest()[:3]))
+
+    async def fake_brief(**kwargs):
+        return {"mode": "simple", "background_prompt": "кофейня утром", "palette": []}
+
+    async def fake_record_images(records):
+        calls["records"] = list(records)
+
+    monkeypatch.setattr(orchestrator_module, "generate_image", fake_generate_image)
+    monkeypatch.setattr(orchestrator_module, "record_images", fake_record_images)
+    orch = ImageOrchestrator()
+    monkeypatch.setattr(orch.brief_agent, "run", fake_brief)
+    return orch, calls
+
+
+@pytest.mark.asyncio
+async def test_variants_are_generated_concurrently_and_differ(orchestrator):
+    orch, calls = orchestrator
+
+    result = await orch.generate("instagram", "post", "кофейня", None, None, variants=3)
+
+    assert calls["max_in_flight"] == 3
+    assert len(set(calls["prompts"])) == 3
+    files = [orch.resolve_image_path(i).read_bytes() for i in result["image_ids"]]
+    assert len(set(files)) == 3
+    assert [r.id for r in calls["records"]] == result["image_ids"]
+    assert {r.preset_id for r in calls["records"]} == {result["preset_id"]}
+
+
+def test_resolve_image_path_uses_sharded_layout(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_STORAGE_PATH", str(tmp_path))
+    image_id = "ab12" + "0" * 28
+    path = tmp_path / "ab" / "12" / f"{image_id}.png"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"png")
+
+    assert ImageOrchestrator().resolve_image_path(image_id) == path
+    assert ImageOrchestrator().resolve_image_path("cd34" + "0" * 28) is None
+    assert ImageOrchestrator().resolve_image_path("../../etc/passwd") is None
+
+
+@pytest.mark.asyncio
+async def test_repeated_request_hits_cache_for_every_variant(orchestrator):
+    orch, calls = orchestrator
+
+    await orch.generate("instagram", "post", "кофейня", None, None, variants=2)
+    await orch.generate("instagram", "post", "кофейня", None, None, variants=2)
+
+    assert len(calls["prompts"]) == 2
@@ -0,0 +1,70 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.config import settings
+from app.images.processing import compose_image, cover
+from app.images.template_renderer import TemplateRenderer
+from app.services.cpu_pool import run_cpu_bound, shutdown_cpu_pool
+
+
+def _png(size, mode="RGB") -> bytes:
+    out = io.BytesIO()
+    img = Image.linear_gradient("L").resize(size).convert(mode)
+    ImageDraw.Draw(img).ellipse([size[0] // 4, size[1] // 4, size[0] // 2, size[1] // 2], fill="red")
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_cover_crops_to_target():
+    img = Image.open(io.BytesIO(_png((1536, 1024))))
+    assert cover(img, (1080, 1080)).size == (1080, 1080)
+    assert cover(img, (1080, 1920)).size == (1080, 1920)
+
+
+def test_compose_image_decodes_any_mode_and_honours_compress_level():
+    bg = _png((600, 400), mode="RGBA")
+    fast = compose_image(bg, (300, 300), compress_level=1)
+    small = compose_image(bg, (300, 300), compress_level=9)
+
+    out = Image.open(io.BytesIO(fast))
+    assert out.size == (300, 300) and out.mode == "RGB"
+    assert Image.open(io.BytesIO(small)).tobytes() == out.tobytes()
+    assert len(small) < len(fast)
+
+
+def test_template_text_matches_previous_rgba_render():
+    # прежний рендер: RGBA, полупрозрачная подложка, затем конвертация в RGB
+    bg = cover(Image.open(io.BytesIO(_png((1536, 1024)))), (640, 360))
+    overlay = {"headline": "Кофе дня", "subtitle": "Свежая обжарка", "cta": "Заказать"}
+    before = bg.convert("RGBA")
+    draw = ImageDraw.Draw(before)
+    w, h = before.size
+    margin = int(min(w, h) * 0.08)
+    box = (margin, int(h * 0.65), w - margin, h - margin)
+    draw.rectangle(list(box), fill=(0, 0, 0, 160))
+    TemplateRenderer()._draw_text_block(draw, box, overlay, ["#FFFFFF"])
+
+    after = TemplateRenderer().draw_on(bg.copy(), overlay, "bottom", ["#FFFFFF"])
+    assert after.tobytes() == before.convert("RGB").tobytes()
+
+
+@pytest.mark.asyncio
+async def test_image_work_runs_in_its_own_pool(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_POOL_WORKERS", 1)
+    try:
+        rendered = await run_cpu_bound(
+            compose_image,
+            _png((1536, 1024)),
+            (1280, 720),
+            overlay={"headline": "Кофе дня"},
+            layout="bottom",
+            palette=["#FFFFFF"],
+            pool="images",
+        )
+    finally:
+        shutdown_cpu_pool()
+
+    out = Image.open(io.BytesIO(rendered))
+    assert out.size == (1280, 720) and out.mode == "RGB"
@@ -0,0 +1,33 @@
+from app.services.message_features import (
+    IMAGE_REQUEST_KEYWORDS,
+    MARKETING_KEYWORDS,
+    OFFTOPIC_KEYWORDS,
+    KeywordMatcher,
+    extract_message_features,
+)
+
+
+def test_matcher_matches_naive_substring_scan():
+    matcher = KeywordMatcher({"a": ["пост", "постер"], "b": ["тер"], "c": ["ads", "sql"]})
+    text = "нужен постер и adsql"
+    expected = {
+        cat
+        for cat, words in {"a": ["пост", "постер"], "b": ["тер"], "c": ["ads", "sql"]}.items()
+        if any(w in text for w in words)
+    }
+    assert matcher.match(text) == expected
+
+
+def test_message_features_single_pass():
+    text = "Сделай баннер для рекламы во ВК, сайт https://example.com/page."
+    features = extract_message_features(text)
+    lowered = text.lower()
+
+    assert features.urls == ("https://example.com/page",)
+    assert features.looks_like_marketing is True
+    assert features.has("marketing") is any(k in lowered for k in MARKETING_KEYWORDS)
+    assert features.looks_strongly_offtopic is any(k in lowered for k in OFFTOPIC_KEYWORDS)
+    assert features.wants_image is any(k in lowered for k in IMAGE_REQUEST_KEYWORDS)
+    assert features.image_platform == "vk"
+    assert features.image_use_case == "ad_post"
+    assert features.intent == "image"
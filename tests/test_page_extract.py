@@ -0,0 +1,56 @@
+from app.services.page_extract import extract_page
+
+HTML = """
+<html><head>
+<title> Кофейня на Литейном </title>
+<meta name="description" content="Спешелти кофе и десерты">
+<meta property="og:title" content="Кофейня">
+<meta property="og:image" content="https://example.com/og.png">
+<style>.hero { color: red }</style>
+</head><body>
+<h1>Лучший кофе района</h1>
+<h2>Меню</h2><h2>Доставка</h2>
+<a href="/menu">Меню</a>
+<button>Заказать доставку</button>
+<a href="/buy">Купить абонемент на 10 чашек</a>
+<a href="/buy2">Купить абонемент на 10 чашек</a>
+<p>Варим эспрессо на зерне собственной обжарки каждый день с восьми утра.</p>
+<script>var tracking = "это длинная строка скрипта, которая не должна попасть в выдержку";</script>
+<svg><text>Надпись внутри svg-логотипа, которой не место в тексте страницы</text></svg>
+<noscript>Включите JavaScript, чтобы увидеть интерактивную карту кофейни</noscript>
+</body></html>
+"""
+
+
+def test_extract_page_collects_metadata_in_one_pass():
+    page = extract_page(HTML, "website")
+
+    assert page["title"] == "Кофейня на Литейном"
+    assert page["meta_description"] == "Спешелти кофе и десерты"
+    assert page["og"]["title"] == "Кофейня"
+    assert page["og"]["image"] == "https://example.com/og.png"
+    assert page["og"]["description"] == ""
+    assert page["h1"] == ["Лучший кофе района"]
+    assert page["headings"] == ["Меню", "Доставка"]
+    # в порядке документа, без дублей и без ссылок без CTA-слов
+    assert page["cta_texts"] == ["Заказать доставку", "Купить абонемент на 10 чашек"]
+
+
+def test_extract_page_excerpt_skips_noise():
+    excerpt = extract_page(HTML, "website")["main_text_excerpt"]
+
+    assert "Варим эспрессо" in excerpt
+    assert "tracking" not in excerpt
+    assert "svg-логотипа" not in excerpt
+    assert "JavaScript" not in excerpt
+
+
+def test_extract_page_telegram_posts():
+    html = "<html><body>" + "".join(
+        f'<div class="tgme_widget_message_text js-message_text">Пост номер {i}</div>' for i in range(7)
+    ) + "</body></html>"
+
+    page = extract_page(html, "telegram")
+    # последние посты превью, новые первыми
+    assert page["telegram_last_posts"] == [f"Пост номер {i}" for i in (6, 5, 4, 3, 2)]
+    assert extract_page(html, "website")["telegram_last_posts"] == []
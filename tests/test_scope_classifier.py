@@ -0,0 +1,32 @@
+from app.services.scope_classifier import ScopeClassifier
+
+
+TEXTS = [
+    "сделай контент-план для кофейни",
+    "как поднять охваты в телеграм канале",
+    "придумай оффер для курса по английскому",
+    "напиши рекламный пост для салона красоты",
+    "реши уравнение x^2 + 3x = 0",
+    "как приготовить борщ",
+    "посоветуй фильм на вечер",
+    "переведи текст на немецкий",
+]
+LABELS = [True, True, True, True, False, False, False, False]
+
+
+def test_scope_classifier_fit_and_predict():
+    clf = ScopeClassifier(model_version="test").fit(TEXTS, LABELS, epochs=30)
+    assert clf.predict_proba("контент-план для телеграм канала") > 0.5
+    assert clf.predict_proba("реши уравнение") < 0.5
+    in_scope, confidence = clf.predict("рекламный пост для кофейни")
+    assert in_scope is True
+    assert 0.5 <= confidence <= 1.0
+
+
+def test_scope_classifier_artifact_roundtrip(tmp_path):
+    clf = ScopeClassifier(model_version="test").fit(TEXTS, LABELS, epochs=5)
+    path = tmp_path / "scope.json"
+    clf.save(path)
+    loaded = ScopeClassifier.load(path)
+    assert loaded.model_version == "test"
+    assert abs(loaded.predict_proba("как приготовить борщ") - clf.predict_proba("как приготовить борщ")) < 1e-9
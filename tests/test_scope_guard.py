@@ -0,0 +1,103 @@
+import pytest
+
+from app.services.scope_guard import ScopeContext, scope_guard
+
+
+@pytest.mark.asyncio
+async def test_short_follow_up_skips_guard_in_marketing_dialog():
+    context = ScopeContext(last_intent="content", last_in_scope=True, last_actions=())
+    ok, payload = await scope_guard("давай 3 варианта", use_llm_fallback=False, context=context)
+    assert ok is True
+    assert payload is None
+
+
+@pytest.mark.asyncio
+async def test_emitted_action_text_skips_guard():
+    context = ScopeContext(
+        last_intent="other",
+        last_in_scope=True,
+        last_actions=("Сделать подробнее",),
+    )
+    ok, _ = await scope_guard("сделать подробнее!", use_llm_fallback=False, context=context)
+    assert ok is True
+
+
+@pytest.mark.asyncio
+async def test_follow_up_without_context_is_checked():
+    ok, payload = await scope_guard("давай 3 варианта", use_llm_fallback=False)
+    assert ok is False
+    assert payload is not None
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.added = []
+
+    def add(self, obj):
+        self.added.append(obj)
+
+
+@pytest.mark.asyncio
+async def test_keyword_decisions_are_sampled_and_classifier_cases_logged(monkeypatch):
+    from app.config import settings
+    from app.services import scope_guard as scope_guard_module
+
+    monkeypatch.setattr(settings, "SCOPE_LOG_KEYWORD_SAMPLE_RATE", 0.0)
+    session = _RecordingSession()
+    ok, _ = await scope_guard("сделай контент-план для instagram", use_llm_fallback=False, db_session=session)
+    assert ok is True
+    assert session.added == []
+
+    class _Clf:
+        def predict(self, text):
+            return True, 0.99
+
+    monkeypatch.setattr(scope_guard_module, "get_scope_classifier", lambda: _Clf())
+    ok, _ = await scope_guard("хочу больше клиентов в кофейню", use_llm_fallback=False, db_session=session)
+    assert ok is True
+    assert [d.source for d in session.added] == ["classifier"]
+
+
+@pytest.mark.asyncio
+async def test_short_off_topic_question_in_dialog_goes_through_classifier(monkeypatch):
+    from app.services import scope_guard as scope_guard_module
+
+    class _Clf:
+        def predict(self, text):
+            return False, 0.97
+
+    monkeypatch.setattr(scope_guard_module, "get_scope_classifier", lambda: _Clf())
+    context = ScopeContext(last_intent="content", last_in_scope=True, last_actions=())
+
+    ok, payload = await scope_guard("как приготовить борщ", use_llm_fallback=False, context=context)
+    assert ok is False and payload is not None
+
+    ok, _ = await scope_guard("да, давай второй", use_llm_fallback=False, context=context)
+    assert ok is True
+
+
+@pytest.mark.asyncio
+async def test_short_message_without_classifier_is_not_waved_through(monkeypatch):
+    from app.services import scope_guard as scope_guard_module
+
+    monkeypatch.setattr(scope_guard_module, "get_scope_classifier", lambda: None)
+    context = ScopeContext(last_intent="content", last_in_scope=True, last_actions=())
+
+    ok, payload = await scope_guard("как приготовить борщ", use_llm_fallback=False, context=context)
+    assert ok is False and payload is not None
+
+
+@pytest.mark.asyncio
+async def test_short_follow_up_passes_on_unsure_in_scope_lean(monkeypatch):
+    from app.config import settings
+    from app.services import scope_guard as scope_guard_module
+
+    class _Clf:
+        def predict(self, text):
+            return True, settings.SCOPE_CLASSIFIER_THRESHOLD / 2
+
+    monkeypatch.setattr(scope_guard_module, "get_scope_classifier", lambda: _Clf())
+    context = ScopeContext(last_intent="content", last_in_scope=True, last_actions=())
+
+    ok, _ = await scope_guard("а что насчёт выходных?", use_llm_fallback=False, context=context)
+    assert ok is True
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.speculative import SpeculativeExecutor
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(settings, "SPECULATIVE_ENABLED", True)
+    monkeypatch.setattr(settings, "SPECULATIVE_TIERS", "default")
+
+
+@pytest.mark.asyncio
+async def test_speculation_hit_and_miss(enabled):
+    executor = SpeculativeExecutor()
+
+    async def compute():
+        await asyncio.sleep(0)
+        return {"reply": "готово"}
+
+    assert executor.schedule("u1", "a1", compute) is True
+    assert await executor.claim("u1", "a1") == {"reply": "готово"}
+
+    executor.schedule("u1", "a1", compute)
+    assert await executor.claim("u1", "other") is None
+
+    stats = executor.stats()["tiers"]["default"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["wasted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_speculation_disabled_for_tier(enabled):
+    executor = SpeculativeExecutor()
+
+    async def compute():
+        return {}
+
+    assert executor.schedule("u1", "a1", compute, tier="free") is False
+    assert await executor.claim("u1", "a1") is None
+
+
+@pytest.mark.asyncio
+async def test_expired_unclaimed_speculation_is_swept_and_counted(enabled, monkeypatch):
+    monkeypatch.setattr(settings, "SPECULATIVE_TTL_SECONDS", 0)
+    executor = SpeculativeExecutor()
+    executor.SWEEP_INTERVAL_SECONDS = 0.0
+    executor.BUDGET_WINDOW_SECONDS = 0.0
+
+    async def compute():
+        return {"reply": "готово"}
+
+    executor.schedule("u1", "a1", compute)
+    await asyncio.sleep(0.01)
+
+    stats = executor.stats()
+    assert stats["tiers"]["default"]["wasted"] == 1
+    assert "u1" not in executor._by_user
+    assert "u1" not in executor._budgets
@@ -0,0 +1,36 @@
+from app.services.text_compress import BoilerplateIndex, approx_tokens, compress_text, split_sentences
+
+
+def test_boilerplate_index_needs_several_pages():
+    index = BoilerplateIndex(min_pages=2)
+    index.observe("https://a.example", ["Главная Курсы Блог Контакты"])
+    assert not index.is_boilerplate("Главная Курсы Блог Контакты")
+
+    index.observe("https://b.example", ["Главная  Курсы Блог Контакты"])  # пробелы не важны
+    assert index.is_boilerplate("Главная Курсы Блог Контакты")
+    assert index.is_boilerplate("Мы используем cookie, чтобы сайт работал лучше")
+
+
+def test_short_text_only_loses_boilerplate_and_duplicates():
+    text = "Обжариваем кофе каждый понедельник\n© 2026 Все права защищены\nОбжариваем кофе каждый понедельник"
+    assert compress_text(text, budget_tokens=500, boilerplate=BoilerplateIndex()) == "Обжариваем кофе каждый понедельник"
+
+
+def test_compress_keeps_budget_order_and_drops_near_duplicates():
+    cards = [f"Эфиопия Иргачефф, зерно 250 г, обжарка под фильтр №{i}." for i in range(30)]
+    text = "\n".join(
+        [
+            "Спешелти кофе с доставкой по России за 2 дня.",
+            *cards,
+            "Обжариваем зерно каждый понедельник и отправляем в день обжарки.",
+            "Подписка на кофе со скидкой 15% и бесплатной доставкой.",
+        ]
+    )
+
+    out = compress_text(text, budget_tokens=60, focus=["Спешелти кофе"], boilerplate=BoilerplateIndex())
+
+    assert approx_tokens(out) <= 60
+    assert sum("Иргачефф" in line for line in out.splitlines()) == 1
+    lines = out.splitlines()
+    assert lines == [s for s in split_sentences(text) if s in lines]  # порядок как на странице
+    assert any("Подписка" in line for line in lines)
@@ -1,6 +1,18 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import pytest
 
-from app.services.url_analyzer import InMemoryUrlCacheStore, UrlSummary, extract_urls
+from app.config import settings
+from app.services.url_analyzer import (
+    InMemoryUrlCacheStore,
+    UrlAnalyzer,
+    UrlSummary,
+    extract_urls,
+    normalize_url,
+    telegram_preview_url,
+)
 
 
 def test_extract_urls():
@@ -22,3 +34,373 @@ async def test_in_memory_cache_store():
     cached = await store.get(summary.url)
     assert cached is not None
     assert cached.title == "Example"
+
+
+class _FakeResponse:
+    def __init__(self, url: str, status_code: int = 200, body: bytes = b"", content_type: str = "text/html") -> None:
+        self.url = url
+        self.status_code = status_code
+        self.headers = {"content-type": content_type}
+        self.charset_encoding = None
+        self._body = body
+        self.bytes_read = 0
+
+    async def aiter_bytes(self):
+        for i in range(0, len(self._body), 1024):
+            chunk = self._body[i : i + 1024]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+PAGE = (
+    "<html><head><title>Shop</title></head><body><p>" + "Лучший магазин кофе в городе " * 3 + "</p></body></html>"
+).encode("utf-8")
+
+
+class _FakeCrawler:
+    def __init__(self, status_code: int = 200, body: bytes = PAGE, content_type: str = "text/html") -> None:
+        self.status_code = status_code
+        self.body = body
+        self.content_type = content_type
+        self.calls = 0
+        self.etag: Optional[str] = None
+        self.urls: list = []
+        self.last: Optional[_FakeResponse] = None
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers=None, **kwargs):
+        self.calls += 1
+        status = self.status_code
+        if self.etag and (headers or {}).get("If-None-Match") == self.etag:
+            status = 304
+        self.last = _FakeResponse(url, status, self.body if status == 200 else b"", self.content_type)
+        if self.etag:
+            self.last.headers["etag"] = self.etag
+        self.urls.append(url)
+        yield self.last
+
+    async def get(self, url: str, **kwargs):
+        self.calls += 1
+        self.urls.append(url)
+        return _FakeJsonResponse({"title": "Как обжарить кофе дома", "author_name": "Coffee Lab", "thumbnail_url": "t.jpg"})
+
+
+class _FakeJsonResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_serves_repeat_audit_without_refetch():
+    crawler = _FakeCrawler()
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())
+
+    first = await analyzer.analyze("https://shop.example.com")
+    second = await analyzer.analyze("https://shop.example.com")
+
+    assert crawler.calls == 1
+    assert first.url_summaries[0]["title"] == "Shop"
+    assert second.url_summaries[0]["cache"] == "memory"
+
+
+@pytest.mark.asyncio
+async def test_fetch_failures_are_cached_briefly():
+    crawler = _FakeCrawler(status_code=503)
+    store = InMemoryUrlCacheStore()
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=store)
+
+    await analyzer.analyze("https://down.example.com")
+    await analyzer.analyze("https://down.example.com")
+    assert crawler.calls == 1
+
+    # отрицательная запись не отдаётся устаревшей
+    entry = store._entries["https://down.example.com"]
+    assert entry.stale_until == entry.fresh_until
+
+
+@pytest.mark.asyncio
+async def test_stale_summary_is_returned_and_refreshed_in_background():
+    crawler = _FakeCrawler()
+    store = InMemoryUrlCacheStore()
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=store)
+
+    await analyzer.analyze("https://shop.example.com")
+    entry = store._entries["https://shop.example.com"]
+    entry.fresh_until, entry.stale_until = 0.0, entry.stale_until + 1
+
+    result = await analyzer.analyze("https://shop.example.com")
+    assert result.url_summaries[0]["cache"] == "stale"
+
+    await asyncio.sleep(0.05)
+    assert crawler.calls == 2
+    assert await store.get("https://shop.example.com") is not None
+
+
+@pytest.mark.asyncio
+async def test_body_download_is_capped_and_non_html_is_not_read(monkeypatch):
+    monkeypatch.setattr(settings, "URL_FETCH_MAX_BYTES", 64 * 1024)
+    huge = b"<html><head><title>Big</title></head><body>" + b"<div>x</div>" * 500_000 + b"</body></html>"
+
+    crawler = _FakeCrawler(body=huge)
+    summary = await UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())._fetch_and_summarize(
+        "https://big.example.com"
+    )
+    assert summary["title"] == "Big"
+    assert "page_truncated" in summary["warnings"]
+    assert crawler.last.bytes_read <= 65 * 1024
+
+    crawler = _FakeCrawler(body=b"%PDF" * 100_000, content_type="application/octet-stream")
+    summary = await UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())._fetch_and_summarize(
+        "https://files.example.com/blob"
+    )
+    assert summary["warnings"] == ["not_html"]
+    assert crawler.last.bytes_read == 0
+
+
+@pytest.mark.asyncio
+async def test_download_stops_once_excerpt_budget_is_filled():
+    paragraph = "<p>" + "Доставка свежеобжаренного кофе по всей России " * 5 + "</p>"
+    hero = "".join(f"<h1>Кофе {i}</h1>" for i in range(3)) + "".join(
+        f'<a href="/p{i}">Купить набор {i}</a>' for i in range(10)
+    )
+    body = (
+        "<html><head><title>Coffee</title></head><body>" + hero + paragraph * 5000 + "</body></html>"
+    ).encode("utf-8")
+
+    crawler = _FakeCrawler(body=body)
+    summary = await UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())._fetch_and_summarize(
+        "https://coffee.example.com"
+    )
+    assert len(summary["main_text_excerpt"]) > 1000
+    assert "page_truncated" not in summary["warnings"]
+    assert crawler.last.bytes_read < len(body) / 10
+
+
+@pytest.mark.asyncio
+async def test_one_h1_landing_stops_after_quiet_window():
+    paragraph = "<p>" + "Доставка свежеобжаренного кофе по всей России " * 5 + "</p>"
+    hero = "<h1>Кофе</h1><a href='/buy'>Купить набор</a><button>Оформить подписку</button>"
+    body = (
+        "<html><head><title>Coffee</title></head><body>" + hero + paragraph * 4000 + "</body></html>"
+    ).encode("utf-8")
+    assert len(body) < settings.URL_FETCH_MAX_BYTES
+
+    crawler = _FakeCrawler(body=body)
+    summary = await UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())._fetch_and_summarize(
+        "https://landing.example.com"
+    )
+    assert summary["h1"] == ["Кофе"]
+    assert summary["cta_texts"] == ["Купить набор", "Оформить подписку"]
+    assert "page_truncated" not in summary["warnings"]
+    assert crawler.last.bytes_read < len(body) / 4
+
+
+@pytest.mark.asyncio
+async def test_inline_scripts_do_not_count_towards_early_stop():
+    script = "<script>\n" + "".join(
+        f'  window.__state_{i} = {{"key": "value number {i} for hydration payload"}};\n' for i in range(3000)
+    ) + "</script>"
+    body = (
+        "<html><head><title>SPA</title></head><body>"
+        + script
+        + "<h1>Курсы таргетолога</h1><a href='/buy'>Записаться на курс</a>"
+        + "<p>Научим настраивать рекламу в соцсетях за шесть недель практики.</p>"
+        + "</body></html>"
+    ).encode("utf-8")
+
+    crawler = _FakeCrawler(body=body)
+    summary = await UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())._fetch_and_summarize(
+        "https://spa.example.com"
+    )
+    assert crawler.last.bytes_read == len(body)
+    assert summary["h1"] == ["Курсы таргетолога"]
+    assert summary["cta_texts"] == ["Записаться на курс"]
+    assert "шесть недель" in summary["main_text_excerpt"]
+    assert "page_truncated" not in summary["warnings"]
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_revalidated_with_validators():
+    crawler = _FakeCrawler()
+    crawler.etag = '"v1"'
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())
+
+    first = await analyzer._fetch_and_summarize("https://shop.example.com")
+    assert first["validators"] == {"etag": '"v1"', "last_modified": None}
+
+    not_modified = await analyzer._fetch_and_summarize("https://shop.example.com", use_cache=False, previous=first)
+    assert crawler.last.status_code == 304
+    assert not_modified["cache"] == "revalidated"
+    assert not_modified["content_hash"] == first["content_hash"]
+
+    # сервер без валидаторов, но текст тот же — тоже не считается изменением
+    crawler.etag = None
+    same_text = await analyzer._fetch_and_summarize("https://shop.example.com", use_cache=False, previous=first)
+    assert crawler.last.status_code == 200
+    assert same_text["cache"] == "revalidated"
+
+
+@pytest.mark.asyncio
+async def test_platform_strategies():
+    crawler = _FakeCrawler()
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())
+
+    ig = await analyzer._fetch_and_summarize("https://instagram.com/coffee.lab")
+    assert crawler.calls == 0
+    assert ig["handle"] == "coffee.lab"
+    assert "platform_may_block_scraping" in ig["warnings"]
+
+    yt = await analyzer._fetch_and_summarize("https://youtu.be/abc123")
+    assert crawler.calls == 1
+    assert crawler.urls[-1].startswith("https://www.youtube.com/oembed")
+    assert yt["title"] == "Как обжарить кофе дома"
+    assert yt["author_name"] == "Coffee Lab"
+
+    await analyzer._fetch_and_summarize("https://t.me/coffee_lab")
+    assert crawler.urls[-1] == "https://t.me/s/coffee_lab"
+
+
+class _NoOembedCrawler(_FakeCrawler):
+    async def get(self, url: str, **kwargs):
+        self.calls += 1
+        self.urls.append(url)
+        resp = _FakeJsonResponse({})
+        resp.status_code = 404
+        return resp
+
+
+@pytest.mark.asyncio
+async def test_youtube_watch_links_keep_video_id_and_channels_fall_back_to_page():
+    assert normalize_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42&si=x") == (
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    )
+    crawler = _FakeCrawler()
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())
+
+    watch = await analyzer._fetch_and_summarize("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42")
+    assert "watch%3Fv%3DdQw4w9WgXcQ" in crawler.urls[-1]
+    assert watch["title"] == "Как обжарить кофе дома"
+
+    # oEmbed не знает каналов — обычная загрузка страницы
+    channel = await analyzer._fetch_and_summarize("https://www.youtube.com/@coffeelab")
+    assert crawler.urls[-1] == "https://www.youtube.com/@coffeelab"
+    assert channel["ok"] is True and channel["title"] == "Shop"
+
+
+@pytest.mark.asyncio
+async def test_youtube_oembed_failure_falls_back_to_page():
+    crawler = _NoOembedCrawler()
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())
+
+    summary = await analyzer._fetch_and_summarize("https://youtu.be/abc123")
+    assert crawler.urls[0].startswith("https://www.youtube.com/oembed")
+    assert crawler.urls[-1] == "https://youtu.be/abc123"
+    assert summary["ok"] is True and "oembed_failed" not in summary["warnings"]
+
+
+def test_telegram_preview_url():
+    assert telegram_preview_url("https://t.me/coffee_lab/120") == "https://t.me/s/coffee_lab/120"
+    assert telegram_preview_url("https://t.me/s/coffee_lab") == "https://t.me/s/coffee_lab"
+    assert telegram_preview_url("https://t.me/+AbCdEf") == "https://t.me/+AbCdEf"
+    assert telegram_preview_url("https://t.me/joinchat/AbCdEf") == "https://t.me/joinchat/AbCdEf"
+
+
+class _SlowCrawler(_FakeCrawler):
+    def __init__(self, slow_host: str) -> None:
+        super().__init__()
+        self.slow_host = slow_host
+        self.release = asyncio.Event()
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers=None, **kwargs):
+        if self.slow_host in url:
+            await self.release.wait()
+        async with super().stream(url, headers=headers, **kwargs) as resp:
+            yield resp
+
+
+@pytest.mark.asyncio
+async def test_deadline_returns_partial_result_and_finishes_in_background():
+    crawler = _SlowCrawler("slow.example.com")
+    analyzer = UrlAnalyzer(crawler_client=crawler, memory_cache=InMemoryUrlCacheStore())
+
+    result = await analyzer.analyze("https://fast.example.com и https://slow.example.com", deadline=0.05)
+
+    assert result.partial
+    assert result.pending_urls == ["https://slow.example.com"]
+    fast, slow = result.url_summaries
+    assert fast["title"] == "Shop"
+    assert slow["pending"] and "analysis_pending" in slow["warnings"]
+
+    crawler.release.set()
+    await asyncio.sleep(0.05)
+
+    resolved = await analyzer.resolve_pending(result.url_summaries)
+    assert resolved[0] is fast
+    assert resolved[1]["title"] == "Shop"
+
+
+class _GatedCrawler(_FakeCrawler):
+    """Держит ответ, пока тест не откроет gate: все промахи успевают прийти во время загрузки."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers=None, **kwargs):
+        await self.gate.wait()
+        async with super().stream(url, headers=headers, **kwargs) as resp:
+            yield resp
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    crawler = _GatedCrawler()
+    memory = InMemoryUrlCacheStore()
+    analyzers = [UrlAnalyzer(crawler_client=crawler, memory_cache=memory) for _ in range(5)]
+
+    calls = [asyncio.create_task(a.summarize("https://viral.example.com/post/")) for a in analyzers]
+    await asyncio.sleep(0)
+    crawler.gate.set()
+    results = await asyncio.gather(*calls)
+
+    assert crawler.calls == 1
+    assert all(r["title"] == "Shop" for r in results)
+    results[0]["title"] = "mutated"
+    assert results[1]["title"] == "Shop"  # каждому ждущему своя копия
+    assert not UrlAnalyzer._inflight
+
+
+@pytest.mark.asyncio
+async def test_lease_loser_waits_for_cache_fill(monkeypatch):
+    from app.services import url_analyzer
+
+    async def lease_taken(*args, **kwargs):
+        return False
+
+    monkeypatch.setattr(url_analyzer, "acquire_fetch_lease", lease_taken)
+    monkeypatch.setattr(settings, "URL_FETCH_LEASE_POLL_SECONDS", 0.01)
+    crawler = _FakeCrawler()
+    memory = InMemoryUrlCacheStore()
+    # «сессия» без execute: чтение из БД падает и тихо пропускается, остаётся память
+    analyzer = UrlAnalyzer(db_session=object(), crawler_client=crawler, memory_cache=memory)
+
+    async def other_worker_fills_cache():
+        await asyncio.sleep(0.05)
+        await UrlAnalyzer(crawler_client=_FakeCrawler(), memory_cache=memory)._fetch_and_summarize(
+            "https://viral.example.com", use_cache=False
+        )
+
+    filler = asyncio.create_task(other_worker_fills_cache())
+    summary = await analyzer._fetch_leased("https://viral.example.com")
+    await filler
+
+    assert crawler.calls == 0
+    assert summary["title"] == "Shop"
+    assert summary["cache"] == "memory"
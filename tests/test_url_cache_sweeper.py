@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.config import settings
+from app.services.url_analyzer import sweep_expired_url_cache
+from app.services.url_insights import sweep_old_url_insights
+
+
+class _Result:
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+
+
+class _FakeSession:
+    def __init__(self, rowcounts):
+        self.rowcounts = list(rowcounts)
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return _Result(self.rowcounts.pop(0))
+
+    async def commit(self):
+        self.commits += 1
+
+
+def _datetime_params(stmt):
+    params = stmt.compile(dialect=postgresql.dialect()).params
+    return [v for v in params.values() if isinstance(v, datetime)]
+
+
+@pytest.mark.asyncio
+async def test_sweep_deletes_in_batches_until_a_short_batch():
+    session = _FakeSession([3, 3, 1, 3])
+    assert await sweep_expired_url_cache(session, batch_size=3) == 7
+    assert len(session.statements) == 3
+    assert session.commits == 3  # каждая пачка — своя транзакция
+
+
+@pytest.mark.asyncio
+async def test_sweep_stops_after_max_batches():
+    session = _FakeSession([2] * 10)
+    assert await sweep_expired_url_cache(session, batch_size=2, max_batches=4) == 8
+    assert len(session.statements) == 4
+
+
+@pytest.mark.asyncio
+async def test_sweep_keeps_stale_window_and_validator_rows(monkeypatch):
+    monkeypatch.setattr(settings, "URL_CACHE_STALE_SECONDS", 3600)
+    monkeypatch.setattr(settings, "URL_CACHE_VALIDATOR_RETENTION_SECONDS", 7 * 86400)
+    session = _FakeSession([0])
+    await sweep_expired_url_cache(session, batch_size=10)
+
+    stmt = session.statements[0]
+    cutoffs = sorted(c.replace(tzinfo=None) for c in _datetime_params(stmt))
+    now = datetime.utcnow()
+    # строки без валидаторов — после окна stale, с ETag/Last-Modified — после срока хранения валидаторов
+    assert abs((cutoffs[0] - (now - timedelta(days=7))).total_seconds()) < 5
+    assert abs((cutoffs[1] - (now - timedelta(seconds=3600))).total_seconds()) < 5
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "url_cache.etag IS NULL" in sql and "url_cache.last_modified IS NULL" in sql
+
+
+@pytest.mark.asyncio
+async def test_insight_cache_is_swept_by_created_at(monkeypatch):
+    monkeypatch.setattr(settings, "URL_INSIGHTS_CACHE_TTL_DAYS", 30)
+    session = _FakeSession([5, 2])
+    assert await sweep_old_url_insights(session, batch_size=5) == 7
+
+    [cutoff] = _datetime_params(session.statements[0])
+    assert abs((cutoff.replace(tzinfo=None) - (datetime.utcnow() - timedelta(days=30))).total_seconds()) < 5
+    assert "url_insight_cache.created_at <" in str(session.statements[0].compile(dialect=postgresql.dialect()))
+
+    monkeypatch.setattr(settings, "URL_INSIGHTS_CACHE_TTL_DAYS", 0)
+    assert await sweep_old_url_insights(_FakeSession([]), batch_size=5) == 0
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from app.services import url_insights
+from app.services.url_insights import build_url_insights, page_content_key
+
+
+def _page_answer(url: str) -> str:
+    return json.dumps(
+        {
+            "overall": {
+                "brand_guess": "Coffee Lab",
+                "niche_guess": "кофейня",
+                "main_offer": None,
+                "target_audience": None,
+                "key_pains": [],
+                "key_benefits": ["свежая обжарка"],
+                "funnel_guess": [],
+                "top_recommendations": ["добавить CTA в первый экран"],
+                "risks_or_unknowns": [],
+            },
+            "page": {
+                "url": url,
+                "page_type": "website",
+                "ok": True,
+                "what_it_is": "лендинг",
+                "offer": None,
+                "cta_found": [],
+                "strengths": [],
+                "weaknesses": [],
+                "quick_wins": [],
+                "missing_data": [],
+                "warnings": [],
+            },
+            "questions_to_user": ["Какой средний чек?"],
+        },
+        ensure_ascii=False,
+    )
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+
+    async def fake_chat(messages, **kwargs):
+        payload = json.loads(messages[-1]["content"].split("\n", 1)[1])
+        calls.append(payload)
+        return _page_answer(payload["url_summary"]["url"]), {}
+
+    monkeypatch.setattr(url_insights, "openai_chat", fake_chat)
+    url_insights._page_insights_memory.clear()
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_page_analysis_is_cached_by_content_hash_across_users(llm_calls):
+    summary = {"url": "https://coffee.example", "ok": True, "title": "Coffee Lab", "content_hash": "abc"}
+
+    first = await build_url_insights("Разбери мой сайт", [summary])
+    second = await build_url_insights("Что улучшить в оффере?", [dict(summary, url="https://coffee.example/?utm=1")])
+
+    assert len(llm_calls) == 1
+    assert "user_message" not in llm_calls[0]
+    assert first["overall"] == second["overall"]
+    assert second["per_url"][0]["url"] == "https://coffee.example/?utm=1"
+    assert first["per_url"][0]["what_it_is"] == "лендинг"
+    assert first["questions_to_user"] == ["Какой средний чек?"]
+
+
+@pytest.mark.asyncio
+async def test_changed_page_is_analyzed_again(llm_calls):
+    summary = {"url": "https://coffee.example", "ok": True, "content_hash": "abc"}
+    await build_url_insights("", [summary])
+    await build_url_insights("", [dict(summary, content_hash="def")])
+
+    assert len(llm_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_multiple_pages_are_merged(llm_calls):
+    pages = [
+        {"url": "https://coffee.example", "ok": True, "content_hash": "a"},
+        {"url": "https://t.me/coffee", "ok": True, "content_hash": "b"},
+    ]
+    result = await build_url_insights("", pages)
+
+    assert [p["url"] for p in result["per_url"]] == ["https://coffee.example", "https://t.me/coffee"]
+    assert result["overall"]["brand_guess"] == "Coffee Lab"
+    assert result["overall"]["key_benefits"] == ["свежая обжарка"]
+    assert result["questions_to_user"] == ["Какой средний чек?"]
+
+
+def test_content_key_falls_back_to_payload_hash():
+    failed = {"url": "https://down.example", "ok": False, "status_code": 503, "warnings": ["blocked_or_not_found"]}
+    assert page_content_key(failed) == page_content_key(dict(failed))
+    assert page_content_key(failed) != page_content_key(dict(failed, status_code=404))